@@ -0,0 +1,99 @@
+"""
+Runs TEI documents through XtxProcess and SpacyProcess, once with\
+spacytei.pipeline.run_batch (one process after the other) and once with\
+spacytei.runner.run_pipeline (XTX requests overlap with spaCy). XTX is replaced by\
+a local stand-in server which tokenizes on whitespace after a fixed latency.
+
+run something like:
+python benchmarks/async_runner.py --documents 50 --latency 0.5
+"""
+import argparse
+import threading
+import time
+
+import lxml.etree as ET
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from spacytei.pipeline import SpacyProcess, XtxProcess, run_batch
+from spacytei.runner import run_pipeline
+
+
+TEI = '{http://www.tei-c.org/ns/1.0}'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+PARAGRAPH = '<p>Der Hans Maier ging am 3. Mai 1850 nach Wien und traf dort seinen Bruder.</p>'
+
+
+def create_document(paragraphs):
+    return (
+        '<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>{}</body></text></TEI>'.format(
+            PARAGRAPH * paragraphs
+        )
+    )
+
+
+def stand_in_xtx(latency):
+    """ starts a local server answering like XTX and returns its URL """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            root = ET.fromstring(self.rfile.read(int(self.headers['Content-Length'])))
+            counter = 0
+            for p in root.iter(TEI + 'p'):
+                words = "".join(p.itertext()).split()
+                for child in list(p):
+                    p.remove(child)
+                p.text = None
+                for word in words:
+                    counter += 1
+                    w = ET.SubElement(p, TEI + 'w')
+                    w.text = word
+                    w.set(XML_ID, 'xTok_{:06d}'.format(counter))
+                    w.tail = ' '
+            time.sleep(latency)
+            out = ET.tostring(root, encoding='utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return 'http://127.0.0.1:{}/'.format(server.server_address[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--paragraphs', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    url = stand_in_xtx(args.latency)
+    items = [(create_document(args.paragraphs), 'application/xml+tei')] * args.documents
+    processes = [(XtxProcess, {'XTX_URL': url}), SpacyProcess]
+    # load the model before measuring
+    run_batch(items[:1], processes)
+
+    start = time.perf_counter()
+    sequential = run_batch(items, processes)
+    t_sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    overlapped = run_pipeline(items, processes, concurrency=args.concurrency)
+    t_overlapped = time.perf_counter() - start
+    print("{} documents, {} s XTX latency".format(args.documents, args.latency))
+    print("run_batch:    {:6.2f} s ({} failed)".format(
+        t_sequential, sum(not x.ok for x in sequential)
+    ))
+    print("run_pipeline: {:6.2f} s ({} failed)".format(
+        t_overlapped, sum(not x.ok for x in overlapped)
+    ))
+
+
+if __name__ == '__main__':
+    main()
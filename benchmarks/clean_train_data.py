@@ -0,0 +1,80 @@
+"""
+Compares data_prep.clean_train_data with the former implementation, which filtered\
+the whole list first and then called langid.classify on every sample one by one.
+The samples are German, English and French sentences; like in real corpora, many\
+sentences (headers, formulas) occur more than once.
+
+run something like:
+python benchmarks/clean_train_data.py --samples 20000 --workers 4
+"""
+import argparse
+import random
+import time
+
+from spacytei.data_prep import clean_train_data
+
+
+SENTENCES = [
+    ("Der Hans Maier ging am 3. Mai nach Wien und traf dort seinen Bruder.", [(4, 14, 'PER')]),
+    ("Hochwohlgeborener Herr, ich danke Ihnen für Ihren Brief aus Graz.", [(60, 64, 'LOC')]),
+    ("In Salzburg wurde die Sitzung der Akademie auf den Herbst verschoben.", [(3, 11, 'LOC')]),
+    ("Mr. Smith travelled from London to Vienna in the spring of 1850.", [(4, 9, 'PER')]),
+    ("Je vous remercie de votre lettre de Paris du 3 mai.", [(36, 41, 'LOC')]),
+    ("Ihr ergebenster Diener", []),
+]
+
+
+def create_samples(n, distinct):
+    """ creates n samples of which about distinct ones are different """
+    random.seed(1)
+    pool = []
+    for i in range(distinct):
+        text, ents = random.choice(SENTENCES)
+        pool.append(("{} ({})".format(text, i), {'entities': ents}))
+    return [random.choice(pool) for _ in range(n)]
+
+
+def former_clean_train_data(train_data, min_ents=0, min_text_len=5, lang=['de']):
+    import langid
+
+    TRAIN_DATA = []
+    for x in train_data:
+        ents = x[1]
+        if ents and len(ents['entities']) >= min_ents and len(x[0]) >= min_text_len:
+            TRAIN_DATA.append(x)
+    return [x for x in TRAIN_DATA if langid.classify(x[0])[0] in lang]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    samples = create_samples(args.samples, args.distinct)
+    # load the langid models before measuring
+    former_clean_train_data(samples[:1])
+    list(clean_train_data(samples[:1], candidates=['de', 'en', 'fr'], max_workers=1))
+
+    start = time.perf_counter()
+    former = former_clean_train_data(samples, min_ents=1)
+    t_former = time.perf_counter() - start
+    start = time.perf_counter()
+    streamed = list(clean_train_data(samples, min_ents=1, max_workers=args.workers))
+    t_streamed = time.perf_counter() - start
+    start = time.perf_counter()
+    restricted = list(clean_train_data(
+        samples, min_ents=1, candidates=['de', 'en', 'fr'], max_workers=args.workers
+    ))
+    t_restricted = time.perf_counter() - start
+    print("{} samples, {} distinct".format(args.samples, args.distinct))
+    print("former:                   {:6.2f} s, {} kept".format(t_former, len(former)))
+    print("streamed:                 {:6.2f} s, {} kept, same result: {}".format(
+        t_streamed, len(streamed), streamed == former
+    ))
+    print("streamed, de/en/fr only:  {:6.2f} s, {} kept".format(t_restricted, len(restricted)))
+
+
+if __name__ == '__main__':
+    main()
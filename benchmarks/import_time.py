@@ -0,0 +1,75 @@
+"""
+Measures the import time of spacytei modules in fresh interpreters and checks\
+that they don't pull in heavy optional dependencies. Exits with status 1 if a\
+module takes longer than its budget or imports one of HEAVY_MODULES, so it can\
+be used as regression check.
+
+run something like:
+python benchmarks/import_time.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+# module: budget in seconds (median of the runs, measured in a fresh interpreter)
+BUDGETS = {
+    'spacytei.tei': 0.1,
+    'spacytei.tcf': 0.1,
+    'spacytei.xml': 0.1,
+    'spacytei.pipeline': 0.3,
+}
+
+# dependencies which must only be imported when they are used
+HEAVY_MODULES = [
+    'spacy', 'django', 'requests', 'jsonschema', 'pandas', 'langid', 'sklearn', 'gensim'
+]
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - start, sorted(set(x.split('.')[0] for x in sys.modules))]))
+"""
+
+
+def measure(module, runs):
+    """ imports module in runs fresh interpreters
+    :return: A tuple of the median import time and the top level packages imported
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    times = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', MEASURE.format(module=module)],
+            env=env, check=True, stdout=subprocess.PIPE
+        ).stdout
+        seconds, modules = json.loads(out.decode('utf-8'))
+        times.append(seconds)
+    return sorted(times)[len(times) // 2], modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies all budgets')
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        seconds, modules = measure(module, args.runs)
+        heavy = [x for x in HEAVY_MODULES if x in modules]
+        ok = seconds <= budget * args.scale and not heavy
+        failed = failed or not ok
+        print("{:20} {:6.3f} s (budget {:.3f} s) {}{}".format(
+            module, seconds, budget * args.scale, 'ok' if ok else 'FAILED',
+            ', imports {}'.format(', '.join(heavy)) if heavy else ''
+        ))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Runs texts through SpacyProcess twice with a fresh spacytei.result_cache.ResultCache\
+and checks that the cached Docs (second run) carry the same annotations as the\
+computed ones (first run): tags, lemmas, dependency arcs, sentences, entities and\
+the tokenId extension. Exits with status 1 if they differ.
+
+run something like:
+python benchmarks/result_cache.py --language de --documents 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from spacytei.pipeline import SpacyProcess, run_batch
+from spacytei.result_cache import ResultCache
+
+
+TEXT = (
+    "Der Hans Maier ging am 3. Mai 1850 nach Wien. Dort traf er seinen Bruder, "
+    "der ihm einen Brief aus Graz übergab. ({})"
+)
+
+
+def annotations(doc):
+    """ returns everything a cached Doc has to reproduce """
+    from spacy.attrs import ORTH, LEMMA, POS, TAG, DEP, HEAD, ENT_IOB, ENT_TYPE, SPACY
+
+    return (
+        doc.to_array([ORTH, LEMMA, POS, TAG, DEP, HEAD, ENT_IOB, ENT_TYPE, SPACY]).tolist(),
+        [(x.start, x.end) for x in doc.sents],
+        [x._.tokenId if x.has_extension('tokenId') else None for x in doc],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--language', default='de')
+    parser.add_argument('--documents', type=int, default=200)
+    args = parser.parse_args()
+
+    items = [(TEXT.format(i), 'text/plain') for i in range(args.documents)]
+    cache = ResultCache(os.path.join(tempfile.mkdtemp(), 'results.sqlite'))
+    process = (SpacyProcess, {
+        'options': {'model': None, 'language': args.language}, 'result_cache': cache
+    })
+    start = time.perf_counter()
+    missed = run_batch(items, [process])
+    t_miss = time.perf_counter() - start
+    start = time.perf_counter()
+    hit = run_batch(items, [process])
+    t_hit = time.perf_counter() - start
+    equal = all(annotations(x.payload) == annotations(y.payload) for x, y in zip(missed, hit))
+    print("miss: {:6.2f} s, hit: {:6.2f} s, {}".format(t_miss, t_hit, cache.stats()))
+    print("hit == miss: {}".format(equal))
+    sys.exit(0 if equal else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compares serializing and reading a sentence tokenlist as application/json+acdhlang\
+(json.dumps/json.loads of the dicts) and as application/x-acdhlang+binary\
+(spacytei.wire.dumps/loads of a ColumnarDoc).
+
+run something like:
+python benchmarks/wire_format.py --tokens 500000
+"""
+import argparse
+import json
+import timeit
+
+from spacytei.columnar import ColumnarDoc
+from spacytei import wire
+
+
+WORDS = [
+    ('Der', 'der', 'DET', 'ART', 'O'), ('Hans', 'Hans', 'PROPN', 'NE', 'B-PER'),
+    ('Maier', 'Maier', 'PROPN', 'NE', 'I-PER'), ('ging', 'gehen', 'VERB', 'VVFIN', 'O'),
+    ('nach', 'nach', 'ADP', 'APPR', 'O'), ('Wien', 'Wien', 'PROPN', 'NE', 'B-LOC'),
+    ('.', '.', 'PUNCT', '$.', 'O'),
+]
+
+
+def create_tokenlist(tokens):
+    result = []
+    for start in range(0, tokens, len(WORDS)):
+        sent = {'sent': " ".join(x[0] for x in WORDS), 'tokens': []}
+        for i, (value, lemma, pos, tag, iob) in enumerate(WORDS):
+            ent_iob, _, ent_type = iob.partition('-')
+            sent['tokens'].append({
+                'tokenId': 'w{}'.format(start + i),
+                'value': value,
+                'lemma': lemma,
+                'pos': pos,
+                'type': tag,
+                'dep': '',
+                'shape': 'Xxxx',
+                'is_alpha': value.isalpha(),
+                'ent_iob': ent_iob,
+                'iob': iob,
+                'ent_type': ent_type,
+            })
+        result.append(sent)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tokens', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tokenlist = create_tokenlist(args.tokens)
+    doc = ColumnarDoc.from_tokenlist(tokenlist)
+    as_json = json.dumps(tokenlist).encode('utf-8')
+    as_binary = wire.dumps(doc)
+    cases = [
+        ('serialize', lambda: json.dumps(tokenlist).encode('utf-8'), lambda: wire.dumps(doc)),
+        ('deserialize', lambda: json.loads(as_json), lambda: wire.loads(as_binary)),
+    ]
+    print("{} tokens, best of {} runs".format(args.tokens, args.repeat))
+    print("size          json: {:8.2f} MB       binary: {:8.2f} MB".format(
+        len(as_json) / 1e6, len(as_binary) / 1e6
+    ))
+    for name, before, after in cases:
+        t_before = min(timeit.repeat(before, number=1, repeat=args.repeat))
+        t_after = min(timeit.repeat(after, number=1, repeat=args.repeat))
+        print("{:<12}  json: {:8.2f} ms       binary: {:8.2f} ms   speedup: {:.1f}x".format(
+            name, t_before * 1e3, t_after * 1e3, t_before / t_after
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares the per-paragraph cost of NE and token extraction with XPath strings\
+parsed on every call (as done before spacytei.xml.get_xpath existed) and with\
+the precompiled XPaths used by TeiReader now.
+
+run something like:
+python benchmarks/xpath_registry.py --paragraphs 5000
+"""
+import argparse
+import re
+import timeit
+
+from spacytei.tei import TeiReader, NER_TAG_MAP
+
+
+PARAGRAPH = (
+    '<p><w xml:id="w{0}_1">Der</w> <rs type="person"><w xml:id="w{0}_2">Hans</w> '
+    '<w xml:id="w{0}_3">Maier</w></rs> <w xml:id="w{0}_4">ging</w> <w xml:id="w{0}_5">nach</w> '
+    '<placeName><w xml:id="w{0}_6">Wien</w></placeName><pc xml:id="pc{0}_1">.</pc></p>'
+)
+
+
+def create_document(paragraphs):
+    body = "".join(PARAGRAPH.format(i) for i in range(paragraphs))
+    return (
+        '<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>{}</body></text></TEI>'.format(body)
+    )
+
+
+def uncompiled_text_nes_list(doc, parent_nodes='.//tei:body//tei:p', ne_xpath='.//tei:rs'):
+    result = []
+    for node in doc.tree.xpath(parent_nodes, namespaces=doc.ns_tei):
+        text = re.sub(r'\s+', ' ', "".join(node.xpath(".//text()"))).strip()
+        ner_dicts = []
+        for x in node.xpath(ne_xpath, namespaces=doc.ns_tei):
+            item = {}
+            item['text'] = re.sub(r'\s+', ' ', "".join(x.xpath('.//text()'))).strip()
+            try:
+                ne_type = NER_TAG_MAP.get("{}".format(x.xpath('./@type')[0]), 'MISC')
+            except IndexError:
+                ne_type = NER_TAG_MAP.get("{}".format(x.xpath("name()")), 'MISC')
+            item['ne_type'] = ne_type
+            ner_dicts.append(item)
+        result.append({'text': text, 'ner_dicts': ner_dicts})
+    return result
+
+
+def uncompiled_tokenlist(doc):
+    expr = "//tei:*[local-name() = $name or local-name() = $pc]"
+    token_list = []
+    for x in doc.tree.xpath(expr, name="w", pc="pc", namespaces=doc.ns_tei):
+        following = x.getnext()
+        token_list.append({
+            'value': x.text,
+            'tokenId': x.xpath('./@xml:id', namespaces=doc.ns_tei)[0],
+            'whitespace': following is None or not following.tag.endswith('pc')
+        })
+    return token_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--paragraphs', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    doc = TeiReader(create_document(args.paragraphs))
+    cases = [
+        ('get_text_nes_list', lambda: uncompiled_text_nes_list(doc), doc.get_text_nes_list),
+        ('create_tokenlist', lambda: uncompiled_tokenlist(doc), doc.create_tokenlist),
+    ]
+    print("{} paragraphs, best of {} runs".format(args.paragraphs, args.repeat))
+    for name, before, after in cases:
+        t_before = min(timeit.repeat(before, number=1, repeat=args.repeat))
+        t_after = min(timeit.repeat(after, number=1, repeat=args.repeat))
+        print(
+            "{:<20} before: {:8.2f} µs/p   after: {:8.2f} µs/p   speedup: {:.2f}x".format(
+                name,
+                t_before / args.paragraphs * 1e6,
+                t_after / args.paragraphs * 1e6,
+                t_before / t_after
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
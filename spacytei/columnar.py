@@ -0,0 +1,414 @@
+"""
+This module provides a columnar (struct-of-arrays) form of the acdhlang tokenlist:\
+one integer array per token attribute, with all strings interned in a per-document\
+string table and the sentence boundaries stored as an offsets array.
+"""
+import numpy as np
+
+
+# marks a token without a value for the key of a column
+MISSING = -1
+
+# the columns created from a spaCy Doc, in the key order of tokenlist.doc_to_tokenlist
+DOC_COLUMNS = (
+    'tokenId', 'value', 'lemma', 'pos', 'type', 'dep', 'shape', 'is_alpha', 'ent_iob',
+    'iob', 'ent_type', 'whitespace'
+)
+
+# spacy's ENT_IOB values and their string forms
+ENT_IOB_STRINGS = {0: '', 1: 'I', 2: 'O', 3: 'B'}
+ENT_IOB_VALUES = {'': 0, 'I': 1, 'O': 2, 'B': 3}
+
+# the attributes ColumnarDoc.to_doc can set, 'ENT' stands for ENT_IOB and ENT_TYPE
+DOC_ATTRS = ('TAG', 'POS', 'LEMMA', 'ENT', 'SENT_START')
+
+_extensions_registered = False
+
+
+def register_extensions():
+    """ registers the token extensions used by spacytei (tokenId) once per process """
+    global _extensions_registered
+    if _extensions_registered:
+        return
+    from spacy.tokens import Token
+    if not Token.has_extension('tokenId'):
+        Token.set_extension('tokenId', default=False)
+    _extensions_registered = True
+
+
+class StringTable():
+
+    """ interns the values of a document; every distinct value is stored once and referred to\
+    by its index. Values are keyed together with their type, so 1 and '1' stay apart """
+
+    def __init__(self, values=()):
+        """
+        :param values: Distinct values to start with, e.g. a deserialized table; the lookup\
+        index is only built once a value is added
+        """
+        self.values = list(values)
+        self._index = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def add(self, value):
+        """ returns the index of value, adding it to the table if needed """
+        if self._index is None:
+            self._index = {(type(x), x): i for i, x in enumerate(self.values)}
+        key = (type(value), value)
+        index = self._index.get(key)
+        if index is None:
+            index = len(self.values)
+            self._index[key] = index
+            self.values.append(value)
+        return index
+
+    def encode(self, values):
+        """ turns a sequence of values (None meaning missing) into an int64 array of indices """
+        return np.fromiter(
+            (MISSING if x is None else self.add(x) for x in values),
+            dtype=np.int64, count=len(values)
+        )
+
+    def decode(self, column):
+        """ turns an array of indices into a list of values (None for MISSING) """
+        values = self.values
+        return [None if x == MISSING else values[x] for x in column.tolist()]
+
+
+class ColumnarDoc():
+
+    """ the tokens of a document as columns. String-like columns hold indices into self.strings,\
+    boolean columns hold 0/1; both use MISSING for tokens without the key. The tokens of\
+    sentence i are the rows sent_offsets[i]:sent_offsets[i + 1]; sent_offsets is None for\
+    a flat tokenlist without sentences.
+    Iterating over a ColumnarDoc yields sentence dicts like the ones of\
+    tokenlist.doc_to_tokenlist, so it can be passed wherever such a tokenlist is read.
+    """
+
+    def __init__(self, strings=None, columns=None, kinds=None, sent_offsets=None, sent_texts=None):
+        """
+        :param strings: A StringTable
+        :param columns: A dict mapping token-dict keys to int64 arrays; its order is the key\
+        order of the token dicts
+        :param kinds: A dict mapping the keys to 'str' (interned values) or 'bool'
+        :param sent_offsets: An int64 array with one entry more than there are sentences
+        :param sent_texts: An int64 array of indices into strings, one per sentence
+        """
+        self.strings = strings if strings is not None else StringTable()
+        self.columns = columns if columns is not None else {}
+        self.kinds = kinds if kinds is not None else {}
+        self.sent_offsets = sent_offsets
+        self.sent_texts = sent_texts
+
+    @property
+    def n_tokens(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    @property
+    def has_sents(self):
+        return self.sent_offsets is not None
+
+    def __len__(self):
+        """ the number of sentences, or tokens if there are no sentences (like the tokenlist) """
+        if self.has_sents:
+            return len(self.sent_offsets) - 1
+        return self.n_tokens
+
+    def __iter__(self):
+        if self.has_sents:
+            return self.iter_sents()
+        return self.iter_tokens()
+
+    def column(self, key, start=0, end=None):
+        """ returns the values of a column as list, None for tokens without the key
+        :param key: A token-dict key like 'lemma'
+        :param start: The first row
+        :param end: The row after the last one; defaults to the number of tokens
+        """
+        column = self.columns[key][start:end]
+        if self.kinds[key] == 'bool':
+            return [None if x == MISSING else bool(x) for x in column.tolist()]
+        return self.strings.decode(column)
+
+    def iter_tokens(self, start=0, end=None):
+        """ yields token dicts for the rows start:end """
+        end = self.n_tokens if end is None else end
+        keys = list(self.columns.keys())
+        values = [self.column(key, start, end) for key in keys]
+        for row in zip(*values):
+            yield {key: value for key, value in zip(keys, row) if value is not None}
+
+    def iter_sents(self):
+        """ yields sentence dicts like {'sent': 'Wien ist schön', 'tokens': [{...}, ...]} """
+        offsets = self.sent_offsets.tolist()
+        texts = self.strings.decode(self.sent_texts)
+        keys = list(self.columns.keys())
+        values = [self.column(key) for key in keys]
+        for i, text in enumerate(texts):
+            start, end = offsets[i], offsets[i + 1]
+            tokens = [
+                {key: value[j] for key, value in zip(keys, values) if value[j] is not None}
+                for j in range(start, end)
+            ]
+            sent = {}
+            if text is not None:
+                sent['sent'] = text
+            sent['tokens'] = tokens
+            yield sent
+
+    def to_tokenlist(self):
+        """ returns the dict form: a list of sentence dicts, or of token dicts if there are no\
+        sentences """
+        return list(self)
+
+    @classmethod
+    def from_tokenlist(cls, tokenlist):
+        """ creates a ColumnarDoc from a list of sentence dicts ({'sent': ..., 'tokens': [...]})\
+        or a flat list of token dicts as returned by TeiReader.create_tokenlist
+        :param tokenlist: A tokenlist or a ColumnarDoc, which is returned as it is
+        :return: A ColumnarDoc
+        """
+        if isinstance(tokenlist, cls):
+            return tokenlist
+        tokenlist = list(tokenlist)
+        has_sents = bool(tokenlist) and 'tokens' in tokenlist[0]
+        if has_sents:
+            tokens = [x for sent in tokenlist for x in sent['tokens']]
+        else:
+            tokens = tokenlist
+        keys = {}
+        for x in tokens:
+            for key in x:
+                keys.setdefault(key, None)
+        values = {key: [x.get(key) for x in tokens] for key in keys}
+        if has_sents:
+            return cls.from_columns(
+                values,
+                [len(sent['tokens']) for sent in tokenlist],
+                [sent.get('sent') for sent in tokenlist]
+            )
+        return cls.from_columns(values)
+
+    @classmethod
+    def from_columns(cls, values, sent_lengths=None, sent_texts=None):
+        """ creates a ColumnarDoc from lists of values
+        :param values: A dict mapping token-dict keys to lists of values (None for missing);\
+        columns with only booleans are stored as 'bool' columns
+        :param sent_lengths: The number of tokens per sentence, None for a flat tokenlist
+        :param sent_texts: The texts of the sentences
+        :return: A ColumnarDoc
+        """
+        strings = StringTable()
+        columns = {}
+        kinds = {}
+        for key, column in values.items():
+            if all(isinstance(x, bool) for x in column if x is not None):
+                kinds[key] = 'bool'
+                columns[key] = np.fromiter(
+                    (MISSING if x is None else int(x) for x in column),
+                    dtype=np.int64, count=len(column)
+                )
+            else:
+                kinds[key] = 'str'
+                columns[key] = strings.encode(column)
+        doc = cls(strings, columns, kinds)
+        if sent_lengths is not None:
+            doc.sent_offsets = np.zeros(len(sent_lengths) + 1, dtype=np.int64)
+            np.cumsum(sent_lengths, out=doc.sent_offsets[1:])
+            if sent_texts is None:
+                sent_texts = [None] * len(sent_lengths)
+            doc.sent_texts = strings.encode(sent_texts)
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc):
+        """ creates a ColumnarDoc from a spacy Doc using Doc.to_array
+        :param doc: A spacy Doc
+        :return: A ColumnarDoc with the columns of DOC_COLUMNS
+        """
+        from spacy.attrs import ORTH, LEMMA, POS, TAG, DEP, SHAPE, IS_ALPHA, ENT_IOB, ENT_TYPE
+        from spacy.attrs import SPACY
+        from spacy.tokens import Token
+
+        strings = StringTable()
+        vocab_strings = doc.vocab.strings
+        array = doc.to_array([ORTH, LEMMA, POS, TAG, DEP, SHAPE, IS_ALPHA, ENT_IOB, ENT_TYPE, SPACY])
+        array = array.astype(np.uint64)
+
+        def intern(hashes, to_string=lambda x: vocab_strings[x]):
+            # look up every distinct value only once
+            unique, inverse = np.unique(hashes, return_inverse=True)
+            table = np.array([strings.add(to_string(int(x))) for x in unique], dtype=np.int64)
+            return table[inverse.reshape(-1)]
+
+        columns = {}
+        if Token.has_extension('tokenId'):
+            columns['tokenId'] = strings.encode([x._.tokenId for x in doc])
+        else:
+            columns['tokenId'] = strings.encode(list(range(len(doc))))
+        columns['value'] = intern(array[:, 0])
+        columns['lemma'] = intern(array[:, 1])
+        columns['pos'] = intern(array[:, 2])
+        columns['type'] = intern(array[:, 3])
+        columns['dep'] = intern(array[:, 4])
+        columns['shape'] = intern(array[:, 5])
+        columns['is_alpha'] = array[:, 6].astype(np.int64)
+        columns['ent_iob'] = intern(array[:, 7], ENT_IOB_STRINGS.get)
+        unique, inverse = np.unique(array[:, 7:9], axis=0, return_inverse=True)
+        table = np.array([
+            strings.add(format_iob(ENT_IOB_STRINGS[int(iob)], vocab_strings[int(ent_type)]))
+            for iob, ent_type in unique
+        ], dtype=np.int64)
+        columns['iob'] = table[inverse.reshape(-1)]
+        columns['ent_type'] = intern(array[:, 8])
+        columns['whitespace'] = array[:, 9].astype(np.int64)
+        columns = {key: columns[key] for key in DOC_COLUMNS}
+        kinds = {key: 'str' for key in columns}
+        kinds['is_alpha'] = 'bool'
+        kinds['whitespace'] = 'bool'
+        sents = list(doc.sents) if doc.is_sentenced else [doc[:]]
+        sent_offsets = np.array([x.start for x in sents] + [len(doc)], dtype=np.int64)
+        sent_texts = strings.encode(["{}".format(x) for x in sents])
+        return cls(strings, columns, kinds, sent_offsets, sent_texts)
+
+    def to_doc(self, vocab, attrs=DOC_ATTRS):
+        """ creates a spacy Doc; the type (TAG), pos, lemma and entity columns are set with\
+        Doc.from_array, the tokenId column is stored in the tokenId extension. Entities are\
+        taken from ent_iob/ent_type or, if missing, from iob tags like 'B-PER'
+        :param vocab: A spacy Vocab, e.g. nlp.vocab
+        :param attrs: The attributes to set, a subset of DOC_ATTRS
+        :return: A spacy Doc
+        """
+        from spacy.attrs import LEMMA, POS, TAG, ENT_IOB, ENT_TYPE, SENT_START
+        from spacy.parts_of_speech import IDS as POS_IDS
+        from spacy.tokens import Doc
+
+        words = ['' if x is None else x for x in self.column('value')]
+        if 'whitespace' in self.columns:
+            spaces = [True if x is None else x for x in self.column('whitespace')]
+        else:
+            spaces = [True] * len(words)
+        doc = Doc(vocab, words=words, spaces=spaces)
+        register_extensions()
+        if 'tokenId' in self.columns:
+            for token, token_id in zip(doc, self.column('tokenId')):
+                token._.tokenId = token_id if token_id is not None else False
+        attr_ids = []
+        arrays = []
+        # every table entry is mapped once; MISSING (-1) picks the trailing 0, i.e. "no value"
+        hashes = self._map_strings(lambda x: vocab.strings.add(x))
+        for name, key, attr_id in (('TAG', 'type', TAG), ('LEMMA', 'lemma', LEMMA)):
+            if name in attrs and self._has_values(key):
+                attr_ids.append(attr_id)
+                arrays.append(hashes[self.columns[key]])
+        if 'POS' in attrs and self._has_values('pos'):
+            attr_ids.append(POS)
+            arrays.append(self._map_strings(lambda x: POS_IDS.get(x, 0))[self.columns['pos']])
+        if 'ENT' in attrs and self._has_values('ent_iob') and 'ent_type' in self.columns:
+            attr_ids.extend([ENT_IOB, ENT_TYPE])
+            arrays.append(
+                self._map_strings(lambda x: ENT_IOB_VALUES.get(x, 0))[self.columns['ent_iob']]
+            )
+            arrays.append(hashes[self.columns['ent_type']])
+        elif 'ENT' in attrs and self._has_values('iob'):
+            attr_ids.extend([ENT_IOB, ENT_TYPE])
+            iob = self.columns['iob']
+            arrays.append(self._map_strings(
+                lambda x: ENT_IOB_VALUES.get(x.partition('-')[0], 0)
+            )[iob])
+            arrays.append(self._map_strings(
+                lambda x: vocab.strings.add(x.partition('-')[2])
+            )[iob])
+        if 'SENT_START' in attrs and self.has_sents and len(doc):
+            # 1 marks the first token of a sentence, 0 leaves the others undecided
+            sent_start = np.zeros(len(doc), dtype=np.int64)
+            sent_start[self.sent_offsets[:-1][self.sent_offsets[:-1] < len(doc)]] = 1
+            attr_ids.append(SENT_START)
+            arrays.append(sent_start.astype(np.uint64))
+        if attr_ids:
+            doc.from_array(attr_ids, np.stack(arrays, axis=1))
+        return doc
+
+    def _map_strings(self, func):
+        """ applies func to every string of the table, returns an uint64 array with one\
+        trailing 0 for MISSING """
+        return np.array(
+            [func(x) if isinstance(x, str) else 0 for x in self.strings.values] + [0],
+            dtype=np.uint64
+        )
+
+    def _has_values(self, key):
+        return key in self.columns and bool((self.columns[key] != MISSING).any())
+
+
+def format_iob(ent_iob, ent_type):
+    """ the string form of spacytei.ner.format_iob_tag, e.g. 'B-PER' or 'O' """
+    if ent_iob != 'O':
+        return "{0}-{1}".format(ent_iob, ent_type)
+    return ent_iob
+
+
+def run_lengths(keys):
+    """ returns the lengths of the runs of equal keys, e.g. the sentence lengths of tokens\
+    keyed by their sentence element; a token without a sentence (None) continues the run """
+    lengths = []
+    current = None
+    for key in keys:
+        if not lengths or (key is not None and key != current):
+            lengths.append(0)
+            current = key
+        lengths[-1] += 1
+    return lengths
+
+
+def sent_texts(values, spaces, lengths):
+    """ returns the text of every sentence
+    :param values: The texts of the tokens
+    :param spaces: Per token, if it is followed by whitespace
+    :param lengths: The number of tokens per sentence, see run_lengths
+    """
+    text = [(x or '') + (' ' if space else '') for x, space in zip(values, spaces)]
+    texts = []
+    start = 0
+    for length in lengths:
+        texts.append("".join(text[start:start + length]).strip())
+        start += length
+    return texts
+
+
+def group_tokens(tokens, lengths):
+    """ groups a flat list of token dicts into sentence dicts like tokenlist.doc_to_tokenlist\
+    returns them, e.g. [{'sent': 'Wien ist schön', 'tokens': [{...}, ...]}]
+    :param tokens: A list of token dicts
+    :param lengths: The number of tokens per sentence, see run_lengths
+    """
+    texts = sent_texts(
+        [x.get('value') for x in tokens], [x.get('whitespace', True) for x in tokens], lengths
+    )
+    sents = []
+    start = 0
+    for text, length in zip(texts, lengths):
+        sents.append({'sent': text, 'tokens': tokens[start:start + length]})
+        start += length
+    return sents
+
+
+def as_sents(tokenlist):
+    """ returns a tokenlist as list of sentence dicts; a flat list of token dicts (or a\
+    ColumnarDoc without sentences) becomes a single sentence """
+    tokenlist = list(tokenlist)
+    if tokenlist and 'tokens' not in tokenlist[0]:
+        return [{'tokens': tokenlist}]
+    return tokenlist
+
+
+def as_columnar(tokenlist):
+    """ returns tokenlist as ColumnarDoc, converting a dict tokenlist if needed """
+    return ColumnarDoc.from_tokenlist(tokenlist)
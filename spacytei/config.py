@@ -1,3 +1,6 @@
+import os
+
+
 SPACY_LANG_LST = {
     "german": "de_core_news_sm",
     "de": "de_core_news_sm",
@@ -10,4 +13,86 @@ SPACY_LANG_LST = {
 
 SPACY_PIPELINE = ['tagger', 'parser', 'ner']
 
+# number of docs passed at once to the pipe method of spaCy components
+SPACY_BATCH_SIZE = 64
+
+# the token attributes written by spaCy components, see spacytei.incremental. The first one
+# tells if a token is annotated; a component only runs on docs with unannotated tokens and
+# all listed attributes of annotated tokens are kept. Other components always run
+SPACY_COMPONENT_ATTRS = {
+    'tagger': ['TAG', 'POS', 'LEMMA'],
+    'parser': ['DEP', 'HEAD'],
+    'ner': ['ENT_IOB', 'ENT_TYPE'],
+    'entity_ruler': ['ENT_IOB', 'ENT_TYPE'],
+    'sentencizer': ['SENT_START'],
+}
+
+# if False, SpacyProcess runs every component on spacyDoc payloads, overwriting annotations
+SPACY_INCREMENTAL = True
+
 XTX_URL = "https://xtx.acdh.oeaw.ac.at/exist/restxq/xtx/tokenize/default"
+
+XML_PARSER_OPTIONS = {
+    "huge_tree": True,
+    "no_network": True,
+    "remove_blank_text": False,
+}
+
+# upper limit for spacytei.doc_cache.DOCUMENT_CACHE in estimated bytes of the cached trees
+DOCUMENT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# estimated memory of a parsed node (libxml2 element plus its text and attribute nodes) in bytes,
+# added to the size of the source for every element, comment and processing instruction
+DOCUMENT_CACHE_NODE_BYTES = 400
+
+# settings of spacytei.xtx.XtxClient
+XTX_MAX_WORKERS = 4
+XTX_CHUNK_BYTES = 256 * 1024
+XTX_TIMEOUT = (10, 300)
+
+# maximum number of documents waiting between two processes of spacytei.runner.PipelineRunner
+PIPELINE_QUEUE_SIZE = 16
+
+# upper limit for spacytei.models.MODEL_REGISTRY, estimated by the size of the model folders
+MODEL_REGISTRY_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# spacytei.result_cache: if enabled, SpacyProcess and XtxProcess results are stored in a SQLite
+# file at RESULT_CACHE_PATH, bounded to RESULT_CACHE_MAX_BYTES (least recently used first out)
+RESULT_CACHE_ENABLED = False
+RESULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'spacytei', 'results.sqlite')
+RESULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# abbreviations not ending a sentence, used by spacytei.sentences.RuleSentenceSplitter
+SENTENCE_ABBREVIATIONS = {
+    "de": [
+        "abs.", "anm.", "art.", "bd.", "bde.", "bl.", "bzw.", "ca.", "d.h.", "dgl.", "dr.",
+        "durchl.", "ebd.", "ehem.", "etc.", "ew.", "evtl.", "exc.", "f.", "ff.", "fl.", "fol.",
+        "fr.", "frl.", "geb.", "gest.", "ggf.", "hl.", "hr.", "hrn.", "hrsg.", "jh.", "jhdt.",
+        "k.k.", "kais.", "kgl.", "kön.", "kr.", "lt.", "maj.", "mag.", "mr.", "n.chr.", "nr.",
+        "pag.", "pfd.", "pfr.", "prof.", "r.", "röm.", "s.", "se.", "sel.", "sog.", "sp.", "sr.",
+        "st.", "str.", "u.", "u.a.", "u.s.w.", "usw.", "v.", "v.chr.", "vgl.", "z.b.", "z.t.",
+        "jan.", "febr.", "feb.", "apr.", "jun.", "jul.", "aug.", "sept.", "sep.",
+        "okt.", "oct.", "nov.", "dez.", "dec.", "xbris.", "7bris.", "8bris.", "9bris.",
+    ],
+}
+
+# how pipeline payloads are checked: 'off', 'structural' (cheap shape checks) or 'full'
+# (JSON schema / TEI schema); see spacytei.validation
+VALIDATION_LEVEL = 'structural'
+
+# with VALIDATION_LEVEL 'full' only this many tokens of a json+acdhlang payload are checked
+# against the JSON schema; None checks all of them
+VALIDATION_SAMPLE_SIZE = 1000
+
+# package resources of the schemas, a TEI schema ending in '.rng' is read as RelaxNG
+ACDHLANG_SCHEMA_RESOURCE = 'schema/acdh_lang_jsonschema.json'
+TEI_SCHEMA_RESOURCE = 'schema/tei_all.xsd'
+
+# if True, spacytei.instrumentation.INSTRUMENTATION records the pipeline stages from the start;
+# it keeps at most INSTRUMENTATION_MAX_RECORDS records, dropping the oldest ones
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_MAX_RECORDS = 10000
+
+# spacytei.data_prep.clean_train_data: number of texts classified per langid task and number of
+# worker processes (None: one per CPU; with 1 or inputs of a single chunk no pool is started)
+LANGID_CHUNK_SIZE = 2000
+LANGID_MAX_WORKERS = None
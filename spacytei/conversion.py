@@ -1,90 +1,198 @@
+import heapq
+import time
+
+from spacytei.columnar import ColumnarDoc, as_columnar
+from spacytei.doc_cache import DOCUMENT_CACHE
+from spacytei.instrumentation import INSTRUMENTATION
 from spacytei.tcf import Tcf
 from spacytei.tei import TeiReader
 from spacytei.tokenlist import doc_to_tokenlist
 from spacytei.tokenlist import process_tokenlist
+from spacytei.wire import dumps as dumps_binary, loads as loads_binary
 # from .base import check_validity_payload
 
 
-MAPPING_CONVERTERS = {'from': {
-    'application/xml+tei': (TeiReader, [('xml', 'context.original_xml')], 'create_tokenlist', [],),
-    'spacyDoc': (doc_to_tokenlist, [('doc', 'payload')]),
-    'application/xml+tcf': (Tcf, [('xml', 'context.original_xml')], 'create_tokenlist', [],)
-},
-    'to': {
-        'application/xml+tei': (
-            TeiReader,
-            [('xml', 'context.original_xml')],
-            'process_tokenlist',
-            [('tokenlist', '$data_json',), ]
-        ),
-        'spacyDoc': (process_tokenlist, [('nlp', 'nlp'), ('tokenlist', '$data_json')]),
-        'application/xml+tcf': (
-            Tcf,
-            [('xml', 'context.original_xml')],
-            'process_tokenlist',
-            [('tokenlist', '$data_json',), ]
-        ),
-        'application/json+acdhlang': (doc_to_tokenlist, [('doc', 'payload')]),
-    }
+TEI = 'application/xml+tei'
+TCF = 'application/xml+tcf'
+SPACY_DOC = 'spacyDoc'
+ACDHLANG = 'application/json+acdhlang'
+COLUMNAR = 'application/x-acdhlang+columnar'
+BINARY = 'application/x-acdhlang+binary'
+
+XML_SOURCE = [('xml', 'context.original_xml'), ('cache', '$document_cache')]
+
+# (source, target): (callable, args, method, method args, cost). '$data_json' is the value of
+# the source type, other '$' args are attributes of the Converter, other strings are read from the
+# original process and anything else is passed as it is. The costs are rough estimates of the
+# time per token, relative to each other.
+CONVERSION_EDGES = {
+    (TEI, SPACY_DOC): (TeiReader, XML_SOURCE, 'create_doc', [('vocab', 'nlp.vocab')], 2),
+    (TEI, COLUMNAR): (TeiReader, XML_SOURCE, 'create_columns', [], 2),
+    (TEI, ACDHLANG): (TeiReader, XML_SOURCE, 'create_tokenlist', [('sents', True)], 3),
+    (TCF, COLUMNAR): (Tcf, XML_SOURCE, 'create_columns', [], 2),
+    (TCF, ACDHLANG): (Tcf, XML_SOURCE, 'create_tokenlist', [('sents', True)], 3),
+    (SPACY_DOC, COLUMNAR): (ColumnarDoc.from_doc, [('doc', '$data_json')], 1),
+    (SPACY_DOC, ACDHLANG): (doc_to_tokenlist, [('doc', '$data_json')], 4),
+    (COLUMNAR, SPACY_DOC): (process_tokenlist, [('nlp', 'nlp'), ('tokenlist', '$data_json')], 1),
+    (ACDHLANG, SPACY_DOC): (process_tokenlist, [('nlp', 'nlp'), ('tokenlist', '$data_json')], 3),
+    (COLUMNAR, ACDHLANG): (ColumnarDoc.to_tokenlist, [('self', '$data_json')], 2),
+    (ACDHLANG, COLUMNAR): (as_columnar, [('tokenlist', '$data_json')], 2),
+    (COLUMNAR, BINARY): (dumps_binary, [('doc', '$data_json')], 0.5),
+    (BINARY, COLUMNAR): (loads_binary, [('data', '$data_json')], 0.2),
+    (COLUMNAR, TEI): (
+        TeiReader, XML_SOURCE, 'process_tokenlist', [('tokenlist', '$data_json')], 3
+    ),
+    (ACDHLANG, TEI): (
+        TeiReader, XML_SOURCE, 'process_tokenlist', [('tokenlist', '$data_json')], 3
+    ),
+    (COLUMNAR, TCF): (Tcf, XML_SOURCE, 'process_tokenlist', [('tokenlist', '$data_json')], 3),
+    (ACDHLANG, TCF): (Tcf, XML_SOURCE, 'process_tokenlist', [('tokenlist', '$data_json')], 3),
 }
 
+DATA_TYPES = set(x for edge in CONVERSION_EDGES for x in edge)
 
-class Converter:
+# the tables of the former Converter: conversions into and out of application/json+acdhlang
+MAPPING_CONVERTERS = {
+    'from': {s: edge[:-1] for (s, t), edge in CONVERSION_EDGES.items() if t == ACDHLANG},
+    'to': {t: edge[:-1] for (s, t), edge in CONVERSION_EDGES.items() if s == ACDHLANG},
+}
+
+
+def plan_conversion(source, target, available=(), edges=CONVERSION_EDGES):
+    """ finds the cheapest chain of conversions from source to target (Dijkstra)
+    :param source: The MIME type of the data
+    :param target: The MIME type to convert to
+    :param available: Further MIME types whose values are known already (cost 0)
+    :param edges: A dict like CONVERSION_EDGES
+    :return: A tuple of the list of (from, to) steps and the summed up cost
+    """
+    graph = {}
+    for (a, b), edge in edges.items():
+        graph.setdefault(a, []).append((b, edge[-1]))
+    queue = [(0, x) for x in set([source]) | set(available)]
+    heapq.heapify(queue)
+    costs = {x: 0 for _, x in queue}
+    previous = {}
+    while queue:
+        cost, node = heapq.heappop(queue)
+        if node == target:
+            break
+        if cost > costs[node]:
+            continue
+        for next_node, edge_cost in graph.get(node, []):
+            new_cost = cost + edge_cost
+            if new_cost < costs.get(next_node, float('inf')):
+                costs[next_node] = new_cost
+                previous[next_node] = node
+                heapq.heappush(queue, (new_cost, next_node))
+    if target not in costs:
+        raise ValueError('There is no conversion from {} to {}.'.format(source, target))
+    steps = []
+    node = target
+    while node in previous:
+        steps.insert(0, (previous[node], node))
+        node = previous[node]
+    return steps, costs[target]
 
-    def convert_bak(self, to):
-        if len(MAPPING_CONVERTERS['to'][to]) == 2:
-            self.data_converted = MAPPING_CONVERTERS['to'][to][0](self.data_json)
-            self.data_converted = getattr(self.data_converted, MAPPING_CONVERTERS['to'][to][1])()
-        else:
-            self.data_converted = MAPPING_CONVERTERS['to'][to][0](self.data_json)
-        return self.data_converted
 
-    def _convert_internal(self, l, t):
-        attr_dict = {}
-        to = MAPPING_CONVERTERS[l][t]
-        for d in to[1]:
-            if d[1].startswith('$'):
-                attr_dict[d[0]] = getattr(self, d[1][1:])
+class Converter:
+    """ converts the payload of a pipeline process along the cheapest chain of\
+    CONVERSION_EDGES. Every intermediate value is memoized on the process context\
+    (context['conversions']) as long as the payload stays the same, so later steps\
+    reuse them. The chosen plan is stored in self.plan and the timing of every step\
+    in self.timings (and both in context['conversion_log'])
+    """
+    document_cache = DOCUMENT_CACHE
+    edges = CONVERSION_EDGES
+
+    def _resolve(self, spec, data):
+        """ returns the value of an argument spec like '$data_json' or 'context.original_xml' """
+        if not isinstance(spec, str):
+            return spec
+        if spec == '$data_json':
+            return data
+        if spec.startswith('$'):
+            return getattr(self, spec[1:])
+        lst_dict = spec.split('.')
+        res = self.original_process
+        for att in lst_dict:
+            if isinstance(res, dict):
+                res = res[att]
             else:
-                lst_dict = d[1].split('.')
-                attr_1 = lst_dict.pop(0)
-                res_3 = getattr(self.original_process, attr_1)
-                for att_2 in lst_dict:
-                    res_3 = res_3[att_2]
-                attr_dict[d[0]] = res_3
-                # check_1 = getattr(self.original_process, 'context', None)
-                # if check_1 is None:
-                #    print('check worked correct')
-                #    attr_dict[d[0]] = getattr(self.original_process, d[1])
-                # else:
-                #    print(d[1])
-                #    if d[1] not in check_1.keys():
-                #        attr_dict[d[0]] = getattr(self.original_process, d[1])
-                #    else:
-                #        attr_dict[d[0]] = check_1[d[1]]
-        data_converted = to[0](**attr_dict)
-        if len(to) > 2:
-            attr_dict = {}
-            for d in to[3]:
-                if d[1].startswith('$'):
-                    attr_dict[d[0]] = getattr(self, d[1][1:])
-                else:
-                    attr_dict[d[0]] = getattr(self.original_process, d[1])
-            data_converted = getattr(data_converted, to[2])(**attr_dict)
+                res = getattr(res, att)
+        return res
+
+    def _run_edge(self, edge, data):
+        attr_dict = {d[0]: self._resolve(d[1], data) for d in edge[1]}
+        data_converted = edge[0](**attr_dict)
+        if len(edge) > 3:
+            attr_dict = {d[0]: self._resolve(d[1], data) for d in edge[3]}
+            data_converted = getattr(data_converted, edge[2])(**attr_dict)
         return data_converted
 
+    def _memo(self):
+        """ returns the dict of values of the current payload memoized on the process context """
+        context = getattr(self.original_process, 'context', None)
+        if context is None:
+            return {self.data_type: self.data}
+        memo = context.get('conversions')
+        if memo is None or memo['source'] is not self.data:
+            memo = {'source': self.data, 'values': {}}
+            context['conversions'] = memo
+        memo['values'][self.data_type] = self.data
+        return memo['values']
+
     def convert(self, to):
-        self.data_converted = self._convert_internal('to', to)
+        self.data_converted, self.plan, self.cost, self.timings = self._convert(to)
         return self.data_converted
 
+    def convert_bak(self, to):
+        """ kept for compatibility, see convert() """
+        return self.convert(to)
+
+    @property
+    def data_json(self):
+        """ the payload as application/json+acdhlang, like the former Converter provided it;\
+        converted on first access, without changing self.plan and self.timings """
+        if self._data_json is None:
+            self._data_json = self._convert(ACDHLANG)[0]
+        return self._data_json
+
+    def _convert(self, to):
+        """ returns the converted value, the plan, its cost and the timings of the steps """
+        values = self._memo()
+        if to in values:
+            return values[to], [], 0, []
+        plan, cost = plan_conversion(self.data_type, to, available=values.keys(), edges=self.edges)
+        timings = []
+        for source, target in plan:
+            start = time.perf_counter()
+            values[target] = self._run_edge(self.edges[(source, target)], values[source])
+            timing = {
+                'from': source,
+                'to': target,
+                'cost': self.edges[(source, target)][-1],
+                'seconds': time.perf_counter() - start,
+            }
+            timings.append(timing)
+            INSTRUMENTATION.record('conversion_hop', **timing)
+        context = getattr(self.original_process, 'context', None)
+        if context is not None:
+            context.setdefault('conversion_log', []).append(
+                {'plan': plan, 'cost': cost, 'timings': timings}
+            )
+        return values[to], plan, cost, timings
+
     def __init__(self, data_type=None, data=None, original_process=None):
-        if data_type not in MAPPING_CONVERTERS['from'].keys() and data_type != 'application/json+acdhlang':
+        if data_type not in DATA_TYPES:
             raise ValueError('Data type specified is not supported by the converter.')
         if original_process is None:
             raise ValueError('Original process must be specified to get original files.')
         else:
             self.original_process = original_process
-        if data_type == 'application/json+acdhlang':
-            self.data_json = data
-        else:
-            self.data_json = self._convert_internal('from', data_type)
+        self.data_type = data_type
+        self.data = data
+        self.plan = []
+        self.cost = 0
+        self.timings = []
+        self._data_json = data if data_type == ACDHLANG else None
@@ -1,7 +1,8 @@
 import json
 import re
 import requests
-import spacy
+
+from spacytei.sentences import get_sentence_splitter
 
 
 def get_doc_list(domain, app_name, collection='editions', verbose=True):
@@ -44,7 +45,8 @@ def stream_docs_to_file(
         :param app_name: The name of the dsebaseapp instance.\
         This name will be also used as filename
         :param collection: The name of the collection to process
-        :spacy_model: Spacy model used for sentence splitting.
+        :spacy_model: Spacy model used for sentence splitting or a spec like 'sentencizer:de'\
+        or 'rules:de', see spacytei.sentences
         :min_len: The minimum amount of characters for a senetence to be stored.
         :verbose: Defaults to True and logs some basic information
         :write_mode: Defaults to 'a' -> append; use 'w' to overwrite the file
@@ -60,7 +62,7 @@ def stream_docs_to_file(
         filename = '{}.txt'.format(app_name)
     if verbose:
         print("start streaming documents to {}".format(filename))
-    nlp = spacy.load(spacy_model)
+    nlp = get_sentence_splitter(spacy_model)
     with open(filename, write_mode, encoding="utf-8") as f:
         for x in files:
             url = "{}?format=text".format(x)
@@ -80,10 +82,12 @@ def stream_docs_to_file(
 def lines_to_sents(input_file, nlp, sent_limit=10):
     """ reads a text file line by line, splits each line in sents
         :param input_file: Path to input files.
-        :param nlp: The spacy model you'd like to use for sent-splitting
+        :param nlp: The spacy model you'd like to use for sent-splitting; can also be a model name\
+        or a spec like 'sentencizer:de' or 'rules:de', see spacytei.sentences
         :param sent_limit: Only sents with more characters are returned
         :return: yields a sent
     """
+    nlp = get_sentence_splitter(nlp)
     with open(input_file, encoding="utf-8") as f:
         for x in f.readlines():
             doc = nlp(x)
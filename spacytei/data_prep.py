@@ -2,11 +2,21 @@
 This module provides some helper functions\
 to save, clean and load spacy-like NER training data.
 """
-import re
 import ast
-import langid
+import hashlib
+import itertools
+import os
 
-import pandas as pd
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from spacytei.config import LANGID_CHUNK_SIZE, LANGID_MAX_WORKERS
+from spacytei.matcher import EntityMatcher
+from spacytei.sentences import get_sentence_splitter
+
+
+# langid identifiers by candidate languages, see _langid_identifier
+_LANGID_IDENTIFIERS = {}
 
 
 def ne_offsets_by_sent(
@@ -14,42 +24,35 @@ def ne_offsets_by_sent(
     model='de_core_news_sm',
 ):
 
-    """ extracts offsets of NEs and the NE-type grouped by sents
+    """ extracts offsets of NEs and the NE-type grouped by sents; all NE-strings of a text are\
+    searched at once, overlapping matches are resolved leftmost-longest
     :param text_nest_list: A list of list with following structure:\
     [{"text": "Wien ist schön", "ner_dicts": [{"text": "Wien", "ne_type": "LOC"}]}]
-    :param model: The name of the spacy model which should be used for sentence splitting.
+    :param model: The name of the spacy model which should be used for sentence splitting\
+    or a spec like 'sentencizer:de' or 'rules:de', see spacytei.sentences
     :return: A list of spacy-like NER Tuples [('some text'), entities{[(15, 19, 'place')]}]
     """
-    import spacy
-    nlp = spacy.load(model)
+    nlp = get_sentence_splitter(model)
     text_nes = text_nest_list
     results = []
     for entry in text_nes:
-        ner_dicts = entry['ner_dicts']
+        matcher = EntityMatcher((x['text'], x['ne_type']) for x in entry['ner_dicts'])
         in_text = entry['text']
+        matches = matcher.find(in_text)
         doc = nlp(in_text)
+        match_index = 0
         for sent in doc.sents:
-            entities = []
-            if sent.text != "":
-                plain_text = sent.text
-                for x in ner_dicts:
-                    for m in re.finditer(x['text'], plain_text):
-                        entities.append([m.start(), m.end(), x['ne_type']])
-                entities = [item for item in set(tuple(row) for row in entities)]
-                entities = sorted(entities, key=lambda x: x[0])
-                ents = []
-                next_item_index = 1
-                for x in entities:
-                    cur_start = x[0]
-                    try:
-                        next_start = entities[next_item_index][0]
-                    except IndexError:
-                        next_start = 9999999999999999999999
-                    if cur_start == next_start:
-                        pass
-                    else:
-                        ents.append(x)
-                    next_item_index = next_item_index + 1
+            plain_text = sent.text
+            if plain_text == "":
+                continue
+            ents = []
+            while match_index < len(matches) and matches[match_index][0] < sent.start_char:
+                # skip matches crossing a sentence boundary
+                match_index += 1
+            while match_index < len(matches) and matches[match_index][1] <= sent.end_char:
+                start, end, ne_type = matches[match_index]
+                ents.append((start - sent.start_char, end - sent.start_char, ne_type))
+                match_index += 1
             train_data = (
                 plain_text,
                 {
@@ -60,36 +63,143 @@ def ne_offsets_by_sent(
     return results
 
 
-def clean_train_data(train_data, min_ents=0, min_text_len=5, lang=['de']):
+def _langid_identifier(candidates):
+    """ returns a langid LanguageIdentifier per set of candidate languages, loaded once per\
+    process """
+    key = tuple(sorted(candidates)) if candidates else None
+    identifier = _LANGID_IDENTIFIERS.get(key)
+    if identifier is None:
+        from langid.langid import LanguageIdentifier, model
 
-    """ removes items with no entities or fewer entities then min_ents
-        :param train_data: A list of lists of spacy-like NER Tuple\
+        identifier = LanguageIdentifier.from_modelstring(model)
+        if key:
+            identifier.set_languages(list(key))
+        _LANGID_IDENTIFIERS[key] = identifier
+    return identifier
+
+
+def classify_texts(texts, candidates=None):
+    """ identifies the language of texts with langid
+    :param texts: A list of strings
+    :param candidates: A list of language codes langid chooses from, None for all languages
+    :return: A list of language codes
+    """
+    identifier = _langid_identifier(candidates)
+    return [identifier.classify(x)[0] for x in texts]
+
+
+def _text_key(text, candidates=None):
+    # a decision only holds for the candidates it was made from
+    candidates = tuple(sorted(candidates)) if candidates else None
+    return candidates, hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def _chunks(items, size):
+    chunk = []
+    for x in items:
+        chunk.append(x)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def clean_train_data(
+    train_data, min_ents=0, min_text_len=5, lang=['de'], candidates=None,
+    chunk_size=LANGID_CHUNK_SIZE, max_workers=LANGID_MAX_WORKERS, memo=None
+):
+
+    """ returns a generator of the items with at least min_ents entities, a text of at least min_text_len\
+    characters and, if lang is populated, a text in one of the languages in lang. The cheap\
+    checks come first; the language of the remaining texts is identified chunk by chunk in a\
+    process pool, every distinct text only once. The items are streamed in their order,\
+    so train_data may be a generator.
+        :param train_data: An iterable of spacy-like NER Tuples\
         [(('some text'), entities{[(15, 19, 'place')]}), (...)]
         :param min_ents: An integer defining the minimum amount of entities.
         :min_text_len: An integer defining the minimum length of the textself.
         :lang: A list of language codes. If populated, only samples matching those languages will\
         be included into the returned results.
-        :return: A list of lists of spacy-like NER Tuple\
-        [(('some text'), entities{[(15, 19, 'place')]}), (...)]
+        :candidates: A list of language codes langid chooses from (faster and more accurate than\
+        all 97 languages), e.g. ['de', 'en', 'fr', 'la']; it must contain the languages to be\
+        filtered out, too. None uses all languages.
+        :chunk_size: The number of texts classified per task
+        :max_workers: The number of worker processes, None for one per CPU; with 1, or if all\
+        texts fit into one chunk, the texts are classified in this process
+        :memo: A dict of language decisions by candidates and text hash, pass the same dict to\
+        several calls to reuse them
+        :return: A generator of spacy-like NER Tuples
     """
+    if candidates and not set(candidates) - set(lang):
+        raise ValueError('candidates must contain languages besides the ones in lang.')
+    return _clean_train_data(
+        train_data, min_ents, min_text_len, lang, candidates, chunk_size, max_workers, memo
+    )
 
-    TRAIN_DATA = []
-    for x in train_data:
-        try:
-            ents = x[1]
-        except TypeError:
-            ents = None
-        if ents and len(ents['entities']) >= min_ents and len(x[0]) >= min_text_len:
-            TRAIN_DATA.append(x)
-    if len(lang) > 0:
-        TRAIN_DATA_LANG = []
-        for x in TRAIN_DATA:
-            lng, prob = langid.classify(x[0])
-            if lng in lang:
-                TRAIN_DATA_LANG.append(x)
-        return TRAIN_DATA_LANG
 
-    return TRAIN_DATA
+def _clean_train_data(
+    train_data, min_ents, min_text_len, lang, candidates, chunk_size, max_workers, memo
+):
+    """ the generator returned by clean_train_data, which validates the arguments right away """
+    items = (x for x in train_data if _has_enough(x, min_ents, min_text_len))
+    if len(lang) == 0:
+        yield from items
+        return
+    memo = {} if memo is None else memo
+    scheduled = set()
+    workers = max_workers or os.cpu_count() or 1
+    chunks = _chunks(items, chunk_size)
+    first = next(chunks, None)
+    second = next(chunks, None)
+    chunks = itertools.chain([x for x in (first, second) if x is not None], chunks)
+    if second is None or workers == 1:
+        for chunk in chunks:
+            entry = _schedule(chunk, memo, scheduled, candidates)
+            yield from _resolve(entry, memo, scheduled, lang)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(_schedule(chunk, memo, scheduled, candidates, executor))
+            # a few chunks ahead keep the workers busy without reading all the input
+            while len(pending) > 2 * workers:
+                yield from _resolve(pending.popleft(), memo, scheduled, lang)
+        while pending:
+            yield from _resolve(pending.popleft(), memo, scheduled, lang)
+
+
+def _has_enough(x, min_ents, min_text_len):
+    try:
+        ents = x[1]
+    except TypeError:
+        ents = None
+    return bool(ents) and len(ents['entities']) >= min_ents and len(x[0]) >= min_text_len
+
+
+def _schedule(chunk, memo, scheduled, candidates, executor=None):
+    """ starts the language identification of the texts of a chunk which aren't known yet """
+    keys = [_text_key(x[0], candidates) for x in chunk]
+    texts = {}
+    for key, x in zip(keys, chunk):
+        if key not in memo and key not in scheduled:
+            texts[key] = x[0]
+    scheduled.update(texts)
+    if executor is None:
+        languages = classify_texts(list(texts.values()), candidates)
+    else:
+        languages = executor.submit(classify_texts, list(texts.values()), candidates)
+    return chunk, keys, list(texts), languages
+
+
+def _resolve(entry, memo, scheduled, lang):
+    """ waits for the languages of a chunk and returns its items in one of the languages """
+    chunk, keys, new_keys, languages = entry
+    if isinstance(languages, Future):
+        languages = languages.result()
+    memo.update(zip(new_keys, languages))
+    scheduled.difference_update(new_keys)
+    return [x for key, x in zip(keys, chunk) if memo[key] in lang]
 
 
 def traindata_to_csv(train_data, filename='out.csv'):
@@ -101,6 +211,8 @@ def traindata_to_csv(train_data, filename='out.csv'):
         :returns: The filename.
     """
 
+    import pandas as pd
+
     df = pd.DataFrame(train_data, columns=["text", "entities"])
     df.to_csv(filename, index=False)
     return filename
@@ -113,6 +225,8 @@ def csv_to_traindata(csv):
         :return: A list of lists of spacy-like NER Tuple\
         [(('some text'), entities{[(15, 19, 'place')]}), (...)]
     """
+    import pandas as pd
+
     new = pd.read_csv(csv)
     TRAIN_DATA = []
     for i, row in new.iterrows():
@@ -0,0 +1,112 @@
+"""
+This module provides a process wide cache of parsed XML documents\
+so the same source is only parsed once, e.g. for a TEI -> spaCy -> TEI round trip.
+"""
+import hashlib
+import threading
+
+from collections import OrderedDict
+from copy import deepcopy
+
+from spacytei.config import DOCUMENT_CACHE_MAX_BYTES, DOCUMENT_CACHE_NODE_BYTES
+
+
+def estimate_size(tree, content):
+    """ estimates the memory held by a parsed document, which is several times the size of\
+    its source
+    :param tree: The parsed lxml tree or element
+    :param content: The bytes the tree was parsed from
+    :return: The estimated size in bytes
+    """
+    root = tree.getroot() if hasattr(tree, 'getroot') else tree
+    nodes = sum(1 for _ in root.iter())
+    return len(content) + nodes * DOCUMENT_CACHE_NODE_BYTES
+
+
+class DocumentCache():
+
+    """ a LRU cache of parsed documents keyed by the hash of their content """
+
+    def __init__(self, max_bytes=DOCUMENT_CACHE_MAX_BYTES):
+        """
+        :param max_bytes: Upper limit of the summed up estimated size of all cached trees in\
+        bytes (see estimate_size); least recently used documents are evicted first
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, content, *extra):
+        """ creates the cache key of a document
+        :param content: The bytes of the document
+        :param extra: Further hashable values the parse result depends on (e.g. the parser)
+        :return: A tuple usable as key
+        """
+        return (hashlib.sha1(content).hexdigest(), len(content)) + extra
+
+    def get(self, content, parse, *extra, copy=True):
+        """ returns the parsed document, parses and caches it on a miss
+        :param content: The bytes of the document
+        :param parse: A callable taking the content and returning the parsed tree
+        :param extra: Further hashable values the parse result depends on (e.g. the parser)
+        :param copy: If False, the cached tree itself is returned and must not be changed;\
+        spacytei.xml.XMLReader only reads it via XMLReader.view and copies it otherwise
+        :return: The parsed tree or a copy of it
+        """
+        key = self.make_key(content, *extra)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            tree = parse(content)
+            self._put(key, tree, estimate_size(tree, content))
+        else:
+            tree = entry[0]
+        if copy:
+            return deepcopy(tree)
+        return tree
+
+    def _put(self, key, tree, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (tree, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """ removes all cached documents and resets the counters """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """ returns a dict with the hit/miss counters and the current fill level """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+DOCUMENT_CACHE = DocumentCache()
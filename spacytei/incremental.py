@@ -0,0 +1,132 @@
+"""
+This module runs the components of a spaCy pipeline only where their output is missing.\
+Docs created from TEI or TCF often carry tags or entities of an earlier run or of manual\
+curation; spacytei.config.SPACY_COMPONENT_ATTRS tells which attributes a component writes.
+A component is skipped for docs whose tokens are all annotated, runs on the others and\
+the annotated tokens get their original values back afterwards, so curated annotations\
+are never overwritten. Re-annotating a tagged edition with a new NER model only costs\
+the NER pass.
+"""
+import numpy as np
+
+from spacytei.config import SPACY_BATCH_SIZE, SPACY_COMPONENT_ATTRS
+from spacytei.instrumentation import INSTRUMENTATION
+
+
+# attributes describing the structure of a doc; a doc with any of them counts as annotated,
+# since parts of a parse or of a sentence segmentation can't be completed
+STRUCTURE_ATTRS = ('DEP', 'SENT_START')
+
+ENT_IOB_I = 1
+ENT_IOB_O = 2
+ENT_IOB_B = 3
+
+
+def _attr_id(name):
+    from spacy.attrs import IDS
+
+    return IDS[name]
+
+
+def annotated_tokens(doc, attr):
+    """ returns a boolean array marking the tokens of doc which have a value for attr
+    :param doc: A spacy Doc
+    :param attr: The name of a token attribute like 'TAG' or 'ENT_IOB'
+    """
+    values = doc.to_array([_attr_id(attr)]).reshape(-1)
+    if attr in STRUCTURE_ATTRS:
+        # the first token starts a sentence anyway
+        start = 1 if attr == 'SENT_START' and len(values) > 1 else 0
+        return np.full(len(values), bool((values[start:] != 0).any()))
+    return values != 0
+
+
+def _repair_iob(values, ent_iob, ent_type):
+    """ turns I tags not continuing an entity of the same type into B tags """
+    iob = values[:, ent_iob]
+    types = values[:, ent_type]
+    starts = np.ones(len(iob), dtype=bool)
+    starts[1:] = (iob[:-1] == ENT_IOB_O) | (iob[:-1] == 0) | (types[:-1] != types[1:])
+    iob[(iob == ENT_IOB_I) & starts] = ENT_IOB_B
+
+
+def _restore(doc, attrs, values, annotated):
+    """ sets attrs of the annotated tokens back to the values taken before the component ran """
+    attr_ids = [_attr_id(x) for x in attrs]
+    new_values = doc.to_array(attr_ids)
+    for j, attr in enumerate(attrs):
+        # further attributes are only kept if they were set, e.g. the lemma of a tagged token,
+        # the entity type always belongs to the IOB tag
+        keep = annotated
+        if j > 0 and attr != 'ENT_TYPE':
+            keep = annotated & (values[:, j] != 0)
+        new_values[keep, j] = values[keep, j]
+    if 'ENT_IOB' in attrs and 'ENT_TYPE' in attrs:
+        _repair_iob(new_values, attrs.index('ENT_IOB'), attrs.index('ENT_TYPE'))
+    doc.from_array(attr_ids, new_values)
+    return doc
+
+
+def _minibatches(items, size):
+    batch = []
+    for x in items:
+        batch.append(x)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def apply_component(name, proc, docs, batch_size=SPACY_BATCH_SIZE, attrs=None):
+    """ runs one component on the docs missing its annotations
+    :param name: The name of the component in the pipeline
+    :param proc: The component
+    :param docs: An iterable of spacy Docs
+    :param batch_size: The number of docs passed to proc.pipe at once
+    :param attrs: The attributes written by the component; defaults to its entry in\
+    spacytei.config.SPACY_COMPONENT_ATTRS, without one the component runs on every doc
+    :return: yields the docs in their order
+    """
+    if attrs is None:
+        attrs = SPACY_COMPONENT_ATTRS.get(name)
+    for batch in _minibatches(docs, batch_size):
+        todo = []
+        snapshots = {}
+        for i, doc in enumerate(batch):
+            if not attrs:
+                todo.append(i)
+                continue
+            annotated = annotated_tokens(doc, attrs[0])
+            if annotated.all():
+                continue
+            todo.append(i)
+            if annotated.any():
+                snapshots[i] = (doc.to_array([_attr_id(x) for x in attrs]), annotated)
+        if todo:
+            if hasattr(proc, 'pipe'):
+                processed = proc.pipe([batch[i] for i in todo], batch_size=batch_size)
+            else:
+                processed = (proc(batch[i]) for i in todo)
+            for i, doc in zip(todo, processed):
+                if i in snapshots:
+                    doc = _restore(doc, attrs, *snapshots[i])
+                batch[i] = doc
+        INSTRUMENTATION.record(
+            'component', component=name, documents=len(todo), skipped=len(batch) - len(todo),
+            partial=len(snapshots)
+        )
+        for doc in batch:
+            yield doc
+
+
+def run_components(nlp, docs, batch_size=SPACY_BATCH_SIZE):
+    """ runs the pipeline of nlp on docs, every component only where its annotations are missing
+    :param nlp: A spacy Language
+    :param docs: An iterable of spacy Docs
+    :param batch_size: The number of docs passed to the components at once
+    :return: yields the annotated docs in their order
+    """
+    for name, proc in nlp.pipeline:
+        docs = apply_component(name, proc, docs, batch_size=batch_size)
+    return docs
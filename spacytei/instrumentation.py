@@ -0,0 +1,187 @@
+"""
+This module records what the pipeline stages (validation, conversion, model loading,\
+spaCy, XTX, write-back) cost: wall time, CPU time of the running thread, payload sizes\
+and token counts. Recording is off by default; a disabled stage is a shared no-op object,\
+so instrumented code only pays for one attribute lookup and call.
+
+INSTRUMENTATION.enable()
+run_batch(items, processes)
+INSTRUMENTATION.summary()  # {'spacy': {'count': 3, 'wall': 1.2, 'cpu': 1.1, 'tokens': 5000}, ...}
+"""
+import logging
+import threading
+import time
+
+from collections import deque
+
+from spacytei.config import INSTRUMENTATION_ENABLED, INSTRUMENTATION_MAX_RECORDS
+
+
+logger = logging.getLogger(__name__)
+
+# fields of the records which are summed up by Instrumentation.summary
+SUMMED_FIELDS = ('wall', 'cpu', 'tokens', 'bytes', 'bytes_sent', 'bytes_received')
+
+
+def payload_size(payload):
+    """ returns the size of serialized payloads (str, bytes, ...) in bytes, None for other ones """
+    if isinstance(payload, str):
+        return len(payload)
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return len(payload)
+    return None
+
+
+def token_count(payload):
+    """ returns the number of tokens of a spaCy Doc, a ColumnarDoc or a tokenlist, None for\
+    other payloads """
+    if isinstance(payload, dict):
+        tokens = payload.get('tokenArray')
+        return len(tokens) if isinstance(tokens, list) else None
+    if isinstance(payload, list):
+        return sum(len(x.get('tokens', [])) for x in payload if isinstance(x, dict))
+    if isinstance(payload, (str, bytes, bytearray, memoryview)) or not hasattr(payload, '__len__'):
+        return None
+    return len(payload)
+
+
+class _NullStage():
+
+    """ the stage handed out while recording is disabled """
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, **fields):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class Stage():
+
+    """ measures one run of a stage; use it as context manager. Fields known only inside the\
+    stage (e.g. the tokens of the result) are added with update """
+
+    enabled = True
+
+    def __init__(self, instrumentation, name, fields):
+        self.instrumentation = instrumentation
+        self.record = {'stage': name}
+        self.record.update(fields)
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['wall'] = time.perf_counter() - self._wall
+        self.record['cpu'] = time.thread_time() - self._cpu
+        if exc_type is not None:
+            self.record['error'] = exc_type.__name__
+        self.instrumentation.emit(self.record)
+        return False
+
+    def update(self, **fields):
+        self.record.update(fields)
+
+
+class Instrumentation():
+
+    """ collects records of pipeline stages and passes them to the registered hooks """
+
+    def __init__(self, enabled=INSTRUMENTATION_ENABLED, max_records=INSTRUMENTATION_MAX_RECORDS):
+        """
+        :param enabled: If False, stage and record do nothing
+        :param max_records: The number of records kept, None keeps all of them
+        """
+        self.enabled = enabled
+        self.records = deque(maxlen=max_records)
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name, **fields):
+        """ returns a context manager measuring a stage
+        :param name: The name of the stage, e.g. 'conversion'
+        :param fields: Further fields of the record, e.g. tokens=100
+        :return: A Stage, or NULL_STAGE if recording is disabled
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name, fields)
+
+    def record(self, name, **fields):
+        """ records an event without timing it
+        :param name: The name of the stage
+        :param fields: The fields of the record
+        """
+        if not self.enabled:
+            return
+        fields['stage'] = name
+        self.emit(fields)
+
+    def emit(self, record):
+        """ stores a finished record and passes it to the hooks """
+        with self._lock:
+            self.records.append(record)
+            hooks = list(self.hooks)
+        for hook in hooks:
+            hook(record)
+
+    def add_hook(self, hook):
+        """ registers a callable which is called with every finished record (a dict) """
+        with self._lock:
+            self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self.hooks.remove(hook)
+
+    def to_dict(self):
+        """ returns the records as a list of dicts """
+        with self._lock:
+            return [dict(x) for x in self.records]
+
+    def summary(self):
+        """ returns a dict per stage with the number of records and the sums of SUMMED_FIELDS """
+        summary = {}
+        for record in self.to_dict():
+            entry = summary.setdefault(record['stage'], {'count': 0})
+            entry['count'] += 1
+            for key in SUMMED_FIELDS:
+                if record.get(key) is not None:
+                    entry[key] = entry.get(key, 0) + record[key]
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+
+
+def log_record(record, logger=logger, level=logging.DEBUG):
+    """ a hook writing records to a logger, with the record in the 'instrumentation' attribute
+    :param record: A record dict
+    """
+    if logger.isEnabledFor(level):
+        logger.log(
+            level, "%s: %s", record['stage'],
+            ", ".join("{}={}".format(k, v) for k, v in record.items() if k != 'stage'),
+            extra={'instrumentation': record}
+        )
+
+
+INSTRUMENTATION = Instrumentation()
@@ -0,0 +1,133 @@
+"""
+This module provides a multi-pattern string matcher (Aho-Corasick)\
+to find all occurrences of many entity names in a text with a single pass.
+"""
+import re
+
+from collections import deque
+
+
+def normalize_surface_form(text):
+    """ collapses whitespace like the plain texts extracted from TEI documents
+    :param text: Some string
+    :return: The whitespace normalized, stripped string
+    """
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class EntityMatcher():
+
+    """ an Aho-Corasick automaton over (normalized) entity names resolving overlapping matches\
+    leftmost-longest, e.g.:
+    matcher = EntityMatcher([("Wien", "LOC"), ("Hans Maier", "PER")])
+    matcher.find("Hans Maier ging nach Wien")
+    [(0, 10, 'PER'), (21, 25, 'LOC')]
+    """
+
+    def __init__(self, patterns=(), whole_words=False):
+        """
+        :param patterns: An iterable of (text, label) tuples
+        :param whole_words: If True, matches directly preceded or followed by a letter or digit\
+        are ignored
+        """
+        self.whole_words = whole_words
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        self._dict_link = [0]
+        self._built = False
+        for text, label in patterns:
+            self.add(text, label)
+
+    def __len__(self):
+        return sum(1 for x in self._output if x is not None)
+
+    def add(self, text, label):
+        """ adds a pattern; if the same (normalized) text is added twice, the first label is kept
+        :param text: The surface form of the entity
+        :param label: The NE-type, e.g. 'LOC'
+        """
+        text = normalize_surface_form(text)
+        if not text:
+            return
+        state = 0
+        for char in text:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._dict_link.append(0)
+            state = next_state
+        if self._output[state] is None:
+            self._output[state] = (len(text), label)
+        self._built = False
+
+    def build(self):
+        """ computes the failure and output links; called by find() if needed """
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            self._dict_link[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                if self._output[fail] is not None:
+                    self._dict_link[next_state] = fail
+                else:
+                    self._dict_link[next_state] = self._dict_link[fail]
+        self._built = True
+
+    def iter_all(self, text):
+        """ yields all (possibly overlapping) matches in the order of their end offsets
+        :param text: The text to search in
+        :return: yields (start, end, label) tuples
+        """
+        if not self._built:
+            self.build()
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        dict_link = self._dict_link
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match_state = state if output[state] is not None else dict_link[state]
+            while match_state:
+                length, label = output[match_state]
+                yield (i + 1 - length, i + 1, label)
+                match_state = dict_link[match_state]
+
+    def find(self, text):
+        """ finds non overlapping matches, preferring the leftmost and then the longest one
+        :param text: The text to search in
+        :return: A list of (start, end, label) tuples sorted by start offset
+        """
+        matches = self.iter_all(text)
+        if self.whole_words:
+            matches = (x for x in matches if self._is_whole_word(text, x[0], x[1]))
+        result = []
+        last_end = 0
+        for match in sorted(matches, key=lambda x: (x[0], -x[1])):
+            if match[0] >= last_end:
+                result.append(match)
+                last_end = match[1]
+        return result
+
+    def _is_whole_word(self, text, start, end):
+        if start > 0 and text[start - 1].isalnum() and text[start].isalnum():
+            return False
+        if end < len(text) and text[end].isalnum() and text[end - 1].isalnum():
+            return False
+        return True
@@ -0,0 +1,182 @@
+"""
+This module provides a process wide registry of loaded spaCy models,\
+so every model is loaded only once per process.
+"""
+import hashlib
+import os
+import threading
+
+from collections import OrderedDict
+
+from spacytei.config import MODEL_REGISTRY_MAX_BYTES
+
+
+def folder_size(path):
+    """ sums up the size of all files in a folder
+    :param path: Path to a folder
+    :return: The size in bytes
+    """
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+def folder_fingerprint(path):
+    """ hashes the relative paths, sizes and modification times of all files in a folder, so\
+    the fingerprint changes when a model is retrained or replaced
+    :param path: Path to a folder
+    :return: A hex digest
+    """
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            digest.update("{}\0{}\0{}\n".format(
+                os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns
+            ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def folder_stamp(path):
+    """ returns the modification times of a folder and of its meta.json, which spaCy rewrites\
+    whenever a model is saved; two stat calls instead of a walk through the folder """
+    stamp = [os.stat(path).st_mtime_ns]
+    try:
+        stamp.append(os.stat(os.path.join(path, 'meta.json')).st_mtime_ns)
+    except OSError:
+        pass
+    return tuple(stamp)
+
+
+class ModelRegistry():
+
+    """ loads spaCy models lazily and keeps them for reuse; models not used for the longest time\
+    are evicted once the estimated size of all loaded models exceeds max_bytes """
+
+    def __init__(self, max_bytes=MODEL_REGISTRY_MAX_BYTES):
+        """
+        :param max_bytes: Upper limit of the summed up size of all loaded models, estimated by\
+        the size of their folders. The most recently used model is never evicted.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._fingerprints = {}
+        self._lock = threading.RLock()
+
+    def make_key(self, model, disable=(), add_pipes=()):
+        return (str(model), tuple(sorted(disable)), tuple(add_pipes))
+
+    def get(self, model='de_core_news_sm', disable=(), add_pipes=()):
+        """ returns the loaded model, loads it on first use
+        :param model: The name of or the path to a spaCy model, 'blank:<lang>' for a blank model
+        :param disable: Names of pipeline components to disable
+        :param add_pipes: Names of built-in components (e.g. 'sentencizer') added to the pipeline
+        :return: A spacy Language object; it is shared and must not be trained or changed
+        """
+        key = self.make_key(model, disable, add_pipes)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            nlp = self.load(model, disable, add_pipes)
+            path = getattr(nlp, 'path', None)
+            size = folder_size(path) if path else 0
+            self._models[key] = (nlp, size)
+            self.size += size
+            while self.size > self.max_bytes and len(self._models) > 1:
+                _, (_, evicted_size) = self._models.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+            return nlp
+
+    def load(self, model, disable=(), add_pipes=()):
+        """ loads a model without caching it, see get(); 'blank:de' creates a blank model """
+        import spacy
+        if str(model).startswith('blank:'):
+            nlp = spacy.blank(str(model)[len('blank:'):])
+        else:
+            nlp = spacy.load(model, disable=list(disable))
+        for name in add_pipes:
+            nlp.add_pipe(nlp.create_pipe(name))
+        return nlp
+
+    def fingerprint(self, nlp):
+        """ returns a fingerprint of the folder a model was loaded from (see\
+        folder_fingerprint), the version from the model meta for models without a folder.\
+        The folder is only walked again once folder_stamp changes.
+        :param nlp: A spacy Language object
+        :return: A string
+        """
+        path = getattr(nlp, 'path', None)
+        if not path or not os.path.isdir(str(path)):
+            return nlp.meta.get('version')
+        path = str(path)
+        stamp = folder_stamp(path)
+        with self._lock:
+            entry = self._fingerprints.get(path)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        fingerprint = folder_fingerprint(path)
+        with self._lock:
+            self._fingerprints[path] = (stamp, fingerprint)
+        return fingerprint
+
+    def preload(self, models):
+        """ loads models in advance, e.g. when a worker starts
+        :param models: A list of model names or of dicts with the keyword arguments of get(),\
+        e.g. ['de_core_news_sm', {'model': 'en_core_web_sm', 'disable': ['ner']}]
+        """
+        for x in models:
+            if isinstance(x, dict):
+                self.get(**x)
+            else:
+                self.get(x)
+
+    def clear(self):
+        """ removes all loaded models """
+        with self._lock:
+            self._models.clear()
+            self._fingerprints.clear()
+            self.size = 0
+
+    def stats(self):
+        """ returns a dict with the hit/miss counters and the loaded models """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'models': list(self._models.keys()),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def get_model(model='de_core_news_sm', disable=(), add_pipes=()):
+    """ returns a model from MODEL_REGISTRY, see ModelRegistry.get() """
+    return MODEL_REGISTRY.get(model, disable=disable, add_pipes=add_pipes)
+
+
+def model_fingerprint(nlp):
+    """ returns the fingerprint of a model from MODEL_REGISTRY, see ModelRegistry.fingerprint() """
+    return MODEL_REGISTRY.fingerprint(nlp)
@@ -1,4 +1,4 @@
-import spacy
+from spacytei.sentences import get_sentence_splitter
 
 
 def format_iob_tag(token):
@@ -13,9 +13,13 @@ def fetch_ner_samples(
         nlp,
         spacydoc,
         dont_split=False,
-        ent_types=['OBJECT']
+        ent_types=['OBJECT'],
+        sentence_model=None
 ):
-    """ takes a doc object and genereates NER-Training samples """
+    """ takes a doc object and genereates NER-Training samples
+    :param sentence_model: If set, spacydoc.text is split into sents by this model or spec\
+    (e.g. 'rules:de', see spacytei.sentences) instead of using spacydoc.sents
+    """
     spacy_samples = []
     if dont_split:
         spacy_sample = (spacydoc.text, {'entities': []})
@@ -25,7 +29,10 @@ def fetch_ner_samples(
         spacy_samples.append(spacy_sample)
         return spacy_samples
     else:
-        sents = [x for x in spacydoc.sents]
+        if sentence_model is None:
+            sents = [x for x in spacydoc.sents]
+        else:
+            sents = [x for x in get_sentence_splitter(sentence_model)(spacydoc.text).sents]
         doc = None
         for sent in sents:
             doc = nlp(sent.text)
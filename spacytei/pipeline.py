@@ -1,54 +1,24 @@
-import os
 import json
-import spacy
-import requests
-
-from io import StringIO, BytesIO
-from lxml import etree
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+import os
 
 from spacytei.conversion import Converter
-from spacytei.config import SPACY_LANG_LST, SPACY_PIPELINE
-from django.conf import settings
+from spacytei.incremental import run_components
+from spacytei.instrumentation import INSTRUMENTATION, payload_size, token_count
+from spacytei.models import get_model, model_fingerprint
+from spacytei.result_cache import (
+    SPACY_DOC_BYTES, dump_doc, get_result_cache, load_doc, payload_bytes
+)
+from spacytei.validation import validate_payload
+from spacytei.xtx import get_client
+from spacytei.config import SPACY_LANG_LST, SPACY_PIPELINE, SPACY_BATCH_SIZE, SPACY_INCREMENTAL
+from spacytei.settings import get_setting
 
 
-def check_validity_payload(kind, payload):
-    if kind == "application/json+acdhlang":
-        with open('spacytei/schema/acdh_lang_jsonschema.json') as s:
-            schema = json.load(s)
-            try:
-                validate(payload, schema)
-                return True
-            except ValidationError:
-                return False
-    elif kind == "spacyDoc":
-        if type(payload) == spacy.tokens.doc.Doc:
-            return True
-        else:
-            return False
-    elif kind == "text/plain":
-        if type(payload) == str:
-            return True
-        else:
-            return False
-    elif kind == "application/xml+tei":
-        return True
-        with open('spacytei/schema/tei_all.xsd', 'rb') as schema_tei:
-            schema_tei = schema_tei.read()
-        xml_doc = etree.parse(BytesIO(payload))
-        schema_tei_doc = etree.parse(BytesIO(schema_tei))
-        try:
-            schema_tei = etree.XMLSchema(schema_tei_doc)
-        except Exception as e:
-            print(e)
-            return True
-        if not schema_tei.assertValid(xml_doc):
-            return False
-        else:
-            return True
-    elif kind == "application/xml+tcf":
-        return True
+def check_validity_payload(kind, payload, level=None):
+    """ checks the payload with the validators cached in spacytei.validation
+    :param level: 'off', 'structural' or 'full'; defaults to spacytei.config.VALIDATION_LEVEL
+    """
+    return validate_payload(kind, payload, level=level)
 
 
 class PipelineProcessBase:
@@ -57,11 +27,20 @@ class PipelineProcessBase:
     returns = "application/json+acdhlang"
     payload = None
     valid = False
+    # True for processes mostly waiting for the network, see spacytei.runner
+    io_bound = False
+    # the result loaded from the result cache, see spacytei.result_cache
+    cached = None
+    _cache_key = None
 
     def convert_payload(self):
-        self.payload = Converter(
-            data_type=self.mime, data=self.payload, original_process=self
-        ).convert(to=self.accepts[0])
+        with INSTRUMENTATION.stage(
+            'conversion', process=type(self).__name__, source=self.mime, target=self.accepts[0]
+        ) as stage:
+            converter = Converter(data_type=self.mime, data=self.payload, original_process=self)
+            self.payload = converter.convert(to=self.accepts[0])
+            if stage.enabled:
+                stage.update(hops=len(converter.plan), tokens=token_count(self.payload))
         self.mime = self.accepts[0]
         self.check_validity()
 
@@ -73,7 +52,9 @@ class PipelineProcessBase:
             raise ValueError('You must specify a mime type of the payload.')
         if self.payload is None:
             raise ValueError('You cant call pipeline processes without specifying a payload.')
-        if not check_validity_payload(self.mime, self.payload):
+        with INSTRUMENTATION.stage('validation', process=type(self).__name__, mime=self.mime):
+            is_valid = check_validity_payload(self.mime, self.payload)
+        if not is_valid:
             raise ValueError('Payload is not in the correct format')
         if self.mime not in self.accepts:
             self.convert_payload()
@@ -91,35 +72,163 @@ class PipelineProcessBase:
         if self.context is None:
             self.context = {}
         self.context['original_xml'] = self.payload
+        self.result_cache = get_result_cache(kwargs.get('result_cache', None))
+        self.cached = self.load_cached()
+        if self.cached is not None:
+            # the same input was valid before, so it is neither checked nor converted
+            self.valid = True
+            return
         self.check_validity()
 
+    def cache_settings(self):
+        """cache_settings: returns a dict of everything besides the input the result depends\
+        on, None if the results of the process can't be cached
+        """
+        return None
+
+    def cache_scope(self):
+        """cache_scope: returns a (scope, fingerprint) tuple, see ResultCache.put"""
+        return None, None
+
+    def dump_result(self, result):
+        """dump_result: serializes a result for the cache, returns (mime, bytes)"""
+        return self.returns, payload_bytes(result)
+
+    def load_result(self, mime, data):
+        """load_result: restores a result dumped by dump_result"""
+        return json.loads(data.decode('utf-8'))
+
+    def load_cached(self):
+        """load_cached: returns the cached result of the input, None on a miss or if the\
+        process isn't cached
+        """
+        if self.result_cache is None:
+            return None
+        settings = self.cache_settings()
+        if settings is None:
+            return None
+        try:
+            self._cache_key = self.result_cache.make_key(
+                self.payload, self.mime, process=type(self).__name__, **settings
+            )
+        except TypeError:
+            return None
+        entry = self.result_cache.get(self._cache_key)
+        INSTRUMENTATION.record('result_cache', process=type(self).__name__, hit=entry is not None)
+        if entry is None:
+            return None
+        return self.load_result(*entry)
+
+    def store_cached(self, result):
+        """store_cached: stores the result of a cache miss"""
+        if self._cache_key is None:
+            return
+        scope, fingerprint = self.cache_scope()
+        mime, data = self.dump_result(result)
+        self.result_cache.put(self._cache_key, mime, data, scope=scope, fingerprint=fingerprint)
+        self._cache_key = None
+
+    @classmethod
+    def process_batch(cls, instances, batch_size=SPACY_BATCH_SIZE, n_process=1):
+        """process_batch: processes many instances of this class
+
+        :param instances: a list of instances
+        :param batch_size: the number of payloads processed at once, if the process supports it
+        :param n_process: the number of processes to use, if the process supports it
+        :return: a list with the processed payload or the raised exception per instance
+        """
+        results = []
+        for x in instances:
+            try:
+                results.append(x.process())
+            except Exception as e:
+                results.append(e)
+        return results
+
 
 class SpacyProcess(PipelineProcessBase):
     accepts = ["spacyDoc", "text/plain"]
     returns = "spacyDoc"
 
     def process(self):
-        if self.mime == "text/plain":
-            print(self.payload)
-            self.payload = self.nlp(self.payload)
-        else:
-            for name, proc in self.nlp.pipeline:
-                self.payload = proc(self.payload)
+        if self.cached is not None:
+            self.payload = self.cached
+            return self.payload
+        with INSTRUMENTATION.stage('spacy', mime=self.mime) as stage:
+            if self.mime == "text/plain":
+                if stage.enabled:
+                    stage.update(bytes=payload_size(self.payload))
+                self.payload = self.nlp(self.payload)
+            elif self.incremental:
+                self.payload = next(run_components(self.nlp, [self.payload]))
+            else:
+                for name, proc in self.nlp.pipeline:
+                    self.payload = proc(self.payload)
+            if stage.enabled:
+                stage.update(tokens=len(self.payload))
+        self.store_cached(self.payload)
         return self.payload
 
-    def __init__(self, options=None, pipeline=None, **kwargs):
+    @classmethod
+    def process_batch(cls, instances, batch_size=SPACY_BATCH_SIZE, n_process=1):
+        """process_batch: runs the pipeline over many payloads at once; texts go through\
+        nlp.pipe, docs through the pipe method of every component (only where their\
+        annotations are missing, see spacytei.incremental). If a batch fails, its\
+        payloads are processed one by one so only the broken ones get an error.
+        """
+        results = [None] * len(instances)
+        groups = {}
+        for i, x in enumerate(instances):
+            if x.cached is not None:
+                results[i] = x.payload = x.cached
+                continue
+            groups.setdefault((id(x.nlp), x.mime == "text/plain", x.incremental), []).append(i)
+        for (nlp_id, is_text, incremental), indices in groups.items():
+            nlp = instances[indices[0]].nlp
+            payloads = [instances[i].payload for i in indices]
+            with INSTRUMENTATION.stage(
+                'spacy', mime="text/plain" if is_text else "spacyDoc", documents=len(indices)
+            ) as stage:
+                try:
+                    if is_text:
+                        kwargs = {'batch_size': batch_size}
+                        if n_process > 1:
+                            kwargs['n_process'] = n_process
+                        docs = list(nlp.pipe(payloads, **kwargs))
+                    elif incremental:
+                        docs = list(run_components(nlp, payloads, batch_size=batch_size))
+                    else:
+                        docs = iter(payloads)
+                        for name, proc in nlp.pipeline:
+                            if hasattr(proc, 'pipe'):
+                                docs = proc.pipe(docs, batch_size=batch_size)
+                            else:
+                                docs = (proc(doc) for doc in docs)
+                        docs = list(docs)
+                except Exception as e:
+                    stage.update(fallback=type(e).__name__)
+                    docs = super().process_batch([instances[i] for i in indices])
+                else:
+                    for i, doc in zip(indices, docs):
+                        instances[i].payload = doc
+                        instances[i].store_cached(doc)
+                    if stage.enabled:
+                        stage.update(tokens=sum(len(x) for x in docs))
+            for i, doc in zip(indices, docs):
+                results[i] = doc
+        return results
+
+    def __init__(self, options=None, pipeline=None, incremental=SPACY_INCREMENTAL, **kwargs):
+        """
+        :param incremental: If True, components only run on spacyDoc payloads missing their\
+        annotations and existing annotations are kept, see spacytei.incremental
+        """
         self.pipeline = pipeline
         self.options = options
-        if options is None:
-            print('options None')
-            print('pipeline')
-            print(pipeline)
-        else:
-            print(options)
+        self.incremental = incremental
         if self.options is not None:
             if self.options['model']:
-                model = os.path.join(getattr(settings, 'NLP_MODELS_FOLDER'), self.options['model'])
-                print('loading the model worked')
+                model = os.path.join(get_setting('NLP_MODELS_FOLDER'), self.options['model'])
             elif self.options['language']:
                 model = SPACY_LANG_LST[self.options['language'].lower()]
         else:
@@ -130,31 +239,69 @@ class SpacyProcess(PipelineProcessBase):
             disable_pipeline = [
                 x for x in SPACY_PIPELINE if x not in self.pipeline
             ]
-        
-        self.nlp = spacy.load(
-            model,
-            disable=disable_pipeline,
-        )
-        self.nlp.add_pipe(self.nlp.create_pipe('sentencizer'))
+        self.model = model
+        self._model_fingerprint = None
+        with INSTRUMENTATION.stage('model', model=model):
+            self.nlp = get_model(
+                model,
+                disable=disable_pipeline,
+                add_pipes=('sentencizer',)
+            )
         super().__init__(**kwargs)
         if not self.valid:
             raise ValueError('Something went wrong in the data conversion. Data is not valid.')
 
+    def model_fingerprint(self):
+        """model_fingerprint: changes when the model folder changes, see\
+        spacytei.models.ModelRegistry.fingerprint; computed once per instance
+        """
+        if self._model_fingerprint is None:
+            self._model_fingerprint = model_fingerprint(self.nlp)
+        return self._model_fingerprint
+
+    def cache_settings(self):
+        return {
+            'model': str(self.model),
+            'name': self.nlp.meta.get('name'),
+            'version': self.nlp.meta.get('version'),
+            'fingerprint': self.model_fingerprint(),
+            'components': self.nlp.pipe_names,
+            'options': self.options,
+            'pipeline': self.pipeline,
+            'incremental': self.incremental,
+        }
+
+    def cache_scope(self):
+        return str(self.model), self.model_fingerprint()
+
+    def dump_result(self, result):
+        return SPACY_DOC_BYTES, dump_doc(result)
+
+    def load_result(self, mime, data):
+        return load_doc(self.nlp.vocab, data)
+
 
 class XtxProcess(PipelineProcessBase):
     accepts = ['application/xml+tei']
     returns = 'application/xml+tei'
+    io_bound = True
 
     def process(self):
-        headers = {
-            'Content-type': 'application/xml;charset=UTF-8', 'accept': 'application/xml'
-        }
-        url = self.XTX_URL
-        res = requests.post(url, headers=headers, data=self.payload.encode('utf-8'))
-        if res.status_code == 200:
-            self.payload = res.text
-        else:
-            raise ValueError('XTX did not respond with status code 200.')
+        if self.cached is not None:
+            self.payload = self.cached
+            return self.payload
+        with INSTRUMENTATION.stage('xtx', url=self.XTX_URL) as stage:
+            if stage.enabled:
+                stage.update(bytes_sent=payload_size(self.payload))
+            stats = []
+            self.payload = get_client(self.XTX_URL).tokenize(self.payload, stats=stats)
+            if stage.enabled:
+                stage.update(
+                    bytes_received=payload_size(self.payload),
+                    requests=len(stats),
+                    latency=max(x['latency'] for x in stats)
+                )
+        self.store_cached(self.payload)
         return self.payload
 
     def __init__(self, options=None, pipeline=None, **kwargs):
@@ -162,8 +309,84 @@ class XtxProcess(PipelineProcessBase):
         self.options = options
         self.XTX_URL = kwargs.get('XTX_URL', None)
         if self.XTX_URL is None:
-            from django.conf import settings
-            self.XTX_URL = settings.XTX_URL
+            self.XTX_URL = get_setting('XTX_URL')
         super().__init__(**kwargs)
         if not self.valid:
             raise ValueError('Something went wrong in the data conversion. Data is not valid.')
+
+    def cache_settings(self):
+        return {'url': self.XTX_URL}
+
+    def load_result(self, mime, data):
+        return data.decode('utf-8')
+
+
+class BatchItem:
+    """BatchItem: a payload passed through the processes of run_batch"""
+
+    def __init__(self, payload, mime, context=None):
+        self.payload = payload
+        self.mime = mime
+        self.context = context if context is not None else {}
+        self.error = None
+        self.failed_process = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def process_items(process_class, process_kwargs, items, batch_size=SPACY_BATCH_SIZE, n_process=1):
+    """process_items: runs BatchItems through one process with its process_batch method;\
+    items which fail get the error and the name of the process
+
+    :param process_class: a subclass of PipelineProcessBase
+    :param process_kwargs: further kwargs to create the process instances
+    :param items: a list of BatchItem without error
+    """
+    instances = []
+    active = []
+    for item in items:
+        try:
+            instance = process_class(
+                payload=item.payload, mime=item.mime, context=item.context, **process_kwargs
+            )
+        except Exception as e:
+            item.error = e
+            item.failed_process = process_class.__name__
+            continue
+        instances.append(instance)
+        active.append(item)
+    outputs = process_class.process_batch(instances, batch_size=batch_size, n_process=n_process)
+    for item, output in zip(active, outputs):
+        if isinstance(output, Exception):
+            item.error = output
+            item.failed_process = process_class.__name__
+        else:
+            item.payload = output
+            item.mime = process_class.returns
+
+
+def run_batch(items, processes, batch_size=SPACY_BATCH_SIZE, n_process=1):
+    """run_batch: passes many payloads through a chain of pipeline processes; every process\
+    handles the whole batch at once (see PipelineProcessBase.process_batch). A failing item\
+    keeps its error and skips the remaining processes, the others go on.
+
+    :param items: an iterable of (payload, mime) tuples
+    :param processes: a list of process classes or (process class, kwargs) tuples,\
+    e.g. [XtxProcess, (SpacyProcess, {'options': {'model': None, 'language': 'de'}})]
+    :param batch_size: passed to process_batch
+    :param n_process: passed to process_batch
+    :return: a list of BatchItem in the order of the items
+    """
+    results = [BatchItem(payload, mime) for payload, mime in items]
+    for step in processes:
+        if isinstance(step, tuple):
+            process_class, process_kwargs = step
+        else:
+            process_class, process_kwargs = step, {}
+        process_items(
+            process_class, process_kwargs, [x for x in results if x.ok],
+            batch_size=batch_size, n_process=n_process
+        )
+    return results
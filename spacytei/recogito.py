@@ -1,5 +1,4 @@
 import re
-import pandas as pd
 
 from spacytei.tei import TeiReader
 from spacytei.data_prep import ne_offsets_by_sent
@@ -14,6 +13,7 @@ def recogito_dump_to_spacy_ner(
     :regex_pattern: Regex pattern to detect the entities textual context
     :return: A list of spacy-like NER Tuples [('some text'), {'entities': [(15, 19, 'place')]}]
     """
+    import pandas as pd
 
     df = pd.read_csv(recogito_export)
     doc = TeiReader(tei_doc)
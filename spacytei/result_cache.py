@@ -0,0 +1,253 @@
+"""
+This module provides a content addressed on-disk cache of pipeline results, so\
+documents which didn't change since the last run are not annotated again. Entries are\
+keyed by a hash of the input payload, its MIME type and everything the result depends\
+on (process, model name, version and folder fingerprint, enabled components, options)\
+and stored in a SQLite file; the least recently used entries are evicted first.
+"""
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+import lxml.etree as ET
+
+from spacytei.config import RESULT_CACHE_MAX_BYTES
+from spacytei.settings import get_setting
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    mime TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    scope TEXT,
+    fingerprint TEXT,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE INDEX IF NOT EXISTS results_scope ON results (scope);
+"""
+
+# MIME type of spacy Docs serialized with Doc.to_bytes, see dump_doc
+SPACY_DOC_BYTES = 'application/x-spacy-doc'
+
+# parts of a Doc left out of the serialization; the tensor is large and not an annotation
+DOC_EXCLUDE = ['tensor']
+
+
+def dump_doc(doc):
+    """ serializes a spacy Doc without loss of annotations: heads and dependency labels,\
+    sentence starts, entities and user data like the tokenId extension
+    :param doc: A spacy Doc
+    :return: bytes
+    """
+    return doc.to_bytes(exclude=DOC_EXCLUDE)
+
+
+def load_doc(vocab, data):
+    """ restores a Doc serialized by dump_doc
+    :param vocab: The Vocab of the model the Doc belongs to
+    :param data: bytes
+    :return: A spacy Doc
+    """
+    from spacy.tokens import Doc
+
+    from spacytei.columnar import register_extensions
+
+    register_extensions()
+    return Doc(vocab).from_bytes(data, exclude=DOC_EXCLUDE)
+
+
+def payload_bytes(payload):
+    """ returns the bytes a payload is identified by
+    :param payload: XML as str, bytes, mmap or lxml tree, a tokenlist, a ColumnarDoc or a spacy\
+    Doc (serialized with dump_doc, so documents differing only in their arcs get other keys)
+    :return: bytes; raises a TypeError for other payloads
+    """
+    if isinstance(payload, str):
+        return payload.encode('utf-8')
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return bytes(payload)
+    if isinstance(payload, mmap.mmap):
+        return payload[:]
+    if isinstance(payload, (dict, list)):
+        return json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    if isinstance(payload, (ET._Element, ET._ElementTree)):
+        return ET.tostring(payload, encoding='utf-8')
+    from spacytei.columnar import ColumnarDoc
+    from spacytei.wire import dumps
+
+    if isinstance(payload, ColumnarDoc):
+        return dumps(payload)
+    if hasattr(payload, 'to_bytes') and hasattr(payload, 'vocab'):
+        return dump_doc(payload)
+    raise TypeError('Payloads of type {} can not be cached.'.format(type(payload).__name__))
+
+
+class ResultCache():
+
+    """ a size bounded LRU cache of pipeline results in a SQLite file """
+
+    def __init__(self, path=None, max_bytes=RESULT_CACHE_MAX_BYTES):
+        """
+        :param path: The SQLite file, ':memory:' keeps the cache in memory; defaults to the\
+        setting RESULT_CACHE_PATH
+        :param max_bytes: Upper limit of the summed up size of all stored results in bytes
+        """
+        if path is None:
+            path = get_setting('RESULT_CACHE_PATH')
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def make_key(self, payload, mime, **settings):
+        """ creates the cache key of a result
+        :param payload: The input payload, see payload_bytes
+        :param mime: The MIME type of the payload
+        :param settings: Everything else the result depends on, JSON serializable
+        :return: A hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([mime, settings], sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(payload_bytes(payload))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ returns a stored result
+        :param key: A key created by make_key
+        :return: A tuple of the MIME type and the data (bytes), None if the key is unknown
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT mime, data FROM results WHERE key = ?', (key, )
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        return row[0], bytes(row[1])
+
+    def put(self, key, mime, data, scope=None, fingerprint=None):
+        """ stores a result and evicts the least recently used ones above max_bytes
+        :param key: A key created by make_key
+        :param mime: The MIME type of the data
+        :param data: The serialized result (bytes)
+        :param scope: e.g. the model; entries of the same scope with another fingerprint are\
+        removed, since they were made e.g. with a previous version of the model
+        :param fingerprint: See scope
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                if scope is not None:
+                    self.invalidations += self._db.execute(
+                        'DELETE FROM results WHERE scope = ? AND fingerprint IS NOT ?',
+                        (scope, fingerprint)
+                    ).rowcount
+                self._db.execute(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, mime, data, len(data), scope, fingerprint, now, now)
+                )
+                self._evict()
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def _evict(self):
+        size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        evicted = []
+        for key, entry_size in self._db.execute(
+            'SELECT key, size FROM results ORDER BY last_used'
+        ).fetchall():
+            if size <= self.max_bytes:
+                break
+            evicted.append((key, ))
+            size -= entry_size
+        self._db.executemany('DELETE FROM results WHERE key = ?', evicted)
+        self.evictions += len(evicted)
+
+    def invalidate(self, scope=None):
+        """ removes the entries of a scope (e.g. a model), all entries if scope is None """
+        with self._lock:
+            if scope is None:
+                removed = self._db.execute('DELETE FROM results').rowcount
+            else:
+                removed = self._db.execute('DELETE FROM results WHERE scope = ?', (scope, )).rowcount
+            self.invalidations += removed
+        return removed
+
+    def clear(self):
+        """ removes all entries and resets the counters """
+        self.invalidate()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def stats(self):
+        """ returns a dict with the hit/miss counters and the current fill level """
+        with self._lock:
+            entries, size = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results'
+            ).fetchone()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_result_cache(cache=None):
+    """ resolves the result_cache argument of the pipeline processes
+    :param cache: A ResultCache, False to disable caching or None for the process wide cache,\
+    which exists if the setting RESULT_CACHE_ENABLED is true
+    :return: A ResultCache or None
+    """
+    global _default_cache
+    if cache is False:
+        return None
+    if cache is not None:
+        return cache
+    enabled = get_setting('RESULT_CACHE_ENABLED')
+    if isinstance(enabled, str):
+        enabled = enabled.lower() in ('1', 'true', 'yes', 'on')
+    if not enabled:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache(max_bytes=int(get_setting('RESULT_CACHE_MAX_BYTES')))
+        return _default_cache
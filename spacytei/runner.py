@@ -0,0 +1,153 @@
+"""
+This module provides an asyncio runner for chains of pipeline processes which overlaps\
+the network I/O of processes like XtxProcess with the CPU work of processes like\
+SpacyProcess: while spaCy annotates one batch, the XTX requests of the next documents\
+are already running.
+"""
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+from spacytei.config import SPACY_BATCH_SIZE, XTX_MAX_WORKERS, PIPELINE_QUEUE_SIZE
+from spacytei.pipeline import BatchItem, process_items
+
+
+# marks the end of the items in a queue
+_DONE = object()
+
+
+def _split_step(step):
+    if isinstance(step, tuple):
+        return step
+    return step, {}
+
+
+def _run_single(process_class, process_kwargs, item):
+    """ runs one item through a process, storing the result or the error on the item """
+    try:
+        instance = process_class(
+            payload=item.payload, mime=item.mime, context=item.context, **process_kwargs
+        )
+        item.payload = instance.process()
+        item.mime = process_class.returns
+    except Exception as e:
+        item.error = e
+        item.failed_process = process_class.__name__
+
+
+class PipelineRunner:
+    """PipelineRunner: runs items through a chain of processes, one asyncio task group per process.
+    Processes with io_bound = True handle up to `concurrency` items at once in a thread pool,
+    the others collect batches of up to batch_size waiting items and run process_batch in a
+    single worker thread. Stages are connected by queues of queue_size items, so a fast
+    stage waits for a slow one instead of piling up documents in memory.
+    """
+
+    def __init__(
+        self, processes, concurrency=XTX_MAX_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+        batch_size=SPACY_BATCH_SIZE, n_process=1
+    ):
+        """
+        :param processes: a list of process classes or (process class, kwargs) tuples,\
+        e.g. [(XtxProcess, {'XTX_URL': url}), SpacyProcess]
+        :param concurrency: the number of items an io_bound process handles at once
+        :param queue_size: the maximum number of items waiting in front of a process
+        :param batch_size: the maximum number of items passed to process_batch at once
+        :param n_process: passed to process_batch
+        """
+        self.processes = [_split_step(x) for x in processes]
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+    async def _feed(self, items, results, queue):
+        for payload, mime in items:
+            item = BatchItem(payload, mime)
+            results.append(item)
+            await queue.put(item)
+        await queue.put(_DONE)
+
+    async def _io_stage(self, process_class, process_kwargs, executor, queue_in, queue_out):
+        loop = asyncio.get_running_loop()
+
+        async def worker():
+            while True:
+                item = await queue_in.get()
+                if item is _DONE:
+                    # let the other workers see the end as well
+                    await queue_in.put(_DONE)
+                    return
+                if item.ok:
+                    await loop.run_in_executor(
+                        executor, _run_single, process_class, process_kwargs, item
+                    )
+                await queue_out.put(item)
+
+        await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+        await queue_out.put(_DONE)
+
+    async def _batch_stage(self, process_class, process_kwargs, executor, queue_in, queue_out):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch = [await queue_in.get()]
+            while len(batch) < self.batch_size and not queue_in.empty():
+                batch.append(queue_in.get_nowait())
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+            active = [x for x in batch if x.ok]
+            if active:
+                await loop.run_in_executor(
+                    executor, process_items, process_class, process_kwargs, active,
+                    self.batch_size, self.n_process
+                )
+            for item in batch:
+                await queue_out.put(item)
+        await queue_out.put(_DONE)
+
+    async def _drain(self, queue):
+        while await queue.get() is not _DONE:
+            pass
+
+    async def run_async(self, items):
+        """ runs the items through the processes
+        :param items: an iterable of (payload, mime) tuples
+        :return: a list of BatchItem in the order of the items
+        """
+        results = []
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.processes) + 1)]
+        io_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        cpu_executor = ThreadPoolExecutor(max_workers=1)
+        tasks = [self._feed(items, results, queues[0])]
+        for i, (process_class, process_kwargs) in enumerate(self.processes):
+            if getattr(process_class, 'io_bound', False):
+                tasks.append(self._io_stage(
+                    process_class, process_kwargs, io_executor, queues[i], queues[i + 1]
+                ))
+            else:
+                tasks.append(self._batch_stage(
+                    process_class, process_kwargs, cpu_executor, queues[i], queues[i + 1]
+                ))
+        tasks.append(self._drain(queues[-1]))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            io_executor.shutdown(wait=False)
+            cpu_executor.shutdown(wait=False)
+        return results
+
+    def run(self, items):
+        """ runs run_async in a new event loop, see there """
+        return asyncio.run(self.run_async(items))
+
+
+def run_pipeline(items, processes, **kwargs):
+    """ runs (payload, mime) items through a chain of processes with a PipelineRunner
+    :param items: an iterable of (payload, mime) tuples
+    :param processes: a list of process classes or (process class, kwargs) tuples
+    :param kwargs: passed to PipelineRunner
+    :return: a list of BatchItem in the order of the items
+    """
+    return PipelineRunner(processes, **kwargs).run(items)
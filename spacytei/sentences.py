@@ -0,0 +1,130 @@
+"""
+This module provides sentence splitting backends which are cheaper than running\
+a full spaCy pipeline just to get doc.sents. Wherever a model is passed for sentence\
+splitting, one of the following specs can be used instead of a model name:
+
+'sentencizer:de' - a blank language with spaCy's rule based sentencizer
+'parser:de_core_news_sm' - the given model with the dependency parser as only component
+'rules:de' - a pure python splitter using SENTENCE_ABBREVIATIONS (e.g. for historical German)
+"""
+import re
+
+from spacytei.config import SENTENCE_ABBREVIATIONS
+from spacytei.models import get_model
+
+
+SENTENCE_END = re.compile(r'[.!?…]+["\'»«”“)\]]*(?=\s+["\'„»«“(\[]?[A-ZÄÖÜ])')
+ORDINAL = re.compile(r'^\d+\.$')
+INITIAL = re.compile(r'^\w\.$')
+
+_rule_splitters = {}
+
+
+class RuleSentence():
+
+    """ a sentence found by RuleSentenceSplitter, offering the attributes of a spacy Span\
+    used for sentence splitting """
+
+    def __init__(self, doc_text, start_char, end_char):
+        self.text = doc_text[start_char:end_char]
+        self.start_char = start_char
+        self.end_char = end_char
+
+    def __len__(self):
+        return len(self.text.split())
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return self.text
+
+
+class RuleSplitText():
+
+    """ the result of RuleSentenceSplitter, offering .text and .sents like a spacy Doc """
+
+    def __init__(self, text, sents):
+        self.text = text
+        self.sents = sents
+
+
+class RuleSentenceSplitter():
+
+    """ splits after ., ! and ? followed by an upper case word, unless the punctuation is part\
+    of an abbreviation, an ordinal number or an initial """
+
+    def __init__(self, abbreviations=()):
+        """
+        :param abbreviations: A list of abbreviations like 'vgl.'; compared case insensitive
+        """
+        self.abbreviations = set(x.lower() for x in abbreviations)
+
+    def __call__(self, text):
+        """ splits a text into sentences
+        :param text: Some string
+        :return: An object with the attributes 'text' and 'sents'
+        """
+        sents = []
+        start = 0
+        for m in SENTENCE_END.finditer(text):
+            if m.group().startswith('.') and self.is_abbreviation(text, m.start()):
+                continue
+            self._add(sents, text, start, m.end())
+            start = m.end()
+        self._add(sents, text, start, len(text))
+        return RuleSplitText(text, sents)
+
+    def pipe(self, texts, **kwargs):
+        """ splits many texts, see __call__ """
+        for text in texts:
+            yield self(text)
+
+    def is_abbreviation(self, text, dot):
+        """ checks if the period at position dot ends an abbreviation, ordinal number or initial """
+        word_start = dot
+        while word_start > 0 and not text[word_start - 1].isspace():
+            word_start -= 1
+        word = text[word_start:dot + 1]
+        if not word or word == '.':
+            return False
+        return (
+            word.lower() in self.abbreviations or
+            ORDINAL.match(word) is not None or
+            INITIAL.match(word) is not None
+        )
+
+    def _add(self, sents, text, start, end):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            sents.append(RuleSentence(text, start, end))
+
+
+def get_rule_splitter(lang='de'):
+    """ returns a RuleSentenceSplitter using the SENTENCE_ABBREVIATIONS of the given language """
+    splitter = _rule_splitters.get(lang)
+    if splitter is None:
+        splitter = RuleSentenceSplitter(SENTENCE_ABBREVIATIONS.get(lang, []))
+        _rule_splitters[lang] = splitter
+    return splitter
+
+
+def get_sentence_splitter(model='de_core_news_sm'):
+    """ returns an object which can be called with a text and returns something with .sents
+    :param model: A spacy model name or path (the full pipeline is used), one of the specs\
+    described in this module's docstring or an object which is already a splitter (e.g. nlp)
+    :return: A spacy Language or a RuleSentenceSplitter
+    """
+    if not isinstance(model, str):
+        return model
+    kind, _, name = model.partition(':')
+    if kind == 'sentencizer':
+        return get_model('blank:{}'.format(name or 'de'), add_pipes=('sentencizer',))
+    elif kind == 'parser':
+        return get_model(name or 'de_core_news_sm', disable=('tagger', 'ner'))
+    elif kind == 'rules':
+        return get_rule_splitter(name or 'de')
+    return get_model(model)
@@ -0,0 +1,76 @@
+"""
+This module resolves deployment settings like NLP_MODELS_FOLDER or XTX_URL without\
+requiring Django. A setting is looked up in this order:
+
+1. the provider set with set_settings_provider (a callable taking the name and a default)
+2. django.conf.settings, if Django is imported or DJANGO_SETTINGS_MODULE is set
+3. the environment variables SPACYTEI_<NAME> and <NAME>
+4. the default passed to get_setting, else the constant of the same name in spacytei.config
+"""
+import os
+import sys
+
+from spacytei import config
+
+
+ENV_PREFIX = 'SPACYTEI_'
+
+# returned by providers which don't know a setting
+MISSING = object()
+
+_provider = None
+
+
+def set_settings_provider(provider):
+    """ sets the callable asked first for every setting, e.g. lambda name, default: my_conf.get(name,\
+    default); None removes it
+    :param provider: A callable taking the name and a default, returning the value or the default
+    :return: The previous provider
+    """
+    global _provider
+    previous = _provider
+    _provider = provider
+    return previous
+
+
+def django_settings(name, default=MISSING):
+    """ reads a setting from django.conf.settings without importing Django in processes which\
+    don't use it """
+    if 'django.conf' not in sys.modules and not os.environ.get('DJANGO_SETTINGS_MODULE'):
+        return default
+    try:
+        from django.conf import settings
+    except ImportError:
+        return default
+    if not settings.configured and not os.environ.get('DJANGO_SETTINGS_MODULE'):
+        return default
+    return getattr(settings, name, default)
+
+
+def env_settings(name, default=MISSING):
+    """ reads a setting from the environment variable SPACYTEI_<name> or <name> """
+    for key in (ENV_PREFIX + name, name):
+        if key in os.environ:
+            return os.environ[key]
+    return default
+
+
+def get_setting(name, default=MISSING):
+    """ returns the value of a setting
+    :param name: The name of the setting, e.g. 'NLP_MODELS_FOLDER'
+    :param default: The value if no source knows the setting; defaults to the constant in\
+    spacytei.config
+    :return: The value; raises a LookupError if the setting isn't found anywhere
+    """
+    providers = [django_settings, env_settings]
+    if _provider is not None:
+        providers.insert(0, _provider)
+    for provider in providers:
+        value = provider(name, MISSING)
+        if value is not MISSING:
+            return value
+    if default is not MISSING:
+        return default
+    if hasattr(config, name):
+        return getattr(config, name)
+    raise LookupError('The setting {} is not configured.'.format(name))
@@ -1,4 +1,162 @@
-from spacytei.xml import XMLReader
+import lxml.etree as ET
+
+from array import array
+from io import BytesIO
+
+from spacytei.instrumentation import INSTRUMENTATION
+from spacytei.xml import XMLReader, NSMAP, get_default_parser, get_xpath, iterparse_options
+
+
+NODES_BY_NAME = get_xpath("//tcf:*[local-name() = $name]")
+
+TCF_TOKEN = "{{{}}}token".format(NSMAP['tcf'])
+TCF_SENTENCE = "{{{}}}sentence".format(NSMAP['tcf'])
+TCF_LEMMA = "{{{}}}lemma".format(NSMAP['tcf'])
+TCF_TAG = "{{{}}}tag".format(NSMAP['tcf'])
+TCF_TEXT_CORPUS = "{{{}}}TextCorpus".format(NSMAP['tcf'])
+TCF_LEMMAS = "{{{}}}lemmas".format(NSMAP['tcf'])
+TCF_POSTAGS = "{{{}}}POStags".format(NSMAP['tcf'])
+TCF_NAMED_ENTITIES = "{{{}}}namedEntities".format(NSMAP['tcf'])
+TCF_ENTITY = "{{{}}}entity".format(NSMAP['tcf'])
+
+# depth of the elements below D-Spin/TextCorpus/<layer>, they are copied one by one
+LAYER_ITEM_DEPTH = 3
+
+
+def follows_with_whitespace(value, follows):
+    """ guesses if a token is followed by whitespace from its text and the next token's text
+    :param value: The text of the token
+    :param follows: The text of the next token, None for the last token
+    :return: True or False
+    """
+    if not follows:
+        return False
+    if value == "(":
+        return False
+    elif value == "„":
+        return False
+    elif value == "‒":
+        return True
+    elif follows[0].isalnum():
+        return True
+    elif follows[0] == "„":
+        return True
+    elif follows[0] == "(":
+        return True
+    return False
+
+
+class TcfColumns():
+
+    """ the token, lemma, tag, named entity and sentence layers of a TCF document as columns\
+    aligned with the tokens layer. Lemmas, tags, entities and sentences are joined to the tokens\
+    by their tokenIDs, missing annotations are None; with a namedEntities layer, tokens outside\
+    of its entities get the IOB tag 'O'. The tokens of sentence i are\
+    sent_tokens[sent_offsets[i]:sent_offsets[i + 1]] (indices into the token columns).
+    """
+
+    def __init__(self):
+        self.token_ids = []
+        self.words = []
+        self.lemmas = []
+        self.tags = []
+        self.iob = []
+        self.has_entities = False
+        self.token_index = {}
+        self.sent_ids = []
+        self.sent_offsets = array('l', [0])
+        self.sent_tokens = array('l')
+        self.unresolved_ids = []
+        self._pending = []
+
+    def __len__(self):
+        return len(self.words)
+
+    def add_token(self, token_id, text):
+        """ appends a tcf:token """
+        if token_id is not None:
+            self.token_index[token_id] = len(self.words)
+        self.token_ids.append(token_id)
+        self.words.append(text)
+        self.lemmas.append(None)
+        self.tags.append(None)
+        self.iob.append(None)
+
+    def add_sentence(self, sent_id, token_ids):
+        """ appends a tcf:sentence, its tokens are resolved by finish() """
+        self.sent_ids.append(sent_id)
+        self._pending.append((None, token_ids, None))
+
+    def add_annotation(self, column, token_ids, value):
+        """ sets the value of an annotation layer (e.g. self.lemmas) for the referenced tokens """
+        for token_id in token_ids:
+            index = self.token_index.get(token_id)
+            if index is None:
+                # the annotation layer comes before the tokens layer
+                self._pending.append((column, [token_id], value))
+            else:
+                column[index] = value
+
+    def add_entity(self, token_ids, ne_type):
+        """ sets the IOB tags of the tokens of a tcf:entity, e.g. 'B-PER', 'I-PER' """
+        self.has_entities = True
+        for i, token_id in enumerate(token_ids):
+            self.add_annotation(self.iob, [token_id], "{}-{}".format('I' if i else 'B', ne_type))
+
+    def finish(self):
+        """ resolves sentences and annotations which could not be joined while reading """
+        pending = self._pending
+        self._pending = []
+        for column, token_ids, value in pending:
+            if column is not None:
+                for token_id in token_ids:
+                    index = self.token_index.get(token_id)
+                    if index is None:
+                        self.unresolved_ids.append(token_id)
+                    else:
+                        column[index] = value
+                continue
+            for token_id in token_ids:
+                index = self.token_index.get(token_id)
+                if index is None:
+                    self.unresolved_ids.append(token_id)
+                else:
+                    self.sent_tokens.append(index)
+            self.sent_offsets.append(len(self.sent_tokens))
+        if self.has_entities:
+            self.iob = ['O' if x is None else x for x in self.iob]
+        return self
+
+    def annotations(self):
+        """ returns a dict mapping token-dict keys ('lemma', 'type' and 'iob') to the columns\
+        with any values """
+        columns = {'lemma': self.lemmas, 'type': self.tags, 'iob': self.iob}
+        return {
+            key: values for key, values in columns.items()
+            if any(x is not None for x in values)
+        }
+
+    def sent_indices(self, i):
+        """ returns the token indices of the i-th sentence """
+        return self.sent_tokens[self.sent_offsets[i]:self.sent_offsets[i + 1]]
+
+    def sent_lengths(self):
+        """ groups the tokens into the sentences of the sentences layer; tokens of no sentence\
+        belong to the preceding one, without the layer all tokens form one sentence
+        :return: The number of tokens per sentence, see spacytei.columnar.run_lengths
+        """
+        from spacytei.columnar import run_lengths
+
+        keys = [None] * len(self.words)
+        for j, (sent_id, indices) in enumerate(self.iter_sents()):
+            for i in indices:
+                keys[i] = j
+        return run_lengths(keys)
+
+    def iter_sents(self):
+        """ yields a tuple of the sentence id and the indices of its tokens per sentence """
+        for i, sent_id in enumerate(self.sent_ids):
+            yield sent_id, self.sent_indices(i)
 
 
 class Tcf(XMLReader):
@@ -10,18 +168,66 @@ class Tcf(XMLReader):
 
     def list_nodes(self, element):
         """ returns a list of passed in element-nodes"""
-        expr = "//tcf:*[local-name() = $name]"
-        nodes = self.tree.xpath(expr, name=element, namespaces=self.nsmap)
+        nodes = NODES_BY_NAME(self.tree, name=element)
         return nodes
 
     def list_multiple_nodes(self, elements=['token', 'lemma', 'tag', 'sentence']):
         """ returns a dict with keys of past in elements and a list of those nodes as values"""
-        expr = "//tcf:*[local-name() = $name]"
-        nodes = {}
-        for x in elements:
-            nodes[x] = self.list_nodes(x)
+        nodes = {x: [] for x in elements}
+        names = {"{{{}}}{}".format(NSMAP['tcf'], x): x for x in elements}
+        for x in self.tree.iter(*names.keys()):
+            nodes[names[x.tag]].append(x)
         return nodes
 
+    @property
+    def columns(self):
+        """ the TcfColumns of the document, read once on first access """
+        columns = getattr(self, '_columns', None)
+        if columns is None:
+            columns = self.read_columns()
+            self._columns = columns
+        return columns
+
+    def read_columns(self):
+        """ reads tokens, lemmas, tags, entities and sentences in a single pass over the document; if the\
+        document was opened with streaming=True, it is never held in memory as a whole
+        :return: A TcfColumns instance
+        """
+        columns = TcfColumns()
+        for x in self._iter_layer_nodes():
+            tag = x.tag
+            if tag == TCF_TOKEN:
+                columns.add_token(x.get('ID'), x.text)
+            elif tag == TCF_SENTENCE:
+                columns.add_sentence(x.get('ID'), x.get('tokenIDs', '').split())
+            elif tag == TCF_LEMMA:
+                columns.add_annotation(columns.lemmas, x.get('tokenIDs', '').split(), x.text)
+            elif tag == TCF_TAG:
+                columns.add_annotation(columns.tags, x.get('tokenIDs', '').split(), x.text)
+            elif tag == TCF_ENTITY:
+                columns.add_entity(x.get('tokenIDs', '').split(), x.get('class'))
+            elif tag == TCF_NAMED_ENTITIES:
+                columns.has_entities = True
+        return columns.finish()
+
+    def _iter_layer_nodes(self):
+        """ yields tcf:token, tcf:sentence, tcf:lemma, tcf:tag, tcf:entity and tcf:namedEntities\
+        elements in document order """
+        tags = (TCF_TOKEN, TCF_SENTENCE, TCF_LEMMA, TCF_TAG, TCF_ENTITY, TCF_NAMED_ENTITIES)
+        if self.view is not None:
+            for x in self.view.iter(*tags):
+                yield x
+            return
+        options = iterparse_options(self.parser)
+        context = ET.iterparse(self._open_source(), events=('end',), **options)
+        for event, elem in context:
+            if elem.tag in tags:
+                yield elem
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        del context
+
     def count_multiple_nodes(self, elements=['token', 'lemma', 'tag', 'sentence']):
         """ counts the number of nodes of the passed in elements """
         nodes = self.list_multiple_nodes(elements)
@@ -31,25 +237,16 @@ class Tcf(XMLReader):
         return result
 
     def create_sent_list(self):
-        """ create a list of dicts for each sentence with their according token elements"""
-        elements = ['token', 'lemma', 'tag', 'sentence']
-        start = 0
-        end = 0
+        """ create a list of dicts for each sentence with the text of their tokens, tags and lemmas;\
+        tags and lemmas are joined by tokenIDs, missing ones are None """
+        columns = self.columns
         sent_list = []
-        nodes = self.list_multiple_nodes(elements)
-        sentences = nodes['sentence']
-        tokens = nodes['token']
-        tags = nodes['tag']
-        lemmas = nodes['lemma']
-        for x in sentences:
+        for sent_id, indices in columns.iter_sents():
             sent = {}
-            token_count = len(x.xpath('./@tokenIDs')[0].split(' '))
-            end = start + token_count
-            sent['sent_id'] = x.xpath('./@ID')[0]
-            sent['words'] = tokens[start:end]
-            sent['tags'] = tags[start:end]
-            sent['lemmas'] = lemmas[start:end]
-            start = end
+            sent['sent_id'] = sent_id
+            sent['words'] = [columns.words[i] for i in indices]
+            sent['tags'] = [columns.tags[i] for i in indices]
+            sent['lemmas'] = [columns.lemmas[i] for i in indices]
             sent_list.append(sent)
         return sent_list
 
@@ -57,93 +254,341 @@ class Tcf(XMLReader):
         """ returns a list of samples to trains spacy's pos-tagger"""
         TRAIN_DATA = []
         for x in self.create_sent_list():
-            text = (" ".join([y.text for y in x['words']]))
-            tags = {'tags': [y.text for y in x['tags']]}
-            words = {'word': [y.text for y in x['words']]}
-            lemmas = {'lemma': [y.text for y in x['lemmas']]}
+            text = (" ".join(x['words']))
+            tags = {'tags': x['tags']}
+            words = {'word': x['words']}
+            lemmas = {'lemma': x['lemmas']}
             TRAIN_DATA.append((text, [words, tags, lemmas]))
         return TRAIN_DATA
 
-    def create_tokenlist(self):
-        """ returns a list of token-dicts extracted from tcf:token """
-        words = self.list_nodes('token')
+    def create_tokenlist(self, sents=False):
+        """ returns a list of token-dicts extracted from tcf:token with the lemma, type (the POS\
+        tag) and iob of the lemmas, POStags and namedEntities layers, so spacy components can\
+        skip existing annotations
+        :param sents: If True, the tokens are grouped into the sentences of the sentences layer\
+        (see TcfColumns.sent_lengths) like process_tokenlist reads them
+        """
+        columns = self.columns
+        words = columns.words
+        annotations = columns.annotations()
         token_list = []
-        for x in words:
+        for i, value in enumerate(words):
             token = {}
-            token['value'] = x.text
-            token['tokenId'] = x.xpath('./@ID')[0]
-            try:
-                follows = x.getnext().text
-            except AttributeError:
-                follows = None
-            if follows:
-                if token['value'] == "(":
-                    token['whitespace'] = False
-                elif token['value'] == "„":
-                    token['whitespace'] = False
-                elif token['value'] == "‒":
-                    token['whitespace'] = True
-                elif follows[0].isalnum():
-                    token['whitespace'] = True
-                elif follows[0] == "„":
-                    token['whitespace'] = True
-                elif follows[0] == "(":
-                    token['whitespace'] = True
-                else:
-                    token['whitespace'] = False
-            else:
-                token['whitespace'] = False
+            token['value'] = value
+            token['tokenId'] = columns.token_ids[i]
+            follows = words[i + 1] if i + 1 < len(words) else None
+            token['whitespace'] = follows_with_whitespace(value, follows)
+            for key, values in annotations.items():
+                if values[i] is not None:
+                    token[key] = values[i]
             token_list.append(token)
+        if sents:
+            from spacytei.columnar import group_tokens
+
+            return group_tokens(token_list, columns.sent_lengths())
         return token_list
 
-    def process_tokenlist(self, tokenlist, by_id=False):
-        """ takes a tokenlist and updates the selected elements. Returns the updated self.tree """
-        nr_tokens = len(tokenlist)
-        nr_nodes = len(self.tree.xpath('.//tcf:token', namespaces=self.nsmap))
-        print("# tokens: {}".format(nr_tokens))
-        print("# token-nodes: {}".format(nr_nodes))
+    def create_columns(self):
+        """ creates the columns of create_tokenlist(sents=True) without building token dicts
+        :return: A spacytei.columnar.ColumnarDoc with the columns value, tokenId and whitespace,\
+        the annotation columns with any values and the sentences
+        """
+        columns = self.columns
+        words = columns.words
+        following = words[1:] + [None]
+        from spacytei.columnar import ColumnarDoc, sent_texts
+
+        values = {
+            'value': words,
+            'tokenId': columns.token_ids,
+            'whitespace': [follows_with_whitespace(x, y) for x, y in zip(words, following)],
+        }
+        values.update(columns.annotations())
+        lengths = columns.sent_lengths()
+        texts = sent_texts(words, values['whitespace'], lengths)
+        return ColumnarDoc.from_columns(values, lengths, texts)
+
+    def process_tokenlist(self, tokenlist, by_id=False, verbose=True, output=None):
+        """ takes a tokenlist and adds lemmas, POStags and namedEntities layers (see write_layers).\
+        Returns the updated self.tree. A summary of unmatched tokens and nodes is stored in\
+        self.writeback_summary
+        :param output: A file path or a file object opened in binary mode; if passed, the result\
+        is streamed there instead and self.tree stays as it is, so the document is never held in\
+        memory as a whole (with streaming=True)
+        :return: The updated self.tree, or output if passed
+        """
+        with INSTRUMENTATION.stage('write_back', format='tcf', by_id=by_id) as stage:
+            result = self.write_layers(tokenlist, output=output, by_id=by_id, verbose=verbose)
+            if stage.enabled:
+                stage.update(
+                    tokens=self.writeback_summary['updated'] + self.writeback_summary['missing'],
+                    updated=self.writeback_summary['updated'],
+                )
+                if output is None:
+                    stage.update(bytes=len(result))
+        if output is not None:
+            return output
+        if self._shared_tree is None and self._original is None and not self._is_replayable():
+            # the tree is replaced, not changed, so it can be kept as it is
+            self._original = self.tree
+        self._modified = True
+        self.tree = ET.fromstring(result, self.parser or get_default_parser())
+        self._columns = None
+        return self.tree
+
+    def write_layers(
+        self, tokenlist, output=None, by_id=False, verbose=True,
+        tag_key='type', tagset='stts', ne_tagset='CoNLL2002'
+    ):
+        """ copies the document to output and appends lemmas, POStags and namedEntities layers\
+        built from the tokenlist; existing layers of these names are replaced, everything else\
+        (including comments, processing instructions and whitespace) is copied as it is. The\
+        source is streamed element by element if the document was opened with streaming=True,\
+        the result is written incrementally, so neither is held in memory as a whole.
+        :param tokenlist: A list of sents like [{'tokens': [{'tokenId': 't1', 'lemma': ...}]}] or\
+        a flat list of token dicts
+        :param output: A file path or a file object opened in binary mode; if None, the result\
+        is collected and returned as bytes. The new layer elements get IDs like le_0, pt_0 and\
+        ne_0
+        :param by_id: If True, tokens are matched to tcf:token by their tokenId, else by position
+        :param tag_key: The token-dict key written to the POStags layer, 'type' holds spaCy's\
+        fine grained (STTS) tag, 'pos' the universal one
+        :param tagset: The tagset attribute of the POStags layer
+        :param ne_tagset: The type attribute of the namedEntities layer
+        :return: The bytes written if output is None, else output
+        """
+        from spacytei.columnar import as_sents
+
+        tokens = [x for sent in as_sents(tokenlist) for x in sent['tokens']]
+        layers = {
+            TCF_LEMMAS: any(x.get('lemma') for x in tokens),
+            TCF_POSTAGS: any(x.get(tag_key) for x in tokens),
+            TCF_NAMED_ENTITIES: any(x.get('iob', 'O') != 'O' for x in tokens),
+        }
+        duplicate_ids = []
         if by_id:
-            expr = './/tcf:token[@ID=$id]'
-            for sent in tokenlist:
-                for x in sent['tokens']:
-                    print('by ID')
-                    try:
-                        node = self.tree.xpath(expr, id=x['tokenId'], namespaces=self.nsmap)[0]
-                    except IndexError:
-                        node = None
-                    if node is not None:
-                        try:
-                            node.attrib['lemma'] = x['lemma']
-                        except AttributeError:
-                            pass
-                        try:
-                            node.attrib['iob'] = x['iob']
-                        except AttributeError:
-                            pass
-                        try:
-                            node.attrib['type'] = x['type']
-                        except AttributeError:
-                            pass
-                        try:
-                            node.attrib['ana'] = x['pos']
-                        except AttributeError:
-                            pass
+            tokens_by_id = {}
+            for x in tokens:
+                if x['tokenId'] in tokens_by_id:
+                    duplicate_ids.append(x['tokenId'])
+                else:
+                    tokens_by_id[x['tokenId']] = x
+        matched = []
+        matched_ids = set()
+        unused_ids = []
+        epilog = []
+        target = BytesIO() if output is None else output
+        with ET.xmlfile(target, encoding='utf-8') as xf:
+            xf.write_declaration()
+            replaced_layers = set(x for x, write in layers.items() if write)
+            for node in self._copy_through(xf, replaced_layers, epilog):
+                if node.tag == TCF_TOKEN:
+                    token_id = node.get('ID')
+                    if by_id:
+                        token = tokens_by_id.pop(token_id, None)
+                    else:
+                        token = tokens[len(matched)] if len(matched) < len(tokens) else None
+                    if token is None:
+                        if by_id and token_id in matched_ids:
+                            duplicate_ids.append(token_id)
+                        else:
+                            unused_ids.append(token_id)
+                    else:
+                        matched_ids.add(token_id)
+                        matched.append((token_id, token))
+                elif node.tag == TCF_TEXT_CORPUS:
+                    self._write_lemmas(xf, matched, layers[TCF_LEMMAS])
+                    self._write_postags(xf, matched, layers[TCF_POSTAGS], tag_key, tagset)
+                    self._write_named_entities(
+                        xf, matched, layers[TCF_NAMED_ENTITIES], ne_tagset
+                    )
+        if epilog:
+            # xmlfile can't write anything after the root element
+            data = b"".join(b"\n" + x for x in epilog)
+            if hasattr(target, 'write'):
+                target.write(data)
+            else:
+                with open(target, 'ab') as f:
+                    f.write(data)
+        if by_id:
+            missing_ids = tokens_by_id.keys()
         else:
-            print('not by ID')
-            tokenlist_2 = []
-            for sent in tokenlist:
-                for x in sent['tokens']:
-                    tokenlist_2.append(x)
-            tokenlist = tokenlist_2
-            if len(tokenlist) != nr_nodes:
-                return self.tree
-            counter = 0
-            print(tokenlist)
-            for x in self.list_nodes('token'):
-                x.attrib['lemma'] = tokenlist[counter]['lemma']
-                x.attrib['iob'] = tokenlist[counter]['iob']
-                x.attrib['type'] = tokenlist[counter]['type']
-                x.attrib['ana'] = tokenlist[counter]['pos']
-                counter += 1
+            missing_ids = [x.get('tokenId') for x in tokens[len(matched):]]
+        self.summarize_writeback(
+            len(matched), missing_ids, unused_ids, verbose=verbose, duplicate_ids=duplicate_ids
+        )
+        if output is None:
+            return target.getvalue()
+        return output
 
-        return self.tree
+    def _copy_through(self, xf, replaced_layers, epilog):
+        """ writes the document to xf, skipping the replaced layers of tcf:TextCorpus and the\
+        indentation after them; comments, processing instructions and tails are copied along. Yields every tcf:token after it was\
+        written and tcf:TextCorpus right before it is closed, so further layers can be written.
+        :param epilog: A list the serialized comments and processing instructions following the\
+        root element are appended to, xf can't write them
+        """
+        kinds = ('start', 'end', 'comment', 'pi')
+        view = self.view
+        if view is not None:
+            tree = view if hasattr(view, 'getroot') else view.getroottree()
+            events = ET.iterwalk(tree, events=kinds)
+            clear = False
+        else:
+            options = iterparse_options(self.parser)
+            events = ET.iterparse(self._open_source(), events=kinds, **options)
+            clear = True
+        stack = []
+        opened = []
+        skip = 0
+        last = None
+        root_closed = False
+        for event, elem in events:
+            if last is not None and last.tail:
+                xf.write(last.tail)
+            if last is not None and clear:
+                last.clear()
+                while last.getprevious() is not None:
+                    del last.getparent()[0]
+            last = None
+            if event in ('comment', 'pi'):
+                depth = len(stack)
+                if not depth:
+                    # whitespace around the root element can't be written, only the node itself
+                    if root_closed:
+                        epilog.append(ET.tostring(elem, with_tail=False))
+                    else:
+                        xf.write(elem, with_tail=False)
+                    continue
+                # nodes within layer items are written along with their item
+                if skip or depth > LAYER_ITEM_DEPTH:
+                    continue
+                self._open_pending(xf, stack, opened)
+                xf.write(elem, with_tail=False)
+                last = elem
+                continue
+            if event == 'start':
+                depth = len(stack)
+                stack.append(elem)
+                if skip or depth >= LAYER_ITEM_DEPTH:
+                    skip += 1 if skip else 0
+                    continue
+                if depth and stack[-2].tag == TCF_TEXT_CORPUS and elem.tag in replaced_layers:
+                    skip = 1
+                    continue
+                self._open_pending(xf, stack[:-1], opened)
+                continue
+            stack.pop()
+            depth = len(stack)
+            if skip:
+                skip -= 1
+                if not skip and elem.tail and elem.tail.strip():
+                    # text after a replaced layer is kept, mere indentation is dropped
+                    last = elem
+                elif clear:
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                continue
+            if depth > LAYER_ITEM_DEPTH:
+                continue
+            if depth == LAYER_ITEM_DEPTH:
+                self._open_pending(xf, stack, opened)
+                self._write_element(xf, elem)
+                last = elem
+                if elem.tag == TCF_TOKEN:
+                    yield elem
+                continue
+            self._open_pending(xf, stack + [elem], opened)
+            if elem.tag == TCF_TEXT_CORPUS:
+                yield elem
+            opened.pop().__exit__(None, None, None)
+            if not stack:
+                root_closed = True
+                continue
+            last = elem
+        if clear:
+            del events
+
+    def _open_pending(self, xf, elements, opened):
+        """ writes the start tags (and texts) of elements which have not been written yet """
+        for elem in elements[len(opened):]:
+            parent = elem.getparent()
+            nsmap = {
+                k: v for k, v in elem.nsmap.items()
+                if parent is None or parent.nsmap.get(k) != v
+            }
+            context = xf.element(elem.tag, dict(elem.attrib), nsmap=nsmap or None)
+            context.__enter__()
+            opened.append(context)
+            if elem.text:
+                xf.write(elem.text)
+
+    def _write_element(self, xf, elem):
+        """ writes a complete element without its tail """
+        with xf.element(elem.tag, dict(elem.attrib)):
+            if elem.text:
+                xf.write(elem.text)
+            for child in elem:
+                if isinstance(child.tag, str):
+                    self._write_element(xf, child)
+                    if child.tail:
+                        xf.write(child.tail)
+                else:
+                    xf.write(child)
+
+    def _write_lemmas(self, xf, matched, write):
+        if not write:
+            return
+        with xf.element(TCF_LEMMAS):
+            xf.write('\n')
+            n = 0
+            for token_id, token in matched:
+                if token.get('lemma'):
+                    with xf.element(TCF_LEMMA, ID="le_{}".format(n), tokenIDs=token_id):
+                        xf.write(token['lemma'])
+                    xf.write('\n')
+                    n += 1
+        xf.write('\n')
+
+    def _write_postags(self, xf, matched, write, tag_key, tagset):
+        if not write:
+            return
+        with xf.element(TCF_POSTAGS, tagset=tagset):
+            xf.write('\n')
+            n = 0
+            for token_id, token in matched:
+                if token.get(tag_key):
+                    with xf.element(TCF_TAG, ID="pt_{}".format(n), tokenIDs=token_id):
+                        xf.write(token[tag_key])
+                    xf.write('\n')
+                    n += 1
+        xf.write('\n')
+
+    def _write_named_entities(self, xf, matched, write, ne_tagset):
+        if not write:
+            return
+        with xf.element(TCF_NAMED_ENTITIES, type=ne_tagset):
+            xf.write('\n')
+            for n, (ne_type, token_ids) in enumerate(self._iter_entities(matched)):
+                attrib = {'ID': "ne_{}".format(n), 'class': ne_type, 'tokenIDs': " ".join(token_ids)}
+                with xf.element(TCF_ENTITY, attrib):
+                    pass
+                xf.write('\n')
+        xf.write('\n')
+
+    def _iter_entities(self, matched):
+        """ groups the IOB tags of the matched tokens into (ne_type, [tokenIDs]) tuples """
+        entity = None
+        for token_id, token in matched:
+            iob, _, ne_type = token.get('iob', 'O').partition('-')
+            if iob == 'I' and entity is not None and entity[0] == ne_type:
+                entity[1].append(token_id)
+                continue
+            if entity is not None:
+                yield entity
+                entity = None
+            if iob in ('B', 'I') and ne_type:
+                entity = (ne_type, [token_id])
+        if entity is not None:
+            yield entity
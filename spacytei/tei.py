@@ -1,11 +1,14 @@
 import logging
 import re
-from copy import deepcopy
 
 import lxml.etree as ET
 
-from spacytei.xml import XMLReader
-from spacytei.data_prep import ne_offsets_by_sent
+from spacytei.config import XTX_MAX_WORKERS, XTX_CHUNK_BYTES
+from spacytei.xml import XMLReader, XML_ID, get_xpath
+from spacytei.instrumentation import INSTRUMENTATION
+
+
+logger = logging.getLogger(__name__)
 
 
 NER_TAG_MAP = {
@@ -19,6 +22,135 @@ NER_TAG_MAP = {
     "workName": "MISC"
 }
 
+# elements tagging NEs: tei:rs with @type and the names of persons, places and organisations
+NE_ELEMENT_TEST = "self::tei:rs or self::tei:persName or self::tei:placeName or self::tei:orgName"
+NE_XPATH = ".//*[{}]".format(NE_ELEMENT_TEST)
+OUTERMOST_NE_XPATH = "//*[{0}][not(ancestor::*[{0}])]".format(NE_ELEMENT_TEST)
+
+TOKEN_NODES = get_xpath("//tei:*[local-name() = $name or local-name() = $pc]")
+DESCENDANT_TOKEN_NODES = get_xpath(".//tei:*[local-name() = $name or local-name() = $pc]")
+SENTENCE_NODES = get_xpath("//tei:s")
+
+# token-dict keys and the attributes of tei:w/tei:pc they are written to
+TOKEN_ATTRIBUTES = (('lemma', 'lemma'), ('iob', 'iob'), ('type', 'type'), ('pos', 'ana'))
+TEXT_NODES = get_xpath(".//text()")
+NODE_NAME = get_xpath("name()")
+
+WHITESPACE_OR_WORD = re.compile(r'\s+|\S+')
+
+
+def token_whitespace(node):
+    """ decides if a tei:w or tei:pc is followed by whitespace, i.e. by anything but a tei:pc
+    :param node: A tei:w or tei:pc element
+    :return: True or False
+    """
+    following = node.getnext()
+    if following is None or not isinstance(following.tag, str):
+        return True
+    return not following.tag.endswith('pc')
+
+
+class _OffsetTracker():
+
+    """ collects the text of an element like re.sub('\\s+', ' ', text).strip() would return it\
+    and records where the NE elements start and end in this text """
+
+    def __init__(self, ne_elements):
+        self.ne_elements = ne_elements
+        self.chunks = []
+        self.length = 0
+        self.pending_space = False
+        self.open_entities = []
+        self.entities = []
+
+    def add(self, text):
+        if not text:
+            return
+        for m in WHITESPACE_OR_WORD.finditer(text):
+            chunk = m.group()
+            if chunk[0].isspace():
+                self.pending_space = True
+                continue
+            if self.pending_space and self.length:
+                self.chunks.append(' ')
+                self.length += 1
+            self.pending_space = False
+            for entity in self.open_entities:
+                if entity[0] is None:
+                    entity[0] = self.length
+            self.chunks.append(chunk)
+            self.length += len(chunk)
+
+    def visit(self, element):
+        is_ne = element in self.ne_elements
+        if is_ne:
+            entity = [None, len(self.open_entities)]
+            self.open_entities.append(entity)
+        self.add(element.text)
+        for child in element:
+            # comments and processing instructions only contribute their tail
+            if isinstance(child.tag, str):
+                self.visit(child)
+            self.add(child.tail)
+        if is_ne:
+            self.open_entities.pop()
+            start, depth = entity
+            if start is not None:
+                self.entities.append((start, self.length, depth, element))
+
+
+class _EntityWrapper():
+
+    """ wraps the token nodes of entities in rs elements by moving the nodes, including\
+    their tails and any elements between them, into the rs element """
+
+    def __init__(self):
+        self.entity_element = None
+
+    def add(self, node, iob):
+        """ processes the next token node and its IOB tag, e.g. 'B-PER', 'I-PER' or 'O' """
+        if not iob or iob.startswith('O'):
+            self.close()
+        elif iob.startswith('B-') or self.entity_element is None:
+            self.close()
+            self.open(node, iob.split('-', 1)[-1])
+        elif not self.extend(node):
+            # the token is not a following sibling of the entity, so the rs can't be continued
+            label = self.entity_element.get('type')
+            self.close()
+            self.open(node, label)
+
+    def open(self, node, label):
+        namespace = ET.QName(node).namespace
+        tag = 'rs' if namespace is None else "{{{}}}rs".format(namespace)
+        self.entity_element = node.makeelement(tag, {'type': label})
+        node.addprevious(self.entity_element)
+        self.entity_element.append(node)
+
+    def extend(self, node):
+        if node.getparent() is not self.entity_element.getparent():
+            return False
+        between = []
+        sibling = self.entity_element.getnext()
+        while sibling is not None and sibling is not node:
+            between.append(sibling)
+            sibling = sibling.getnext()
+        if sibling is None:
+            return False
+        for x in between:
+            self.entity_element.append(x)
+        self.entity_element.append(node)
+        return True
+
+    def close(self):
+        if self.entity_element is None:
+            return
+        # whitespace after the last token belongs after the rs element
+        last = self.entity_element[-1]
+        self.entity_element.tail = last.tail
+        last.tail = None
+        self.entity_element = None
+
 
 class TeiReader(XMLReader):
 
@@ -31,9 +163,9 @@ class TeiReader(XMLReader):
         :return: The result of the xpath
 
         """
-        return self.tree.xpath(any_xpath, namespaces=self.ns_tei)
+        return get_xpath(any_xpath)(self.tree)
 
-    def extract_ne_elements(self, parent_node, ne_xpath='//tei:rs'):
+    def extract_ne_elements(self, parent_node, ne_xpath=NE_XPATH):
 
         """ extract elements tagged as named entities
         :param ne_xpath: An XPath expression pointing to elements used to tagged NEs.
@@ -41,10 +173,10 @@ class TeiReader(XMLReader):
 
         """
 
-        ne_elements = parent_node.xpath(ne_xpath, namespaces=self.ns_tei)
+        ne_elements = get_xpath(ne_xpath)(parent_node)
         return ne_elements
 
-    def extract_ne_dicts(self, parent_node, ne_xpath='//tei:rs', NER_TAG_MAP=NER_TAG_MAP):
+    def extract_ne_dicts(self, parent_node, ne_xpath=NE_XPATH, NER_TAG_MAP=NER_TAG_MAP):
 
         """ extract strings tagged as named entities
         :param ne_xpath: An XPath expression pointing to elements used to tagged NEs.
@@ -57,13 +189,9 @@ class TeiReader(XMLReader):
         ne_dicts = []
         for x in ne_elements:
             item = {}
-            text = "".join(x.xpath('.//text()'))
+            text = "".join(TEXT_NODES(x))
             item['text'] = re.sub('\s+', ' ', text).strip()
-            try:
-                ne_type = NER_TAG_MAP.get("{}".format(x.xpath('./@type')[0]), 'MISC')
-            except IndexError as e:
-                ne_type = NER_TAG_MAP.get("{}".format(x.xpath("name()")), 'MISC')
-            item['ne_type'] = ne_type
+            item['ne_type'] = self.ne_type(x, NER_TAG_MAP)
             ne_dicts.append(item)
 
         return ne_dicts
@@ -75,14 +203,14 @@ class TeiReader(XMLReader):
         an element which text nodes should be extracted
         :return: A normalized, cleaned plain text
         """
-        result = re.sub('\s+', ' ', "".join(node.xpath(".//text()"))).strip()
+        result = re.sub('\s+', ' ', "".join(TEXT_NODES(node))).strip()
 
         return result
 
     def get_text_nes_list(
             self,
             parent_nodes='.//tei:body//tei:p',
-            ne_xpath='.//tei:rs',
+            ne_xpath=NE_XPATH,
             NER_TAG_MAP=NER_TAG_MAP
     ):
 
@@ -97,7 +225,7 @@ class TeiReader(XMLReader):
         "ne_type": "LOC"}]}]
         """
 
-        parents = self.tree.xpath(parent_nodes, namespaces=self.ns_tei)
+        parents = get_xpath(parent_nodes)(self.view)
         result = []
         for node in parents:
             text = self.create_plain_text(node)
@@ -108,8 +236,9 @@ class TeiReader(XMLReader):
     def extract_ne_offsets(
         self,
         parent_nodes='.//tei:body//tei:p',
-        ne_xpath='.//tei:rs',
-        NER_TAG_MAP=NER_TAG_MAP
+        ne_xpath=NE_XPATH,
+        NER_TAG_MAP=NER_TAG_MAP,
+        nested=False
     ):
 
         """ extracts offsets of NEs and the NE-type
@@ -119,49 +248,113 @@ class TeiReader(XMLReader):
         Takes the parent node(s) as context
         :param NER_TAG_MAP: A dictionary providing mapping from TEI tags used to tag NEs to\
         spacy-tags
+        :param nested: If True, NEs inside of other NEs are listed under 'nested_entities'.\
+        Remove this key before passing the samples to spacy.
         :return: A list of spacy-like NER Tuples [('some text'), {'entities': [(15, 19, 'place')]}]
         """
 
-        text_nes_dict = self.get_text_nes_list(parent_nodes, ne_xpath, NER_TAG_MAP)
         result = []
-        for x in text_nes_dict:
-            plain_text = x['text']
-            ner_dicts = x['ner_dicts']
-            entities = []
-            for x in ner_dicts:
-                if x['text'] != "":
-                    for m in re.finditer(x['text'], plain_text):
-                        entities.append([m.start(), m.end(), x['ne_type']])
-            entities = [item for item in set(tuple(row) for row in entities)]
-            entities = sorted(entities, key=lambda x: x[0])
-            ents = []
-            next_item_index = 1
-            # remove entities with the same start offset
-            for x in entities:
-                cur_start = x[0]
-                try:
-                    next_start = entities[next_item_index][0]
-                except IndexError:
-                    next_start = 9999999999999999999999
-                if cur_start == next_start:
-                    pass
-                else:
-                    ents.append(x)
-                next_item_index = next_item_index + 1
-
-            train_data = (
-                plain_text,
-                {
-                    "entities": ents
-                }
-            )
-            result.append(train_data)
+        for node in get_xpath(parent_nodes)(self.view):
+            result.append(self.ne_offsets_from_node(node, ne_xpath, NER_TAG_MAP, nested))
         return result
 
+    def ne_type(self, ne_element, NER_TAG_MAP=NER_TAG_MAP):
+
+        """ maps an element used to tag a NE to a spacy NE-type
+        :param ne_element: The element tagging the NE
+        :param NER_TAG_MAP: A dictionary providing mapping from TEI tags used to tag NEs to\
+        spacy-tags
+        :return: The mapped element name (e.g. tei:persName) or else the mapped @type (e.g. of\
+        tei:rs), 'MISC' if there is no mapping
+        """
+
+        name = NODE_NAME(ne_element)
+        if name in NER_TAG_MAP:
+            return NER_TAG_MAP[name]
+        return NER_TAG_MAP.get(ne_element.get('type', name), 'MISC')
+
+    def ne_offsets_from_node(self, node, ne_xpath=NE_XPATH, NER_TAG_MAP=NER_TAG_MAP, nested=False):
+
+        """ creates the whitespace normalized text of an element and the offsets of the NEs in it\
+        in a single walk through the element, so only NEs which are actually tagged are reported
+        :param node: The element which text nodes should be extracted
+        :param ne_xpath: An XPath expression pointing to elements used to tagged NEs.\
+        Takes the node as context
+        :param NER_TAG_MAP: A dictionary providing mapping from TEI tags used to tag NEs to\
+        spacy-tags
+        :param nested: If True, NEs inside of other NEs are listed under 'nested_entities'
+        :return: A spacy-like NER Tuple ('some text', {'entities': [(15, 19, 'place')]})
+        """
+
+        tracker = _OffsetTracker(set(get_xpath(ne_xpath)(node)))
+        tracker.visit(node)
+        entities = []
+        nested_entities = []
+        for start, end, depth, ne_element in sorted(tracker.entities, key=lambda x: x[:2]):
+            ne = (start, end, self.ne_type(ne_element, NER_TAG_MAP))
+            if depth == 0:
+                entities.append(ne)
+            else:
+                nested_entities.append(ne)
+        annotations = {"entities": entities}
+        if nested:
+            annotations["nested_entities"] = nested_entities
+        return ("".join(tracker.chunks), annotations)
+
+    def iter_text_nes_list(
+            self,
+            paragraph_tag='tei:p',
+            container_tag='tei:body',
+            ne_xpath=NE_XPATH,
+            NER_TAG_MAP=NER_TAG_MAP
+    ):
+
+        """ streaming version of get_text_nes_list; in combination with\
+        TeiReader(xml, streaming=True) only one paragraph is held in memory at a time
+        :param paragraph_tag: The name of the elements which text nodes should be extracted
+        :param container_tag: Only paragraphs within such an element are processed.\
+        Use None to process all paragraphs of the document
+        :param ne_xpath:  An XPath expression pointing to elements used to tagged NEs.\
+        Takes the paragraph as context
+        :param NER_TAG_MAP: A dictionary providing mapping from TEI tags used to tag NEs to\
+        spacy-tags
+        :return: yields dicts like {"text": "Wien ist schön", "ner_dicts": [{"text": "Wien",\
+        "ne_type": "LOC"}]}
+        """
+
+        for node in self.iter_elements(paragraph_tag, within=container_tag):
+            text = self.create_plain_text(node)
+            ner_dicts = self.extract_ne_dicts(node, ne_xpath, NER_TAG_MAP)
+            yield {'text': text, 'ner_dicts': ner_dicts}
+
+    def iter_ne_offsets(
+        self,
+        paragraph_tag='tei:p',
+        container_tag='tei:body',
+        ne_xpath=NE_XPATH,
+        NER_TAG_MAP=NER_TAG_MAP,
+        nested=False
+    ):
+
+        """ streaming version of extract_ne_offsets, see iter_text_nes_list
+        :param paragraph_tag: The name of the elements which text nodes should be extracted
+        :param container_tag: Only paragraphs within such an element are processed.\
+        Use None to process all paragraphs of the document
+        :param ne_xpath: An XPath expression pointing to elements used to tagged NEs.\
+        Takes the paragraph as context
+        :param NER_TAG_MAP: A dictionary providing mapping from TEI tags used to tag NEs to\
+        spacy-tags
+        :param nested: If True, NEs inside of other NEs are listed under 'nested_entities'
+        :return: yields spacy-like NER Tuples ('some text', {'entities': [(15, 19, 'place')]})
+        """
+
+        for node in self.iter_elements(paragraph_tag, within=container_tag):
+            yield self.ne_offsets_from_node(node, ne_xpath, NER_TAG_MAP, nested)
+
     def ne_offsets_by_sent(
         self,
         parent_nodes='.//tei:body//tei:p',
-        ne_xpath='.//tei:rs',
+        ne_xpath=NE_XPATH,
         model='de_core_news_sm',
         NER_TAG_MAP=NER_TAG_MAP
     ):
@@ -176,153 +369,228 @@ class TeiReader(XMLReader):
         spacy-tags
         :return: A list of spacy-like NER Tuples [('some text'), entities{[(15, 19, 'place')]}]
         """
-        import spacy
-        nlp = spacy.load(model)
         text_nes = self.get_text_nes_list(parent_nodes, ne_xpath, NER_TAG_MAP)
+        from spacytei.data_prep import ne_offsets_by_sent
+
         results = ne_offsets_by_sent(text_nes, model=model)
         return results
 
-    def create_tokenlist(self):
+    def token_annotations(
+        self, words, ne_xpath=OUTERMOST_NE_XPATH, NER_TAG_MAP=NER_TAG_MAP
+    ):
+        """
+        reads the annotations process_tokenlist writes back: @lemma, @type (the tag) and @ana\
+        (the pos) of the token nodes, IOB tags from @iob or @ent_iob or else from the NE elements\
+        around the tokens
+        :param words: The tei:w and tei:pc nodes
+        :param ne_xpath: An XPath expression pointing to the outermost elements tagging NEs
+        :param NER_TAG_MAP: A dictionary providing mapping from TEI tags used to tag NEs to\
+        spacy-tags; @type values which already are spacy-tags are kept
+        :return: A dict mapping 'lemma', 'type', 'pos' and 'iob' to lists with a value or None\
+        per token
+        """
+        annotations = {
+            'lemma': [x.get('lemma') for x in words],
+            'type': [x.get('type') for x in words],
+            'pos': [x.get('ana') for x in words],
+            'iob': [x.get('iob', x.get('ent_iob')) for x in words],
+        }
+        ne_elements = get_xpath(ne_xpath)(self.view)
+        if not ne_elements:
+            return annotations
+        positions = {x: i for i, x in enumerate(words)}
+        labels = set(NER_TAG_MAP.values())
+        iob = annotations['iob']
+        for ne_element in ne_elements:
+            label = ne_element.get('type')
+            if label not in labels:
+                label = self.ne_type(ne_element, NER_TAG_MAP)
+            indices = sorted(
+                positions[x] for x in DESCENDANT_TOKEN_NODES(ne_element, name="w", pc="pc")
+                if x in positions
+            )
+            for j, i in enumerate(indices):
+                if iob[i] is None:
+                    iob[i] = "{}-{}".format('I' if j else 'B', label)
+        return annotations
+
+    def sent_lengths(self, words):
+        """
+        groups the token nodes into sentences: tokens of a tei:s belong to its sentence, the\
+        others to the preceding one; without tei:s all tokens form one sentence
+        :param words: The tei:w and tei:pc nodes
+        :return: The number of tokens per sentence, see spacytei.columnar.run_lengths
         """
-        creates of token-dicts extracted from tei:w, tei:pc and tei:seg
+        from spacytei.columnar import run_lengths
+
+        keys = [None] * len(words)
+        sentences = SENTENCE_NODES(self.view)
+        if sentences:
+            positions = {x: i for i, x in enumerate(words)}
+            for j, sentence in enumerate(sentences):
+                for x in DESCENDANT_TOKEN_NODES(sentence, name="w", pc="pc"):
+                    if x in positions:
+                        keys[positions[x]] = j
+        return run_lengths(keys)
+
+    def create_tokenlist(self, sents=False):
+        """
+        creates of token-dicts extracted from tei:w, tei:pc and tei:seg; existing annotations\
+        (see token_annotations) are added, so spacy components can skip them
+        :param sents: If True, the tokens are grouped into sentences (see sent_lengths) like\
+        process_tokenlist reads them
         :return: a list of token dicts like:\
-        [{'value': 'Ofen', 'tokenId': 'xTok_000001', 'whitespace': False}]
+        [{'value': 'Ofen', 'tokenId': 'xTok_000001', 'whitespace': False, 'lemma': 'Ofen'}],\
+        with sents=True a list of sentence dicts like [{'sent': 'Ofen', 'tokens': [...]}]
         """
 
-        doc = self.tree
-        expr = "//tei:*[local-name() = $name or local-name() = $pc]"
-        words = doc.xpath(expr, name="w", pc="pc", namespaces=self.ns_tei)
+        words = TOKEN_NODES(self.view, name="w", pc="pc")
+        annotations = self.token_annotations(words)
         token_list = []
-        for x in words:
+        for i, x in enumerate(words):
             token = {}
             token['value'] = x.text
-            token['tokenId'] = x.xpath('./@xml:id', namespaces=self.ns_tei)[0]
-            try:
-                if x.getnext().tag.endswith('seg'):
-                    token['whitespace'] = True
-                elif x.getnext().tag.endswith('pc'):
-                    token['whitespace'] = False
-                elif x.getnext().tag.endswith('w'):
-                    token['whitespace'] = True
-                elif x.getnext().tag.endswith('lb'):
-                    token['whitespace'] = True
-                else:
-                    token['whitespace'] = True
-            except AttributeError:
-                token['whitespace'] = True
+            token['tokenId'] = x.get(XML_ID)
+            token['whitespace'] = token_whitespace(x)
+            for key, values in annotations.items():
+                if values[i] is not None:
+                    token[key] = values[i]
             token_list.append(token)
+        if sents:
+            from spacytei.columnar import group_tokens
+
+            return group_tokens(token_list, self.sent_lengths(words))
         return token_list
 
-    def process_tokenlist(self, tokenlist, by_id=False, verbose=True):
+    def create_columns(self):
+        """
+        creates the columns of create_tokenlist(sents=True) without building token dicts
+        :return: A spacytei.columnar.ColumnarDoc with the columns value, tokenId and whitespace,\
+        the columns of token_annotations which have any values and the sentences of sent_lengths
+        """
+        words = TOKEN_NODES(self.view, name="w", pc="pc")
+        from spacytei.columnar import ColumnarDoc, sent_texts
+
+        columns = {
+            'value': [x.text for x in words],
+            'tokenId': [x.get(XML_ID) for x in words],
+            'whitespace': [token_whitespace(x) for x in words],
+        }
+        for key, values in self.token_annotations(words).items():
+            if any(x is not None for x in values):
+                columns[key] = values
+        lengths = self.sent_lengths(words)
+        texts = sent_texts(columns['value'], columns['whitespace'], lengths)
+        return ColumnarDoc.from_columns(columns, lengths, texts)
+
+    def create_doc(self, vocab):
+        """
+        creates a spacy Doc straight from the tei:w and tei:pc nodes and their annotations
+        :param vocab: A spacy Vocab, e.g. nlp.vocab
+        :return: A spacy Doc; the xml:ids are stored in the tokenId extension
+        """
+        return self.create_columns().to_doc(vocab)
+
+    def process_tokenlist(self, tokenlist, by_id=False, verbose=True, wrap_entities=True):
         """
         takes enriched tokenlist and updates the tei:w tags. Returns the updated self.tree
-        :param tokenlist: An enriched tokenlist
-        :param by_id: Match tokenlist items with xml-nodes by their ID,\
-        defaults to False (because ID-Lookup is super slow)
+        :param tokenlist: An enriched tokenlist, grouped by sentences or a flat list of tokens
+        :param by_id: Match tokenlist items with xml-nodes by their ID, defaults to False.\
+        A summary of tokens and nodes which couldn't be matched is stored in\
+        self.writeback_summary
+        :param wrap_entities: If True (and by_id is True), tokens with B-/I- tags are moved into\
+        rs elements; inline elements between the tokens of an entity (lb, pb, ...) are moved\
+        along and entities are closed at the end of each sentence
         :return: The enriched self.tree
         """
-        expr = "//tei:*[local-name() = $name or local-name() = $pc]"
-        word_expr = './/tei:w[@xml:id=$xmlid]'
-        nr_tokens = len(tokenlist)
-        list_nodes = self.tree.xpath(expr, name="w", pc="pc", namespaces=self.ns_tei)
-        nr_nodes = len(list_nodes)
-        if verbose:
-            print("# tokens: {}".format(nr_tokens))
-            print("# token-nodes: {}".format(nr_nodes))
-        if by_id:
-            parent_node = None
-            node_pos = 0
-            entity_element = None
-            for sent in tokenlist:
-                for x in sent['tokens']:
-                    try:
-                        node = self.tree.xpath(word_expr, xmlid=x['tokenId'], namespaces=self.nsmap)[0]
-                    except IndexError:
-                        node = None
-                    if node is not None:
-                        if x.get('lemma'):
-                            node.attrib['lemma'] = x.get('lemma')
-
-                        if x.get('type'):
-                            node.attrib['type'] = x.get('type')
-
-                        if x.get('ana'):
-                            node.attrib['ana'] = x.get('pos')
-
-                        if x.get('iob'):
-                            # TO DO: Preserve the position other TEI tags such as
-                            # pg, lb, etc.
-                            # At the moment, they'll get pushed to
-                            # the end of the enclosing rs tag.
-                            node.attrib['ent_iob'] = x.get('iob')
-                            if x.get('iob').startswith('B-'):
-                                ent_pos, ent_label = x.get('iob').split('-')
-
-                                # find the position of the node in its parent
-                                parent_node = node.getparent()
-                                node_pos = parent_node.index(node)
-
-                                # start the appropriate entity tag BEFORE word
-                                entity_element = ET.Element('rs', {'type': ent_label})
-                                entity_element.append(deepcopy(node))
-                                node.clear()
-
-                            elif x.get('iob').startswith('I') and entity_element is not None:
-                                entity_element.append(deepcopy(node))
-                                node.clear()
-
-                            elif x.get('iob').startswith('O') and entity_element is not None:
-                                # insert the entity element
-                                # hoping that all the words in the entity have the same parent
-                                parent_node.insert(node_pos, entity_element)
-                                # reset the entity tag
-                                parent_node = None
-                                entity_element = None
-        else:
-            print('not by ID')
-            tokenlist_2 = []
-            for sent in tokenlist:
-                for x in sent['tokens']:
-                    tokenlist_2.append(x)
-            tokenlist = tokenlist_2
-            counter = 0
-            for x in list_nodes:
-                x.attrib['lemma'] = tokenlist[counter]['lemma']
-                x.attrib['iob'] = tokenlist[counter]['iob']
-                x.attrib['type'] = tokenlist[counter]['type']
-                x.attrib['ana'] = tokenlist[counter]['pos']
-                counter += 1
+        from spacytei.columnar import as_sents
+
+        tokenlist = as_sents(tokenlist)
+        self._before_modification()
+        with INSTRUMENTATION.stage('write_back', format='tei', by_id=by_id) as stage:
+            nr_tokens = len(tokenlist)
+            list_nodes = TOKEN_NODES(self.tree, name="w", pc="pc")
+            nr_nodes = len(list_nodes)
+            if verbose:
+                logger.info("# tokens: %s, # token-nodes: %s", nr_tokens, nr_nodes)
+            if by_id:
+                entities = _EntityWrapper()
+                duplicate_ids = []
+                nodes_by_id = self.index_by_id(list_nodes, duplicate_ids=duplicate_ids)
+                missing_ids = []
+                matched_ids = set()
+                updated = 0
+                for sent in tokenlist:
+                    for x in sent['tokens']:
+                        node = nodes_by_id.pop(x['tokenId'], None)
+                        if node is None:
+                            if x['tokenId'] in matched_ids:
+                                duplicate_ids.append(x['tokenId'])
+                            else:
+                                missing_ids.append(x['tokenId'])
+                        else:
+                            matched_ids.add(x['tokenId'])
+                            updated += 1
+                            if x.get('lemma'):
+                                node.attrib['lemma'] = x.get('lemma')
+
+                            if x.get('type'):
+                                node.attrib['type'] = x.get('type')
+
+                            if x.get('ana'):
+                                node.attrib['ana'] = x.get('pos')
+
+                            if x.get('iob'):
+                                node.attrib['ent_iob'] = x.get('iob')
+                            if wrap_entities:
+                                entities.add(node, x.get('iob'))
+                    entities.close()
+                self.summarize_writeback(
+                    updated, missing_ids, nodes_by_id.keys(), verbose=verbose,
+                    duplicate_ids=duplicate_ids
+                )
+                stage.update(tokens=sum(len(sent['tokens']) for sent in tokenlist), updated=updated)
+            else:
+                tokenlist_2 = []
+                for sent in tokenlist:
+                    for x in sent['tokens']:
+                        tokenlist_2.append(x)
+                tokenlist = tokenlist_2
+                counter = 0
+                for x, token in zip(list_nodes, tokenlist):
+                    # tokens read from TEI only carry the annotations the document had
+                    for key, attr in TOKEN_ATTRIBUTES:
+                        if token.get(key):
+                            x.attrib[attr] = token[key]
+                    counter += 1
+                stage.update(tokens=len(tokenlist), updated=counter)
+            stage.update(nodes=nr_nodes)
 
         return self.tree
 
     def tokenize(
         self,
         XTX_URL='https://xtx.acdh.oeaw.ac.at/exist/restxq/xtx/tokenize/',
-        profile='default'
+        profile='default',
+        max_workers=XTX_MAX_WORKERS,
+        chunk_bytes=XTX_CHUNK_BYTES
     ):
         """
-        posts self.tree to XTX endpoint for tokenization
+        posts self.tree to XTX endpoint for tokenization; large documents are split into chunks\
+        which are tokenized concurrently, see spacytei.xtx.XtxClient
         :param XTX_URL: Endpoint for the XTX service
         :param profile: The profile-id used for tokenization
+        :param max_workers: The maximum number of concurrent requests
+        :param chunk_bytes: The approximate maximum size of a chunk in bytes
         :return: The tokenized TEI document
         """
-        try:
-            import requests
-        except ImportError:
-            raise ImportError('Looks like requests is not installed, try pip install -U requests')
-
         url = "{}{}".format(XTX_URL, profile)
-        payload = self.return_byte_like_object()
-        headers = {
-            'Content-Type': "application/xml",
-            'Accept': "application/xml",
-        }
+        from spacytei.xtx import get_client
+
+        client = get_client(url, max_workers=max_workers, chunk_bytes=chunk_bytes)
         try:
-            response = requests.request("POST", url, data=payload, headers=headers)
-        except Exception as e:
-            print(e)
-            response is False
-        if response:
-            return response.text
-        else:
-            return response
+            tree = client.tokenize_tree(self.tree)
+        except Exception:
+            logger.exception("Tokenization with %s failed", url)
+            return False
+        return ET.tostring(tree, encoding='unicode')
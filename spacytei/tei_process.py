@@ -1,10 +1,10 @@
-from spacytei.tei import TeiReader, NER_TAG_MAP
+from spacytei.tei import TeiReader, NER_TAG_MAP, NE_XPATH
 
 
 def teis_to_traindata(
     files,
     parent_node='.//tei:body',
-    ne_xpath='.//tei:rs',
+    ne_xpath=NE_XPATH,
     verbose=True,
     NER_TAG_MAP=NER_TAG_MAP
 ):
@@ -38,7 +38,7 @@ def teis_to_traindata(
 def teis_to_traindata_sents(
     files,
     parent_node='.//tei:body',
-    ne_xpath='.//tei:rs',
+    ne_xpath=NE_XPATH,
     verbose=True,
     model='de_core_news_sm',
     NER_TAG_MAP=NER_TAG_MAP
@@ -1,22 +1,24 @@
-from spacy.tokens import Doc, Token
+from spacytei.columnar import ColumnarDoc
+from spacytei.config import SPACY_BATCH_SIZE
+from spacytei.incremental import run_components
 from spacytei.ner import format_iob_tag
 
 
-SPACY_ACCEPTED_DATA = ['POS', 'ENT_TYPE', 'ENT_TYPE_']
+SPACY_ACCEPTED_DATA = ['POS', 'LEMMA', 'ENT_TYPE', 'ENT_TYPE_']
 
 
 def doc_to_tokenlist_no_sents(doc):
-    """ serializes a spacy DOC object into a python list with tokens grouped by sents
+    """ serializes a spacy DOC object into a flat python list of tokens
     :param doc: spacy DOC element
     :return: a list of of token objects/dicts
     """
     result = []
     for x in doc:
         token = {}
-        if y.has_extension('tokenId'):
-            parts['tokenId'] = y._.tokenId
+        if x.has_extension('tokenId'):
+            token['tokenId'] = x._.tokenId
         else:
-            parts['tokenId'] = y.i
+            token['tokenId'] = x.i
         token['value'] = x.text
         token['lemma'] = x.lemma_
         token['pos'] = x.pos_
@@ -27,6 +29,7 @@ def doc_to_tokenlist_no_sents(doc):
         token['ent_iob'] = x.ent_iob_
         token['iob'] = format_iob_tag(x)
         token['ent_type'] = x.ent_type_
+        token['whitespace'] = bool(x.whitespace_)
         result.append(token)
     return result
 
@@ -59,39 +62,56 @@ def doc_to_tokenlist(doc):
             parts['ent_iob'] = y.ent_iob_
             parts['iob'] = format_iob_tag(y)
             parts['ent_type'] = y.ent_type_
+            parts['whitespace'] = bool(y.whitespace_)
             chunk['tokens'].append(parts)
             counter += 1
         result.append(chunk)
     return result
 
 
-def process_tokenlist(nlp, tokenlist, enriched=False, SPACY_ACCEPTED_DATA=SPACY_ACCEPTED_DATA):
+def process_tokenlist(
+    nlp, tokenlist, enriched=False, SPACY_ACCEPTED_DATA=SPACY_ACCEPTED_DATA,
+    batch_size=SPACY_BATCH_SIZE
+):
     """process_tokenlist: creates a spacy doc element of a token list
 
     :param nlp: spacy NLP element
-    :param tokenlist: list of dicts containing tokens and parameters
+    :param tokenlist: list of dicts containing tokens and parameters or a\
+    spacytei.columnar.ColumnarDoc
+    :param enriched: if set to True spacy pipeline is run
+    :param SPACY_ACCEPTED_DATA: the token attributes copied into the doc besides the tag
+    :param batch_size: see process_tokenlists
+    """
+    return next(process_tokenlists(
+        nlp, [tokenlist], enriched=enriched, SPACY_ACCEPTED_DATA=SPACY_ACCEPTED_DATA,
+        batch_size=batch_size
+    ))
+
+
+def process_tokenlists(
+    nlp, tokenlists, enriched=False, SPACY_ACCEPTED_DATA=SPACY_ACCEPTED_DATA,
+    batch_size=SPACY_BATCH_SIZE
+):
+    """process_tokenlists: creates spacy doc elements of many token lists. The attributes are\
+    set per doc with Doc.from_array; enriched docs are passed through the pipeline in batches,\
+    components only annotate what the tokenlists don't contain yet
+
+    :param nlp: spacy NLP element
+    :param tokenlists: an iterable of tokenlists (see process_tokenlist)
     :param enriched: if set to True spacy pipeline is run
+    :param SPACY_ACCEPTED_DATA: the token attributes copied into the doc besides the tag
+    :param batch_size: the number of docs each pipeline component processes at once
+    :return: yields spacy docs in the order of the tokenlists; the tokenlists are only read\
+    as the docs are requested
     """
-    json = {}
-    json['tokenArray'] = tokenlist
-    ar_tok = [x['value'] for x in json['tokenArray']]
-    ar_wsp = [x.get('whitespace', True) for x in json['tokenArray']]
-    doc = Doc(nlp.vocab, words=ar_tok, spaces=ar_wsp)
-    for id, t in enumerate(doc):
-        if t.get_extension('tokenId') is None:
-            t.set_extension('tokenId', default=False)
-        t._.set('tokenId', json['tokenArray'][id].get('tokenId', False))
-        t_type = json['tokenArray'][id].get('type', False)
-        if not t.tag_ and t_type:
-            t.tag_ = t_type
-        for k in json['tokenArray'][id].keys():
-            if k.upper() in SPACY_ACCEPTED_DATA:
-                setattr(
-                    t,
-                    k.lower(),
-                    json['tokenArray'][id][k],
-                )  # TODO: need to set ent_iob
+    attrs = ['TAG', 'SENT_START']
+    if 'POS' in SPACY_ACCEPTED_DATA:
+        attrs.append('POS')
+    if 'LEMMA' in SPACY_ACCEPTED_DATA:
+        attrs.append('LEMMA')
+    if 'ENT_TYPE' in SPACY_ACCEPTED_DATA or 'ENT_TYPE_' in SPACY_ACCEPTED_DATA:
+        attrs.append('ENT')
+    docs = (ColumnarDoc.from_tokenlist(x).to_doc(nlp.vocab, attrs=attrs) for x in tokenlists)
     if enriched:
-        for name, proc in nlp.pipeline:
-            doc = proc(doc)
-    return doc
+        docs = run_components(nlp, docs, batch_size=batch_size)
+    yield from docs
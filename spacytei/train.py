@@ -1,15 +1,15 @@
-import spacy
 import datetime
 import random
 
 from pathlib import Path
-from spacy.util import minibatch, compounding
-from sklearn.model_selection import train_test_split
-from spacy.gold import GoldParse
-from spacy.scorer import Scorer
+
+from spacytei.models import get_model
 
 
 def evaluate(ner_model, examples):
+    from spacy.gold import GoldParse
+    from spacy.scorer import Scorer
+
     scorer = Scorer()
     for x in examples:
         doc_gold_text = ner_model.make_doc(x[0])
@@ -22,7 +22,7 @@ def evaluate(ner_model, examples):
 def compare_models(models, examples, verbose=True):
     compared = []
     for x in models:
-        ner_model = spacy.load(x)
+        ner_model = get_model(x)
         results = evaluate(ner_model, examples)
         if verbose:
             print(
@@ -46,6 +46,10 @@ def batch_train(
     new_label=None
 ):
     """Load the model, set up the pipeline and train the entity recognizer."""
+    import spacy
+
+    from sklearn.model_selection import train_test_split
+    from spacy.util import minibatch, compounding
 
     abs_start_time = datetime.datetime.now()
 
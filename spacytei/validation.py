@@ -0,0 +1,234 @@
+"""
+This module provides the payload validation used by the pipeline processes.\
+Schemas are loaded from the package resources and compiled only once per process.
+"""
+import json
+import logging
+import pkgutil
+import threading
+
+import lxml.etree as ET
+
+from io import BytesIO
+
+from spacytei.columnar import ColumnarDoc
+from spacytei.config import (
+    VALIDATION_LEVEL, VALIDATION_SAMPLE_SIZE, ACDHLANG_SCHEMA_RESOURCE, TEI_SCHEMA_RESOURCE
+)
+from spacytei.doc_cache import DOCUMENT_CACHE
+from spacytei.wire import is_binary_payload
+from spacytei.xml import XMLReader, NSMAP, detect_input_kind
+
+
+logger = logging.getLogger(__name__)
+
+VALIDATION_LEVELS = ('off', 'structural', 'full')
+
+# how far into a serialized XML document the root element is searched first; documents with a
+# longer prolog (e.g. a DOCTYPE with an internal subset) are parsed up to their root element
+XML_PROLOG_BYTES = 4096
+
+
+class PackageResolver(ET.Resolver):
+
+    """ resolves the schemas imported by a schema from the package resources, e.g.\
+    schema/tei_all_xml.xsd imported by schema/tei_all.xsd, so nothing is fetched from the network """
+
+    def resolve(self, url, pubid, context):
+        if not url or '://' in url:
+            return None
+        try:
+            data = pkgutil.get_data('spacytei', url)
+        except OSError:
+            return None
+        return self.resolve_string(data, context, base_url=url)
+
+
+class ValidatorCache():
+
+    """ compiles the JSON schema validator and the TEI schema on first use and keeps them """
+
+    def __init__(
+        self, json_schema_resource=ACDHLANG_SCHEMA_RESOURCE, tei_schema_resource=TEI_SCHEMA_RESOURCE
+    ):
+        self.json_schema_resource = json_schema_resource
+        self.tei_schema_resource = tei_schema_resource
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, compile):
+        try:
+            return self._validators[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._validators:
+                self._validators[name] = compile()
+            return self._validators[name]
+
+    def json_validator(self):
+        """ returns a jsonschema validator for application/json+acdhlang """
+        return self._get('json', self._compile_json)
+
+    def tei_validator(self):
+        """ returns an lxml XMLSchema or RelaxNG for TEI, None if the schema can't be compiled;\
+        compiling tei_all.xsd takes several seconds """
+        return self._get('tei', self._compile_tei)
+
+    def _compile_json(self):
+        from jsonschema.validators import validator_for
+
+        schema = json.loads(pkgutil.get_data('spacytei', self.json_schema_resource).decode('utf-8'))
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        return cls(schema)
+
+    def _compile_tei(self):
+        data = pkgutil.get_data('spacytei', self.tei_schema_resource)
+        parser = ET.XMLParser(no_network=True, huge_tree=True)
+        parser.resolvers.add(PackageResolver())
+        try:
+            # the base URL makes the imported schemas resolve to resources next to this one
+            schema_doc = ET.parse(BytesIO(data), parser, base_url=self.tei_schema_resource)
+            if self.tei_schema_resource.endswith('.rng'):
+                return ET.RelaxNG(schema_doc)
+            return ET.XMLSchema(schema_doc)
+        except (ET.XMLSchemaParseError, ET.RelaxNGParseError, ET.XMLSyntaxError) as e:
+            logger.error(
+                "TEI schema %s can't be compiled, TEI payloads fail full validation: %s",
+                self.tei_schema_resource, e
+            )
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._validators = {}
+
+
+VALIDATOR_CACHE = ValidatorCache()
+
+
+def sample_tokens(tokens, size=VALIDATION_SAMPLE_SIZE):
+    """ returns evenly spaced tokens (always including the first and the last one)
+    :param tokens: A list
+    :param size: The maximum number of tokens; None returns all tokens
+    """
+    if size is None or len(tokens) <= size:
+        return tokens
+    if size < 2:
+        return tokens[:size]
+    step = (len(tokens) - 1) / (size - 1)
+    return [tokens[round(i * step)] for i in range(size)]
+
+
+def _is_acdhlang_structure(payload):
+    if not isinstance(payload, dict):
+        return False
+    tokens = payload.get('tokenArray')
+    if not isinstance(tokens, list) or not isinstance(payload.get('language'), str):
+        return False
+    for token in tokens[:1] + tokens[-1:]:
+        if not isinstance(token, dict):
+            return False
+        if not all(key in token for key in ('tokenId', 'value', 'whitespace')):
+            return False
+    return True
+
+
+def _first_tag(data, recover=False):
+    """ returns the tag of the first element in data, None if there is none """
+    for event, elem in ET.iterparse(BytesIO(data), events=('start',), recover=recover):
+        return elem.tag
+    return None
+
+
+def _root_tag(payload):
+    """ returns the tag of the root element, reading serialized XML only up to it; None if it\
+    can't be found cheaply (e.g. paths or URLs), False if there is none """
+    kind = detect_input_kind(payload)
+    if kind == 'tree':
+        root = payload.getroot() if hasattr(payload, 'getroot') else payload
+        return root.tag
+    if kind == 'string':
+        prolog = payload[:XML_PROLOG_BYTES].encode('utf-8', 'ignore')
+    elif kind in ('bytes', 'mmap'):
+        prolog = bytes(payload[:XML_PROLOG_BYTES])
+    else:
+        return None
+    try:
+        tag = _first_tag(prolog, recover=True)
+    except ET.XMLSyntaxError:
+        tag = None
+    if tag is not None or len(prolog) < XML_PROLOG_BYTES:
+        return tag or False
+    # the prolog is longer than the window
+    data = payload.encode('utf-8') if kind == 'string' else payload
+    try:
+        return _first_tag(data) or False
+    except ET.XMLSyntaxError:
+        return False
+
+
+def _is_xml_with_root(payload, namespace, names):
+    try:
+        tag = _root_tag(payload)
+    except TypeError:
+        return False
+    if tag is None:
+        return True
+    if not tag:
+        return False
+    return tag in ["{{{}}}{}".format(namespace, x) for x in names]
+
+
+def _is_spacy_doc(payload):
+    from spacy.tokens import Doc
+
+    return isinstance(payload, Doc)
+
+
+def validate_payload(kind, payload, level=None, sample_size=None, cache=VALIDATOR_CACHE):
+    """ checks if payload is valid for the MIME type kind
+    :param kind: A MIME type like 'application/xml+tei'
+    :param payload: The payload
+    :param level: One of VALIDATION_LEVELS; defaults to spacytei.config.VALIDATION_LEVEL
+    :param sample_size: With level 'full', the number of tokens of an acdhlang payload checked\
+    against the JSON schema; defaults to spacytei.config.VALIDATION_SAMPLE_SIZE
+    :param cache: The ValidatorCache holding the compiled schemas
+    :return: True or False; with level 'full', TEI payloads are False if the TEI schema can't\
+    be compiled
+    """
+    level = VALIDATION_LEVEL if level is None else level
+    if level not in VALIDATION_LEVELS:
+        raise ValueError('Validation level must be one of {}.'.format(VALIDATION_LEVELS))
+    sample_size = VALIDATION_SAMPLE_SIZE if sample_size is None else sample_size
+    if level == 'off':
+        return True
+    if kind == "application/json+acdhlang":
+        if not _is_acdhlang_structure(payload):
+            return False
+        if level == 'structural':
+            return True
+        sample = dict(payload)
+        sample['tokenArray'] = sample_tokens(payload['tokenArray'], sample_size)
+        return cache.json_validator().is_valid(sample)
+    elif kind == "spacyDoc":
+        return _is_spacy_doc(payload)
+    elif kind == "text/plain":
+        return isinstance(payload, str)
+    elif kind == "application/xml+tei":
+        if not _is_xml_with_root(payload, NSMAP['tei'], ('TEI', 'teiCorpus')):
+            return False
+        if level == 'structural':
+            return True
+        schema = cache.tei_validator()
+        if schema is None:
+            return False
+        return schema.validate(XMLReader(payload, cache=DOCUMENT_CACHE).view)
+    elif kind == "application/xml+tcf":
+        return _is_xml_with_root(payload, 'http://www.dspin.de/data', ('D-Spin', ))
+    elif kind == "application/x-acdhlang+columnar":
+        return isinstance(payload, ColumnarDoc)
+    elif kind == "application/x-acdhlang+binary":
+        return is_binary_payload(payload)
+    return False
@@ -9,9 +9,6 @@ filename = stream_docs_to_file(domain, app_name, verbose=False)
 create_word_vecs(filename)
 """
 
-from gensim.models import Word2Vec
-from gensim.utils import tokenize
-
 
 def simple_preprocess(doc, deacc=False, min_len=2, max_len=30, lower=False):
     """
@@ -21,6 +18,8 @@ def simple_preprocess(doc, deacc=False, min_len=2, max_len=30, lower=False):
     tokens = unicode strings, that won't be processed any further.
 
     """
+    from gensim.utils import tokenize
+
     tokens = [
         token for token in tokenize(doc, lower=lower, deacc=deacc, errors='ignore')
         if min_len <= len(token) <= max_len and not token.startswith('_')
@@ -49,6 +48,8 @@ def create_word_vecs(
         :min_count: The minimum count of words to consider when training the models
         :workers: The number of threads to use while training.
     """
+    from gensim.models import Word2Vec
+
     documents = read_input(input_file, lower=lower)
     model = Word2Vec(
         [x for x in documents],
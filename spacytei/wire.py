@@ -0,0 +1,151 @@
+"""
+This module provides a binary wire format (application/x-acdhlang+binary) for\
+spacytei.columnar.ColumnarDoc, e.g. to pass documents between web workers and\
+background annotators. The layout is:
+
+MAGIC | uint32 header length | JSON header | padding | arrays and the string table
+
+Arrays are stored with the smallest integer type holding their values and every\
+array starts at a multiple of ALIGNMENT, so reading a document only parses\
+the JSON header and string table; the arrays are numpy views on the buffer\
+(no copy), which also works on a memory-mapped file.
+"""
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from spacytei.columnar import ColumnarDoc, StringTable, as_columnar
+
+
+BINARY_MIME = 'application/x-acdhlang+binary'
+
+MAGIC = b'ACDHLNG\x01'
+ALIGNMENT = 8
+HEADER_LENGTH = struct.Struct('<I')
+
+
+def is_binary_payload(data):
+    """ checks if data looks like a document in the binary wire format
+    :param data: bytes, a memoryview or a mmap
+    :return: True or False
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview, mmap.mmap)):
+        return False
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def _padding(size):
+    return -size % ALIGNMENT
+
+
+def _narrow(array):
+    """ returns array with the smallest signed little endian integer type holding its values """
+    if len(array):
+        low, high = int(array.min()), int(array.max())
+    else:
+        low = high = 0
+    for dtype in ('<i1', '<i2', '<i4'):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.ascontiguousarray(array, dtype=dtype)
+    return np.ascontiguousarray(array, dtype='<i8')
+
+
+def dumps(doc):
+    """ serializes a ColumnarDoc (or a dict tokenlist) into the binary wire format
+    :param doc: A ColumnarDoc or anything ColumnarDoc.from_tokenlist accepts
+    :return: bytes
+    """
+    doc = as_columnar(doc)
+    blocks = []
+    size = 0
+
+    def add(data):
+        nonlocal size
+        blocks.append((size, data))
+        offset = size
+        size += len(data) + _padding(len(data))
+        return offset
+
+    def add_array(array):
+        array = _narrow(array)
+        return [array.dtype.str, add(array.tobytes()), len(array)]
+
+    columns = []
+    for key, column in doc.columns.items():
+        columns.append([key, doc.kinds[key]] + add_array(column))
+    header = {'columns': columns}
+    if doc.has_sents:
+        header['sent_offsets'] = add_array(doc.sent_offsets)
+        header['sent_texts'] = add_array(doc.sent_texts)
+    strings = json.dumps(doc.strings.values, ensure_ascii=False).encode('utf-8')
+    header['strings'] = [add(strings), len(strings)]
+    header = json.dumps(header).encode('utf-8')
+    start = len(MAGIC) + HEADER_LENGTH.size + len(header)
+    start += _padding(start)
+    out = bytearray(start + size)
+    out[:len(MAGIC)] = MAGIC
+    HEADER_LENGTH.pack_into(out, len(MAGIC), len(header))
+    out[len(MAGIC) + HEADER_LENGTH.size:len(MAGIC) + HEADER_LENGTH.size + len(header)] = header
+    for offset, data in blocks:
+        out[start + offset:start + offset + len(data)] = data
+    return bytes(out)
+
+
+def loads(data):
+    """ reads a document in the binary wire format; the arrays of the returned ColumnarDoc are\
+    read-only views on data, so data must not be changed or closed while they are in use
+    :param data: bytes, a memoryview or a mmap
+    :return: A ColumnarDoc
+    """
+    if not is_binary_payload(data):
+        raise ValueError('Data is not in the acdhlang binary format.')
+    buffer = memoryview(data)
+    pos = len(MAGIC)
+    header_length, = HEADER_LENGTH.unpack_from(buffer, pos)
+    pos += HEADER_LENGTH.size
+    header = json.loads(bytes(buffer[pos:pos + header_length]).decode('utf-8'))
+    start = pos + header_length
+    start += _padding(start)
+
+    def array(dtype, offset, count):
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=start + offset)
+
+    columns = {}
+    kinds = {}
+    for key, kind, dtype, offset, count in header['columns']:
+        columns[key] = array(dtype, offset, count)
+        kinds[key] = kind
+    offset, length = header['strings']
+    strings = StringTable(
+        json.loads(bytes(buffer[start + offset:start + offset + length]).decode('utf-8'))
+    )
+    doc = ColumnarDoc(strings, columns, kinds)
+    if 'sent_offsets' in header:
+        doc.sent_offsets = array(*header['sent_offsets'])
+        doc.sent_texts = array(*header['sent_texts'])
+    return doc
+
+
+def dump(doc, file):
+    """ writes a document in the binary wire format to a file
+    :param doc: A ColumnarDoc or a dict tokenlist
+    :param file: A file path
+    :return: The file path
+    """
+    with open(file, 'wb') as f:
+        f.write(dumps(doc))
+    return file
+
+
+def load(file):
+    """ memory-maps a file in the binary wire format; only the header and the string table are\
+    read, the arrays are paged in when accessed
+    :param file: A file path
+    :return: A ColumnarDoc
+    """
+    with open(file, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(data)
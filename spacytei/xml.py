@@ -1,14 +1,174 @@
+import os
+import re
+import logging
+import mmap
 import time
 import datetime
-import requests
+import threading
 import lxml.etree as ET
 
+from collections.abc import Hashable
+from io import BytesIO
+from copy import deepcopy
+
+from spacytei.config import XML_PARSER_OPTIONS
+from spacytei.instrumentation import INSTRUMENTATION, payload_size
+
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r'^\s*https?://', re.IGNORECASE)
+
+NSMAP = {
+    'tei': "http://www.tei-c.org/ns/1.0",
+    'xml': "http://www.w3.org/XML/1998/namespace",
+    'tcf': "http://www.dspin.de/data/textcorpus"
+}
+
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+
+# the XMLParser options lxml.etree.iterparse accepts as keyword arguments
+ITERPARSE_OPTIONS = (
+    'attribute_defaults', 'dtd_validation', 'load_dtd', 'no_network', 'remove_blank_text',
+    'compact', 'resolve_entities', 'remove_comments', 'remove_pis', 'strip_cdata', 'encoding',
+    'html', 'recover', 'huge_tree', 'collect_ids', 'schema'
+)
+
+_parsers = threading.local()
+
+_xpaths = {}
+
+
+class XMLParser(ET.XMLParser):
+
+    """ an lxml XMLParser which keeps its options, so documents read with iterparse can be\
+    parsed the same way """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.options = options
+
+
+def make_parser(**options):
+    """ creates an lxml XMLParser using XML_PARSER_OPTIONS as defaults
+    :param options: Keyword arguments overriding XML_PARSER_OPTIONS, e.g. remove_blank_text=True
+    :return: A spacytei.xml.XMLParser
+    """
+    kwargs = dict(XML_PARSER_OPTIONS)
+    kwargs.update(options)
+    return XMLParser(**kwargs)
+
+
+def iterparse_options(parser=None):
+    """ returns the keyword arguments for lxml.etree.iterparse which parse like parser
+    :param parser: A parser created by make_parser; the options of other parsers are unknown,\
+    for them and for None XML_PARSER_OPTIONS are used
+    :return: A dict
+    """
+    options = getattr(parser, 'options', XML_PARSER_OPTIONS)
+    return {k: v for k, v in options.items() if k in ITERPARSE_OPTIONS}
+
+
+def parser_cache_key(parser=None):
+    """ returns a hashable value standing for the options of parser, documents parsed with the\
+    same options can share an entry of a spacytei.doc_cache.DocumentCache
+    :param parser: A parser created by make_parser or None for the default parser
+    :return: A tuple or None if the options of parser are unknown
+    """
+    if parser is None:
+        options = XML_PARSER_OPTIONS
+    else:
+        options = getattr(parser, 'options', None)
+        if options is None:
+            return None
+    return tuple(sorted((k, v if isinstance(v, Hashable) else repr(v)) for k, v in options.items()))
+
+
+def get_default_parser():
+    """ returns the shared parser of the current thread (lxml parsers must not be used by\
+    several threads at once)
+    :return: An lxml.etree.XMLParser configured by XML_PARSER_OPTIONS
+    """
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = make_parser()
+        _parsers.parser = parser
+    return parser
+
+
+def get_xpath(expr, namespaces=None):
+    """ returns a compiled XPath for the passed in expression; every expression is compiled\
+    only once per process
+    :param expr: An XPath expression, e.g. './/tei:rs'
+    :param namespaces: A dict mapping prefixes to namespace URIs; defaults to NSMAP
+    :return: An lxml.etree.XPath which can be called with a node (and XPath variables)
+    """
+    if namespaces is None:
+        key = expr
+    else:
+        key = (expr, tuple(sorted(namespaces.items())))
+    try:
+        return _xpaths[key]
+    except KeyError:
+        compiled = ET.XPath(expr, namespaces=NSMAP if namespaces is None else namespaces)
+        _xpaths[key] = compiled
+        return compiled
+
+
+def detect_input_kind(xml):
+    """ decides up front how the passed in xml has to be read
+    :param xml: A file path, an URL, a XML string or bytes, a file object, a mmap or a parsed tree
+    :return: One of 'tree', 'mmap', 'bytes', 'file', 'path', 'url' or 'string'
+    """
+    if isinstance(xml, (ET._Element, ET._ElementTree)):
+        return 'tree'
+    if isinstance(xml, mmap.mmap):
+        return 'mmap'
+    if isinstance(xml, (bytes, bytearray, memoryview)):
+        return 'bytes'
+    if hasattr(xml, 'read'):
+        return 'file'
+    if isinstance(xml, os.PathLike):
+        return 'path'
+    if isinstance(xml, str):
+        stripped = xml.lstrip()
+        if stripped.startswith('<'):
+            return 'string'
+        if URL_PATTERN.match(stripped):
+            return 'url'
+        return 'path'
+    raise TypeError('Can not read XML from object of type {}'.format(type(xml)))
+
+
+def clark_name(name, nsmap):
+    """ turns a prefixed name like 'tei:p' into lxml's '{http://www.tei-c.org/ns/1.0}p'
+    :param name: A prefixed name, a local name or a name already in clark notation
+    :param nsmap: A dict mapping prefixes to namespace URIs
+    :return: The name in clark notation
+    """
+    if name.startswith('{') or ':' not in name:
+        return name
+    prefix, local_name = name.split(':', 1)
+    return "{{{}}}{}".format(nsmap[prefix], local_name)
+
 
 class XMLReader():
 
     """ a class to read an process tei-documents"""
 
-    def __init__(self, xml):
+    def __init__(self, xml, parser=None, streaming=False, cache=None):
+        """
+        :param xml: A file path, an URL, a XML string or bytes, a file object, a mmap or an\
+        already parsed lxml tree
+        :param parser: An lxml.etree.XMLParser; defaults to a shared parser configured by\
+        spacytei.config.XML_PARSER_OPTIONS. Streamed documents are read with the options of\
+        parsers created by make_parser
+        :param streaming: If True, the document is not parsed into self.tree; use the iter_*\
+        methods to process it element by element
+        :param cache: A spacytei.doc_cache.DocumentCache; if passed, a document already parsed\
+        is taken from the cache. Methods only reading the document use the cached tree via\
+        self.view, it is copied on the first access of self.tree
+        """
         self.ns_tei = {'tei': "http://www.tei-c.org/ns/1.0"}
         self.ns_xml = {'xml': "http://www.w3.org/XML/1998/namespace"}
         self.ns_tcf = {'tcf': "http://www.dspin.de/data/textcorpus"}
@@ -18,27 +178,246 @@ class XMLReader():
             'tcf': "http://www.dspin.de/data/textcorpus"
         }
         self.file = xml
-        try:
-            self.original = ET.parse(self.file)
-        except Exception as e:
-            try:
-                self.original = ET.fromstring(self.file.encode('utf8'))
-            except Exception as e:
-                r = requests.get(self.file)
-                self.original = ET.fromstring(r.text)
-        try:
-            self.tree = ET.parse(self.file)
-        except Exception as e:
-            try:
-                self.tree = ET.fromstring(self.file.encode('utf8'))
-            except Exception as e:
-                r = requests.get(self.file)
-                self.tree = ET.fromstring(r.text)
-        except Exception as e:
-            self.parsed_file = "parsing didn't work"
+        self.parser = parser
+        self.input_kind = detect_input_kind(xml)
+        self.cache = cache
+        self._original = None
+        self._modified = False
+        self._shared_tree = None
+        if streaming and self.input_kind != 'tree':
+            self.tree = None
+        elif self.input_kind == 'tree':
+            self.tree = self.file
+        else:
+            with INSTRUMENTATION.stage(
+                'parse', kind=self.input_kind, cached=cache is not None
+            ) as stage:
+                if stage.enabled and self.input_kind in ('string', 'bytes'):
+                    stage.update(bytes=payload_size(xml))
+                cacheable = self.input_kind in ('string', 'bytes', 'path', 'mmap')
+                if cache is not None and cacheable and parser_cache_key(parser) is not None:
+                    self.tree = self._parse_cached()
+                    self._shared_tree = self.tree
+                else:
+                    self.tree = self._parse()
+
+    def _parse_cached(self):
+        """ takes the parsed document from self.cache, the returned tree must not be changed """
+        kind = self.input_kind
+        if kind == 'string':
+            content = self.file.encode('utf8')
+        elif kind == 'bytes':
+            content = bytes(self.file)
+        elif kind == 'mmap':
+            content = self.file[:]
+        else:
+            with open(self.file, 'rb') as f:
+                content = f.read()
+        parser = self.parser if self.parser is not None else get_default_parser()
+        if kind in ('string', 'bytes'):
+            def parse(content):
+                return ET.fromstring(content, parser)
+        else:
+            def parse(content):
+                return ET.parse(BytesIO(content), parser)
+        parser_key = parser_cache_key(self.parser)
+        return self.cache.get(content, parse, kind in ('string', 'bytes'), parser_key, copy=False)
+
+    def _parse(self):
+        """ parses self.file according to self.input_kind
+        :return: An lxml _ElementTree (paths, files, mmaps) or _Element (strings, bytes, URLs)
+        """
+        parser = self.parser if self.parser is not None else get_default_parser()
+        kind = self.input_kind
+        if kind == 'tree':
+            return self.file
+        elif kind == 'string':
+            return ET.fromstring(self.file.encode('utf8'), parser)
+        elif kind == 'bytes':
+            return ET.fromstring(bytes(self.file), parser)
+        elif kind == 'mmap':
+            self.file.seek(0)
+            return ET.parse(self.file, parser)
+        elif kind == 'file':
+            if self.file.seekable():
+                self.file.seek(0)
+            return ET.parse(self.file, parser)
+        elif kind == 'url':
+            import requests
+
+            r = requests.get(self.file.strip())
+            r.raise_for_status()
+            return ET.fromstring(r.content, parser)
+        return ET.parse(os.fspath(self.file), parser)
+
+    def _open_source(self):
+        """ returns self.file in a form lxml.etree.iterparse can read from """
+        kind = self.input_kind
+        if kind == 'string':
+            return BytesIO(self.file.encode('utf8'))
+        elif kind == 'bytes':
+            return BytesIO(bytes(self.file))
+        elif kind in ('mmap', 'file'):
+            if kind == 'mmap' or self.file.seekable():
+                self.file.seek(0)
+            return self.file
+        elif kind == 'url':
+            import requests
+
+            r = requests.get(self.file.strip(), stream=True)
+            r.raise_for_status()
+            r.raw.decode_content = True
+            return r.raw
+        return os.fspath(self.file)
+
+    def iter_elements(self, tag, within=None):
+        """ yields complete elements one by one. If the document was not parsed into self.tree,\
+        it is read with iterparse and every element is cleared as soon as it was processed,\
+        so memory usage does not depend on the size of the document. Elements are yielded in\
+        document order in both cases, an element before the matching elements nested in it.
+        :param tag: The name of the elements to yield, e.g. 'tei:p'
+        :param within: Only elements with such an ancestor are yielded, e.g. 'tei:body'
+        :return: yields lxml elements; they are only valid until the next one which is not\
+        nested in them is requested
+        """
+        tag = clark_name(tag, self.nsmap)
+        if within is not None:
+            within = clark_name(within, self.nsmap)
+        if self.tree is not None:
+            containers = [self.tree] if within is None else self.tree.iter(within)
+            for container in containers:
+                for elem in container.iter(tag):
+                    yield elem
+            return
+        options = iterparse_options(self.parser)
+        context = ET.iterparse(self._open_source(), events=('start', 'end'), **options)
+        inside = 1 if within is None else 0
+        depth = 0
+        # matching elements in the order they start; nested ones end before the outer one, so
+        # all of them are yielded once the outermost is complete to keep the document order
+        pending = []
+        for event, elem in context:
+            if event == 'start':
+                if elem.tag == within:
+                    inside += 1
+                elif inside and elem.tag == tag:
+                    depth += 1
+                    pending.append(elem)
+                continue
+            if elem.tag == within:
+                inside -= 1
+            elif inside and elem.tag == tag:
+                depth -= 1
+                if depth == 0:
+                    for x in pending:
+                        yield x
+                    pending = []
+            if depth == 0:
+                # nothing still open needs this element, so drop it and its processed siblings
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        del context
+
+    @property
+    def tree(self):
+        """ the parsed document; a tree shared with self.cache is copied before it is handed\
+        out, so it can be changed freely """
+        if self._tree is not None and self._tree is self._shared_tree:
+            self._tree = deepcopy(self._shared_tree)
+        return self._tree
+
+    @tree.setter
+    def tree(self, tree):
+        self._tree = tree
+
+    @property
+    def view(self):
+        """ the parsed document for reading only; it may be the tree shared with self.cache\
+        and must not be changed """
+        return self._tree
+
+    @property
+    def original(self):
+        """ the document as it was before any processing; only built when accessed """
+        if self._original is None:
+            if self._shared_tree is not None:
+                self._original = deepcopy(self._shared_tree)
+            elif self._modified and self._is_replayable():
+                self._original = self._parse()
+            else:
+                self._original = deepcopy(self._tree)
+        return self._original
+
+    def _is_replayable(self):
+        """ checks if self.file can be parsed a second time """
+        if self.input_kind == 'tree':
+            return False
+        if self.input_kind == 'file':
+            return self.file.seekable()
+        return True
+
+    def _before_modification(self):
+        """ needs to be called by methods changing self.tree in place """
+        if self._tree is self._shared_tree:
+            # the tree is shared with the cache, so work on a copy of it
+            self._tree = deepcopy(self._shared_tree)
+        elif not self._modified and self._original is None and not self._is_replayable():
+            # the input can't be read again, so keep a copy before it gets changed
+            self._original = deepcopy(self.tree)
+        self._modified = True
+
+    def index_by_id(self, nodes, id_attribute=XML_ID, duplicate_ids=None):
+        """ creates a dict mapping the ids of the passed in nodes to the nodes
+        :param nodes: A list of elements
+        :param id_attribute: The name of the attribute holding the id
+        :param duplicate_ids: A list the ids of further nodes with an id already indexed are\
+        appended to; only the first node with an id is indexed
+        :return: A dict like {'xTok_000001': <Element w>}
+        """
+        index = {}
+        for node in nodes:
+            node_id = node.get(id_attribute)
+            if node_id not in index:
+                index[node_id] = node
+            elif duplicate_ids is not None:
+                duplicate_ids.append(node_id)
+        return index
+
+    def summarize_writeback(
+        self, updated, missing_ids, unused_ids, verbose=True, duplicate_ids=()
+    ):
+        """ stores (and logs) a summary of a process_tokenlist run in self.writeback_summary
+        :param updated: The number of updated nodes
+        :param missing_ids: The ids of tokens without a node
+        :param unused_ids: The ids of nodes without a token
+        :param duplicate_ids: The ids found more than once among the tokens or the nodes; the\
+        further tokens or nodes with such an id are not matched
+        :return: A dict like {'updated': 10, 'missing': 0, 'unused': 1, 'duplicate': 0,\
+        'missing_ids': [], 'unused_ids': ['xTok_000011'], 'duplicate_ids': []}
+        """
+        missing_ids = list(missing_ids)
+        unused_ids = list(unused_ids)
+        duplicate_ids = list(duplicate_ids)
+        self.writeback_summary = {
+            'updated': updated,
+            'missing': len(missing_ids),
+            'unused': len(unused_ids),
+            'duplicate': len(duplicate_ids),
+            'missing_ids': missing_ids,
+            'unused_ids': unused_ids,
+            'duplicate_ids': duplicate_ids,
+        }
+        if verbose:
+            logger.info(
+                "# updated: %(updated)s, tokens without node: %(missing)s, "
+                "nodes without token: %(unused)s, duplicate ids: %(duplicate)s",
+                self.writeback_summary
+            )
+        return self.writeback_summary
 
     def return_byte_like_object(self):
-        return ET.tostring(self.tree, encoding="utf-8")
+        return ET.tostring(self.view, encoding="utf-8")
 
     def return_string(self):
         return self.return_byte_like_object().decode('utf-8')
@@ -52,5 +431,5 @@ class XMLReader():
             file = "{}.xml".format(timestamp)
 
         with open(file, 'wb') as f:
-            f.write(ET.tostring(self.tree))
+            f.write(ET.tostring(self.view))
         return file
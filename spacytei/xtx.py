@@ -0,0 +1,271 @@
+"""
+This module provides a client for the XTX tokenization service which splits\
+large TEI documents into chunks and tokenizes them concurrently.
+"""
+import re
+import time
+import threading
+import lxml.etree as ET
+
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+
+from spacytei.config import XTX_URL, XTX_MAX_WORKERS, XTX_CHUNK_BYTES, XTX_TIMEOUT
+from spacytei.xml import XMLReader, XML_ID, get_default_parser, get_xpath
+
+
+# front, body and back elements which are not part of another one; their children are the units
+# a document is split into, i.e. usually tei:div, but also the tei:text elements of a tei:group
+CHUNK_CONTAINERS = get_xpath(
+    "//tei:text//*[self::tei:front or self::tei:body or self::tei:back]"
+    "[not(ancestor::tei:front or ancestor::tei:body or ancestor::tei:back)]"
+)
+ELEMENTS_WITH_ID = get_xpath(".//*[@xml:id]")
+NUMBERED_ID = re.compile(r'^(.*?)(\d+)$')
+# attributes pointing to xml:ids like corresp="#xTok_000001", updated when the ids are renumbered
+ID_REFERENCE_ATTRIBUTES = ('corresp', 'ref', 'target', 'prev', 'next', 'sameAs')
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url=XTX_URL, **kwargs):
+    """ returns a XtxClient per URL (and settings) which is kept for the lifetime of the process,\
+    so its connections can be reused
+    :param url: The XTX endpoint including the profile
+    :param kwargs: Passed to XtxClient when the client is created
+    :return: A XtxClient
+    """
+    key = (url, ) + tuple(sorted(kwargs.items()))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = XtxClient(url, **kwargs)
+            _clients[key] = client
+        return client
+
+
+class XtxClient():
+
+    """ tokenizes TEI documents with XTX using a pooled HTTP session. Documents larger than\
+    chunk_bytes are split at the children of tei:front/tei:body/tei:back, the chunks are posted\
+    concurrently and the results are put back in place with renumbered, unique xml:ids. At most\
+    max_workers requests are in flight per client, however many documents are tokenized at once """
+
+    def __init__(
+        self,
+        url=XTX_URL,
+        max_workers=XTX_MAX_WORKERS,
+        chunk_bytes=XTX_CHUNK_BYTES,
+        timeout=XTX_TIMEOUT,
+        session=None
+    ):
+        """
+        :param url: The XTX endpoint including the profile
+        :param max_workers: The maximum number of concurrent requests of this client
+        :param chunk_bytes: The approximate maximum size of a chunk in bytes; None disables\
+        chunking
+        :param timeout: The requests timeout (connect, read) in seconds
+        :param session: A requests.Session; by default a new session with a connection pool of\
+        max_workers connections is created
+        """
+        self.url = url
+        self.max_workers = max_workers
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        if session is None:
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        """ a ThreadPoolExecutor with max_workers threads shared by all calls of this client """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='xtx'
+                )
+            return self._executor
+
+    def post(self, data):
+        """ posts serialized XML to XTX
+        :param data: The XML as bytes; waits while max_workers requests of this client are in\
+        flight
+        :return: A tuple of the response body (bytes) and a dict with bytes sent/received,\
+        the latency in seconds and the status code
+        """
+        headers = {
+            'Content-type': 'application/xml;charset=UTF-8', 'accept': 'application/xml'
+        }
+        with self._slots:
+            start = time.perf_counter()
+            res = self.session.post(self.url, headers=headers, data=data, timeout=self.timeout)
+        stats = {
+            'bytes_sent': len(data),
+            'bytes_received': len(res.content),
+            'latency': time.perf_counter() - start,
+            'status_code': res.status_code,
+        }
+        if res.status_code != 200:
+            raise ValueError('XTX did not respond with status code 200.')
+        return res.content, stats
+
+    def tokenize(self, xml, stats=None):
+        """ tokenizes a TEI document
+        :param xml: Anything spacytei.xml.XMLReader can read
+        :param stats: A list the stats of each request (see post()) are appended to, with the\
+        number of the chunk
+        :return: The tokenized TEI document as string
+        """
+        data = xml.encode('utf-8') if isinstance(xml, str) else None
+        if data is not None and (self.chunk_bytes is None or len(data) <= self.chunk_bytes):
+            content, request_stats = self.post(data)
+            if stats is not None:
+                request_stats['chunk'] = 0
+                stats.append(request_stats)
+            return content.decode('utf-8')
+        tree = self.tokenize_tree(XMLReader(xml).tree, stats=stats)
+        return ET.tostring(tree, encoding='unicode')
+
+    def tokenize_tree(self, tree, stats=None):
+        """ tokenizes a parsed TEI document chunk by chunk; the passed in tree is not changed
+        :param tree: An lxml _Element or _ElementTree
+        :param stats: A list the stats of each request (see post()) are appended to, with the\
+        number of the chunk and of its units
+        :return: The tokenized document as lxml _Element
+        """
+        root = tree.getroot() if hasattr(tree, 'getroot') else tree
+        chunks = self.split(root)
+        if len(chunks) < 2:
+            content, request_stats = self.post(ET.tostring(root, encoding='utf-8'))
+            if stats is not None:
+                request_stats['chunk'] = 0
+                stats.append(request_stats)
+            return ET.fromstring(content, get_default_parser())
+        root = deepcopy(root)
+        units = iter([
+            unit for container in CHUNK_CONTAINERS(root)
+            for unit in container.iterchildren(tag=ET.Element)
+        ])
+        chunks = [[next(units) for _ in chunk] for chunk in chunks]
+        known_ids = set(x.get(XML_ID) for x in ELEMENTS_WITH_ID(root))
+        results = list(self.executor.map(self._tokenize_chunk, chunks))
+        counters = {}
+        for i, (units, (tokenized_units, request_stats)) in enumerate(zip(chunks, results)):
+            if stats is not None:
+                request_stats['chunk'] = i
+                request_stats['units'] = len(units)
+                stats.append(request_stats)
+            for unit, tokenized in zip(units, tokenized_units):
+                original_ids = set(x.get(XML_ID) for x in unit.iter(tag=ET.Element))
+                tokenized.tail = unit.tail
+                unit.getparent().replace(unit, tokenized)
+                self._renumber_ids(tokenized, known_ids, counters, original_ids)
+        return root
+
+    def split(self, root):
+        """ groups the children of tei:front/tei:body/tei:back into chunks of about chunk_bytes
+        :param root: The root element of a TEI document
+        :return: A list of lists of sibling elements
+        """
+        if self.chunk_bytes is None:
+            return []
+        chunks = []
+        for container in CHUNK_CONTAINERS(root):
+            chunk = []
+            size = 0
+            for unit in container.iterchildren(tag=ET.Element):
+                unit_size = len(ET.tostring(unit))
+                if chunk and size + unit_size > self.chunk_bytes:
+                    chunks.append(chunk)
+                    chunk = []
+                    size = 0
+                chunk.append(unit)
+                size += unit_size
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def _tokenize_chunk(self, units):
+        """ posts sibling elements wrapped in their ancestors and returns the tokenized elements """
+        container = units[0].getparent()
+        ancestors = [container] + list(container.iterancestors())
+        skeleton = None
+        inner = None
+        for ancestor in reversed(ancestors):
+            copy = ET.Element(ancestor.tag, attrib=dict(ancestor.attrib), nsmap=ancestor.nsmap)
+            if skeleton is None:
+                skeleton = copy
+            else:
+                inner.append(copy)
+            inner = copy
+        for unit in units:
+            inner.append(deepcopy(unit))
+        content, stats = self.post(ET.tostring(skeleton, encoding='utf-8'))
+        result = ET.fromstring(content, get_default_parser())
+        for ancestor in reversed(ancestors[:-1]):
+            result = result.find(ancestor.tag)
+            if result is None:
+                raise ValueError('XTX returned a document with an unexpected structure.')
+        tokenized_units = list(result.iterchildren(tag=ET.Element))
+        if len(tokenized_units) != len(units):
+            raise ValueError('XTX returned a document with an unexpected structure.')
+        return tokenized_units, stats
+
+    def _renumber_ids(self, element, known_ids, counters, original_ids):
+        """ gives ids created by XTX for a chunk new numbers counting on from the previous chunk,\
+        so they are unique within the document, and updates the references to them in the chunk
+        :param element: A tokenized unit
+        :param known_ids: The set of ids in the document; the new ids are added to it
+        :param counters: A dict with the last number given per id prefix
+        :param original_ids: The ids of the unit before tokenization; the first element with\
+        such an id keeps it
+        """
+        kept = set()
+        renamed = {}
+        for x in element.iter(tag=ET.Element):
+            xml_id = x.get(XML_ID)
+            if xml_id is None:
+                continue
+            if xml_id in original_ids and xml_id not in kept:
+                kept.add(xml_id)
+                continue
+            match = NUMBERED_ID.match(xml_id)
+            if match is not None:
+                prefix, number = match.groups()
+            elif xml_id in known_ids:
+                prefix, number = "{}_".format(xml_id), '1'
+            else:
+                known_ids.add(xml_id)
+                continue
+            while True:
+                counters[prefix] = counters.get(prefix, 0) + 1
+                new_id = "{}{:0{}d}".format(prefix, counters[prefix], len(number))
+                if new_id not in known_ids:
+                    break
+            known_ids.add(new_id)
+            if xml_id not in original_ids:
+                renamed.setdefault(xml_id, new_id)
+            x.set(XML_ID, new_id)
+        if not renamed:
+            return
+        for x in element.iter(tag=ET.Element):
+            for name in ID_REFERENCE_ATTRIBUTES:
+                value = x.get(name)
+                if not value:
+                    continue
+                pointers = value.split()
+                updated = [
+                    "#{}".format(renamed[p[1:]]) if p.startswith('#') and p[1:] in renamed else p
+                    for p in pointers
+                ]
+                if updated != pointers:
+                    x.set(name, ' '.join(updated))
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import pytest
+
+from spacytei.columnar import ColumnarDoc
+from spacytei.conversion import (
+    ACDHLANG, BINARY, COLUMNAR, SPACY_DOC, TCF, TEI, Converter, plan_conversion
+)
+from spacytei.tei import TeiReader
+
+
+TEI_DOC = (
+    '<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>'
+    '<p><s><w xml:id="w1">Hans</w> <w xml:id="w2">ging</w><pc xml:id="w3">.</pc></s>'
+    '<s><w xml:id="w4">Schön</w><pc xml:id="w5">!</pc></s></p>'
+    '</body></text></TEI>'
+)
+TEI_NS = {'tei': 'http://www.tei-c.org/ns/1.0'}
+
+
+def original_process(xml):
+    return SimpleNamespace(payload=xml, context={'original_xml': xml})
+
+
+def lemmatize(tokens):
+    for x in tokens:
+        x['lemma'] = x['value'].lower()
+
+
+def lemmas(tree):
+    return [x.get('lemma') for x in tree.iterfind('.//tei:w', TEI_NS)]
+
+
+def test_plan_takes_the_cheapest_chain():
+    assert plan_conversion(TEI, SPACY_DOC) == ([(TEI, SPACY_DOC)], 2)
+    steps, cost = plan_conversion(BINARY, TCF)
+    assert steps == [(BINARY, COLUMNAR), (COLUMNAR, TCF)]
+    assert cost == pytest.approx(3.2)
+
+
+def test_plan_starts_from_available_values():
+    steps, cost = plan_conversion(TEI, BINARY, available=[COLUMNAR])
+    assert steps == [(COLUMNAR, BINARY)]
+    assert cost == 0.5
+
+
+def test_plan_without_path():
+    with pytest.raises(ValueError):
+        plan_conversion(BINARY, 'text/plain')
+
+
+def test_flat_tokenlist_converts_back_to_tei():
+    tokenlist = TeiReader(TEI_DOC).create_tokenlist()
+    lemmatize(tokenlist)
+    process = original_process(TEI_DOC)
+    converter = Converter(ACDHLANG, tokenlist, process)
+    tree = converter.convert(TEI)
+    assert converter.plan == [(ACDHLANG, TEI)]
+    assert lemmas(tree) == ['hans', 'ging', 'schön']
+    assert process.context['conversion_log'][-1]['plan'] == [(ACDHLANG, TEI)]
+
+
+def test_sentence_tokenlist_converts_back_to_tei():
+    tokenlist = TeiReader(TEI_DOC).create_tokenlist(sents=True)
+    assert [len(x['tokens']) for x in tokenlist] == [3, 2]
+    for sent in tokenlist:
+        lemmatize(sent['tokens'])
+    tree = Converter(ACDHLANG, tokenlist, original_process(TEI_DOC)).convert(TEI)
+    assert lemmas(tree) == ['hans', 'ging', 'schön']
+
+
+def test_columns_convert_back_to_tei():
+    columns = TeiReader(TEI_DOC).create_columns()
+    assert columns.has_sents
+    tree = Converter(COLUMNAR, columns, original_process(TEI_DOC)).convert(TEI)
+    assert lemmas(tree) == [None, None, None]
+    tokenlist = columns.to_tokenlist()
+    for sent in tokenlist:
+        lemmatize(sent['tokens'])
+    columns = ColumnarDoc.from_tokenlist(tokenlist)
+    tree = Converter(COLUMNAR, columns, original_process(TEI_DOC)).convert(TEI)
+    assert lemmas(tree) == ['hans', 'ging', 'schön']
+
+
+def test_tei_converts_to_sentences_and_is_memoized():
+    process = original_process(TEI_DOC)
+    converter = Converter(TEI, TEI_DOC, process)
+    tokenlist = converter.convert(ACDHLANG)
+    assert [x['sent'] for x in tokenlist] == ['Hans ging.', 'Schön!']
+    assert converter.data_json is tokenlist
+    again = Converter(TEI, TEI_DOC, process)
+    assert again.convert(ACDHLANG) is tokenlist
+    assert again.plan == []
+
+
+def test_unknown_data_type():
+    with pytest.raises(ValueError):
+        Converter('text/html', '', original_process(''))
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('spacy')
+
+from spacy.tokens import Doc  # noqa: E402
+from spacy.vocab import Vocab  # noqa: E402
+
+from spacytei.incremental import (  # noqa: E402
+    _attr_id, _restore, annotated_tokens, apply_component
+)
+
+
+WORDS = ['Hans', 'Maier', 'ging', 'nach', 'Wien']
+IOB_VALUES = {'B': 3, 'I': 1, 'O': 2}
+
+
+def create_doc(tags=(), lemmas=(), iob=()):
+    doc = Doc(Vocab(), words=WORDS)
+    for token, tag in zip(doc, tags):
+        if tag:
+            token.tag_ = tag
+    for token, lemma in zip(doc, lemmas):
+        if lemma:
+            token.lemma_ = lemma
+    if iob:
+        set_iob(doc, iob)
+    return doc
+
+
+def set_iob(doc, tags):
+    """ sets IOB tags like 'B-PER' or 'O'; tokens with None stay without annotation """
+    values = np.zeros((len(doc), 2), dtype='uint64')
+    for i, tag in enumerate(tags):
+        if tag:
+            iob, _, label = tag.partition('-')
+            values[i, 0] = IOB_VALUES[iob]
+            values[i, 1] = doc.vocab.strings.add(label) if label else 0
+    doc.from_array([_attr_id('ENT_IOB'), _attr_id('ENT_TYPE')], values)
+    return doc
+
+
+def tag_everything(doc):
+    for token in doc:
+        token.tag_ = 'XY'
+        token.lemma_ = 'xy'
+    return doc
+
+
+def run_with_restore(doc, attrs, component):
+    annotated = annotated_tokens(doc, attrs[0])
+    values = doc.to_array([_attr_id(x) for x in attrs])
+    return _restore(component(doc), attrs, values, annotated)
+
+
+def test_curated_tags_and_lemmas_are_kept():
+    doc = create_doc(tags=['NE', 'NE', None, None, 'NE'], lemmas=['Hans', None, None, None, None])
+    doc = run_with_restore(doc, ['TAG', 'POS', 'LEMMA'], tag_everything)
+    assert [x.tag_ for x in doc] == ['NE', 'NE', 'XY', 'XY', 'NE']
+    # the lemma of a tagged token is only kept if it had one
+    assert [x.lemma_ for x in doc] == ['Hans', 'xy', 'xy', 'xy', 'xy']
+
+
+def test_curated_entities_are_kept():
+    doc = create_doc(iob=['B-PER', 'I-PER', 'O', None, None])
+
+    def recognize(doc):
+        return set_iob(doc, ['O', 'B-LOC', 'I-LOC', 'B-LOC', 'B-ORG'])
+
+    doc = run_with_restore(doc, ['ENT_IOB', 'ENT_TYPE'], recognize)
+    assert [(x.ent_iob_, x.ent_type_) for x in doc] == [
+        ('B', 'PER'), ('I', 'PER'), ('O', ''), ('B', 'LOC'), ('B', 'ORG')
+    ]
+
+
+def test_entity_cut_by_a_curated_token_starts_again():
+    doc = create_doc(iob=[None, None, 'O', None, None])
+
+    def recognize(doc):
+        return set_iob(doc, ['O', 'O', 'B-LOC', 'I-LOC', 'I-LOC'])
+
+    doc = run_with_restore(doc, ['ENT_IOB', 'ENT_TYPE'], recognize)
+    assert [x.ent_iob_ for x in doc] == ['O', 'O', 'O', 'B', 'I']
+
+
+def test_apply_component_skips_annotated_docs():
+    calls = []
+
+    def tagger(doc):
+        calls.append(doc)
+        return tag_everything(doc)
+
+    tagged = create_doc(tags=['NE'] * len(WORDS))
+    partly = create_doc(tags=['NE', None, None, None, None])
+    untagged = create_doc()
+    docs = list(apply_component('tagger', tagger, [tagged, partly, untagged]))
+    assert len(calls) == 2
+    assert [x.tag_ for x in docs[0]] == ['NE'] * len(WORDS)
+    assert [x.tag_ for x in docs[1]] == ['NE', 'XY', 'XY', 'XY', 'XY']
+    assert [x.tag_ for x in docs[2]] == ['XY'] * len(WORDS)
@@ -0,0 +1,67 @@
+import random
+
+from spacytei.matcher import EntityMatcher, normalize_surface_form
+
+
+def brute_force_all(patterns, text):
+    labels = {}
+    for pattern, label in patterns:
+        labels.setdefault(normalize_surface_form(pattern), label)
+    matches = set()
+    for pattern, label in labels.items():
+        start = text.find(pattern)
+        while start != -1:
+            matches.add((start, start + len(pattern), label))
+            start = text.find(pattern, start + 1)
+    return matches
+
+
+def brute_force_find(patterns, text):
+    result = []
+    last_end = 0
+    for match in sorted(brute_force_all(patterns, text), key=lambda x: (x[0], -x[1])):
+        if match[0] >= last_end:
+            result.append(match)
+            last_end = match[1]
+    return result
+
+
+def random_string(rng, alphabet, low, high):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(low, high)))
+
+
+def test_example_from_docstring():
+    matcher = EntityMatcher([("Wien", "LOC"), ("Hans Maier", "PER")])
+    assert matcher.find("Hans Maier ging nach Wien") == [(0, 10, 'PER'), (21, 25, 'LOC')]
+
+
+def test_against_brute_force():
+    rng = random.Random(7)
+    for _ in range(300):
+        patterns = [
+            (random_string(rng, 'ab ', 1, 4), rng.choice(['PER', 'LOC', 'ORG']))
+            for _ in range(rng.randint(1, 8))
+        ]
+        patterns = [x for x in patterns if normalize_surface_form(x[0])]
+        text = random_string(rng, 'abc ', 0, 40)
+        matcher = EntityMatcher(patterns)
+        assert set(matcher.iter_all(text)) == brute_force_all(patterns, text)
+        assert matcher.find(text) == brute_force_find(patterns, text)
+
+
+def test_first_label_wins_and_whitespace_is_normalized():
+    matcher = EntityMatcher([("Hans  Maier", "PER"), ("Hans Maier", "ORG")])
+    assert len(matcher) == 1
+    assert matcher.find("Hans Maier") == [(0, 10, 'PER')]
+
+
+def test_whole_words():
+    matcher = EntityMatcher([("Wien", "LOC")], whole_words=True)
+    assert matcher.find("Wiener in Wien") == [(10, 14, 'LOC')]
+
+
+def test_patterns_added_after_a_search():
+    matcher = EntityMatcher([("Wien", "LOC")])
+    assert matcher.find("Graz und Wien") == [(9, 13, 'LOC')]
+    matcher.add("Graz", "LOC")
+    assert matcher.find("Graz und Wien") == [(0, 4, 'LOC'), (9, 13, 'LOC')]
@@ -0,0 +1,85 @@
+import os
+import time
+
+from types import SimpleNamespace
+
+from spacytei.models import ModelRegistry
+from spacytei.result_cache import ResultCache
+
+
+def create_model_folder(path):
+    path.mkdir()
+    (path / 'meta.json').write_text('{"name": "test", "version": "1.0.0"}')
+    (path / 'weights').write_bytes(b'1234')
+    return path
+
+
+def touch(path):
+    """ moves the modification time forward, file systems with coarse timestamps included """
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+
+
+def test_fingerprint_changes_with_the_model_folder(tmp_path):
+    folder = create_model_folder(tmp_path / 'model')
+    nlp = SimpleNamespace(path=str(folder), meta={'version': '1.0.0'})
+    registry = ModelRegistry()
+    fingerprint = registry.fingerprint(nlp)
+    assert registry.fingerprint(nlp) == fingerprint
+    # retraining rewrites the weights and spaCy saves meta.json again
+    (folder / 'weights').write_bytes(b'5678')
+    touch(folder / 'weights')
+    touch(folder / 'meta.json')
+    assert registry.fingerprint(nlp) != fingerprint
+
+
+def test_fingerprint_of_model_without_folder():
+    nlp = SimpleNamespace(path=None, meta={'version': '2.0.0'})
+    assert ModelRegistry().fingerprint(nlp) == '2.0.0'
+
+
+def test_results_of_a_changed_model_are_invalidated(tmp_path):
+    folder = create_model_folder(tmp_path / 'model')
+    nlp = SimpleNamespace(path=str(folder), meta={'version': '1.0.0'})
+    registry = ModelRegistry()
+    cache = ResultCache(':memory:')
+    try:
+        old = registry.fingerprint(nlp)
+        old_key = cache.make_key('Hans ging nach Wien', 'text/plain', model='test', fingerprint=old)
+        cache.put(old_key, 'spacyDoc', b'old', scope='test', fingerprint=old)
+        other_key = cache.make_key('Hans', 'text/plain', model='other')
+        cache.put(other_key, 'spacyDoc', b'other', scope='other', fingerprint='x')
+        assert cache.get(old_key) == ('spacyDoc', b'old')
+
+        (folder / 'weights').write_bytes(b'5678')
+        touch(folder / 'weights')
+        touch(folder / 'meta.json')
+        new = registry.fingerprint(nlp)
+        new_key = cache.make_key('Hans ging nach Wien', 'text/plain', model='test', fingerprint=new)
+        assert new_key != old_key
+        assert cache.get(new_key) is None
+        cache.put(new_key, 'spacyDoc', b'new', scope='test', fingerprint=new)
+
+        assert cache.get(old_key) is None
+        assert cache.get(new_key) == ('spacyDoc', b'new')
+        assert cache.get(other_key) == ('spacyDoc', b'other')
+        assert cache.stats()['invalidations'] == 1
+    finally:
+        cache.close()
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ResultCache(':memory:', max_bytes=10)
+    try:
+        cache.put('a', 'text/plain', b'12345')
+        time.sleep(0.01)
+        cache.put('b', 'text/plain', b'12345')
+        time.sleep(0.01)
+        assert cache.get('a') is not None
+        time.sleep(0.01)
+        cache.put('c', 'text/plain', b'12345')
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+    finally:
+        cache.close()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lxml.etree as ET
+import pytest
+
+from spacytei.pipeline import PipelineProcessBase, XtxProcess, run_batch
+from spacytei.runner import run_pipeline
+from spacytei.tei import TeiReader
+
+
+TEI = '{http://www.tei-c.org/ns/1.0}'
+TEI_MIME = 'application/xml+tei'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+
+
+def create_document(text, latency=0):
+    return (
+        '<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body><p n="{}">{}</p></body></text>'
+        '</TEI>'.format(latency, text)
+    )
+
+
+@pytest.fixture(scope='module')
+def xtx_url():
+    """ a local server tokenizing like XTX on whitespace; it waits for the seconds given in\
+    p/@n and answers with status 500 for documents containing 'fail' """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            root = ET.fromstring(self.rfile.read(int(self.headers['Content-Length'])))
+            counter = 0
+            for p in root.iter(TEI + 'p'):
+                time.sleep(float(p.get('n', 0)))
+                words = "".join(p.itertext()).split()
+                p.text = None
+                for word in words:
+                    counter += 1
+                    w = ET.SubElement(p, TEI + 'w')
+                    w.text = word
+                    w.set(XML_ID, 'xTok_{:06d}'.format(counter))
+                    w.tail = ' '
+            if 'fail' in "".join(root.itertext()):
+                self.send_response(500)
+                self.end_headers()
+                return
+            out = ET.tostring(root, encoding='utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+class CountTokens(PipelineProcessBase):
+    accepts = [TEI_MIME]
+    returns = 'text/plain'
+
+    def process(self):
+        return " ".join(x['value'] for x in TeiReader(self.payload).create_tokenlist())
+
+
+def processes(url):
+    return [
+        (XtxProcess, {'XTX_URL': url, 'result_cache': False}),
+        (CountTokens, {'result_cache': False}),
+    ]
+
+
+def test_results_keep_the_order_of_the_items(xtx_url):
+    # the first documents take longest, so they are tokenized last
+    items = [
+        (create_document('Dokument {} ist hier'.format(i), latency=(3 - i) / 10), TEI_MIME)
+        for i in range(4)
+    ]
+    results = run_pipeline(items, processes(xtx_url), concurrency=4, queue_size=2, batch_size=2)
+    assert [x.error for x in results] == [None] * 4
+    assert [x.payload for x in results] == ['Dokument {} ist hier'.format(i) for i in range(4)]
+    assert [x.mime for x in results] == ['text/plain'] * 4
+
+
+def test_errors_stay_with_their_item(xtx_url):
+    items = [
+        (create_document('Hans ging'), TEI_MIME),
+        (create_document('this will fail'), TEI_MIME),
+        (create_document('nach Wien'), TEI_MIME),
+        ('<TEI><text>', TEI_MIME),
+        (create_document('Schön'), TEI_MIME),
+    ]
+    results = run_pipeline(items, processes(xtx_url), concurrency=2, batch_size=2)
+    assert [x.ok for x in results] == [True, False, True, False, True]
+    assert [x.failed_process for x in results] == [
+        None, 'XtxProcess', None, 'XtxProcess', None
+    ]
+    assert isinstance(results[1].error, ValueError)
+    assert [x.payload for x in results if x.ok] == ['Hans ging', 'nach Wien', 'Schön']
+    # the sequential runner gives the same results
+    sequential = run_batch(items, processes(xtx_url), batch_size=2)
+    assert [x.payload for x in sequential] == [x.payload for x in results]
+    assert [x.failed_process for x in sequential] == [x.failed_process for x in results]
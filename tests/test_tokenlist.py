@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip('spacy')
+
+from spacy.tokens import Doc  # noqa: E402
+from spacy.vocab import Vocab  # noqa: E402
+from spacytei.columnar import ColumnarDoc  # noqa: E402
+from spacytei.tokenlist import doc_to_tokenlist, doc_to_tokenlist_no_sents  # noqa: E402
+
+
+@pytest.fixture
+def doc():
+    words = ['Hans', 'Maier', 'ging', 'nach', 'Wien', '.', 'Schön', '!']
+    spaces = [True, True, True, True, False, True, False, False]
+    doc = Doc(Vocab(), words=words, spaces=spaces)
+    for token in doc:
+        token.is_sent_start = token.i in (0, 6)
+    return doc
+
+
+def test_columnar_doc_gives_the_same_tokenlist(doc):
+    assert ColumnarDoc.from_doc(doc).to_tokenlist() == doc_to_tokenlist(doc)
+
+
+def test_whitespace_is_serialized(doc):
+    tokens = doc_to_tokenlist_no_sents(doc)
+    assert [x['whitespace'] for x in tokens] == [True, True, True, True, False, True, False, False]
+    assert [x['sent'] for x in doc_to_tokenlist(doc)] == ['Hans Maier ging nach Wien.', 'Schön!']
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from spacytei.columnar import ColumnarDoc
+from spacytei.wire import dump, dumps, is_binary_payload, load, loads
+
+
+TOKENLIST = [
+    {
+        'sent': 'Hans Maier ging nach Wien.',
+        'tokens': [
+            {'tokenId': 'w1', 'value': 'Hans', 'lemma': 'Hans', 'iob': 'B-PER', 'is_alpha': True},
+            {'tokenId': 'w2', 'value': 'Maier', 'lemma': 'Maier', 'iob': 'I-PER', 'is_alpha': True},
+            {'tokenId': 'w3', 'value': 'ging', 'lemma': 'gehen', 'iob': 'O', 'is_alpha': True},
+            {'tokenId': 'w4', 'value': 'nach', 'iob': 'O', 'is_alpha': True},
+            {'tokenId': 'w5', 'value': 'Wien', 'lemma': 'Wien', 'iob': 'B-LOC', 'is_alpha': True},
+            {'tokenId': 'w6', 'value': '.', 'lemma': '.', 'iob': 'O', 'is_alpha': False},
+        ]
+    },
+    {
+        'sent': 'Schön!',
+        'tokens': [
+            {'tokenId': 'w7', 'value': 'Schön', 'lemma': 'schön', 'iob': 'O', 'is_alpha': True},
+            {'tokenId': 'w8', 'value': '!', 'iob': 'O', 'is_alpha': False},
+        ]
+    },
+]
+
+
+def test_round_trip_of_sentences():
+    data = dumps(TOKENLIST)
+    assert is_binary_payload(data)
+    assert loads(data).to_tokenlist() == TOKENLIST
+
+
+def test_round_trip_of_flat_tokenlist():
+    tokens = TOKENLIST[0]['tokens']
+    doc = loads(dumps(tokens))
+    assert not doc.has_sents
+    assert doc.to_tokenlist() == tokens
+
+
+def test_round_trip_of_empty_doc():
+    assert loads(dumps([])).to_tokenlist() == []
+
+
+def test_arrays_are_read_only_views():
+    doc = loads(dumps(ColumnarDoc.from_tokenlist(TOKENLIST)))
+    for column in doc.columns.values():
+        assert not column.flags.writeable
+        assert column.dtype == np.dtype('<i1')
+
+
+def test_file_round_trip(tmp_path):
+    path = dump(TOKENLIST, str(tmp_path / 'doc.bin'))
+    assert load(path).to_tokenlist() == TOKENLIST
+
+
+def test_other_data_is_rejected():
+    assert not is_binary_payload('[]')
+    with pytest.raises(ValueError):
+        loads(b'[{"tokens": []}]')
@@ -0,0 +1,51 @@
+from io import BytesIO
+
+from spacytei.doc_cache import DocumentCache
+from spacytei.tei import TeiReader
+from spacytei.xml import XMLReader, make_parser, parser_cache_key
+
+
+DOCUMENT = (
+    b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>'
+    b'<p n="1">a<note><p n="2">b<p n="3">c</p></p><p n="4"/></note></p><p n="5"/>'
+    b'</body></text></TEI>'
+)
+
+
+def test_iter_elements_yields_nested_elements_in_document_order():
+    for streaming in (False, True):
+        reader = XMLReader(BytesIO(DOCUMENT), streaming=streaming)
+        numbers = [x.get('n') for x in reader.iter_elements('tei:p', within='tei:body')]
+        assert numbers == ['1', '2', '3', '4', '5']
+
+
+def test_cached_tree_is_shared_until_changed():
+    cache = DocumentCache()
+    xml = DOCUMENT.decode('utf-8')
+    reader = TeiReader(xml, cache=cache)
+    other = TeiReader(xml, cache=cache)
+    assert reader.view is other.view
+    assert cache.stats()['hits'] == 1
+    tree = reader.tree
+    assert tree is not other.view
+    assert reader.view is tree
+    tree.clear()
+    assert len(other.view) == 1
+    assert len(TeiReader(xml, cache=cache).view) == 1
+
+
+def test_cache_size_counts_the_nodes():
+    cache = DocumentCache()
+    TeiReader(DOCUMENT, cache=cache)
+    assert cache.stats()['bytes'] > len(DOCUMENT) * 2
+
+
+def test_parsers_with_the_same_options_share_cached_documents():
+    assert parser_cache_key() == parser_cache_key(make_parser())
+    assert parser_cache_key() != parser_cache_key(make_parser(remove_blank_text=True))
+    cache = DocumentCache()
+    TeiReader(DOCUMENT, cache=cache)
+    TeiReader(DOCUMENT, parser=make_parser(), cache=cache)
+    TeiReader(DOCUMENT, parser=make_parser(remove_blank_text=True), cache=cache)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['entries'] == 2
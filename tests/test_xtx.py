@@ -0,0 +1,75 @@
+import lxml.etree as ET
+
+from spacytei.xtx import XtxClient
+
+
+TEI = '{http://www.tei-c.org/ns/1.0}'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+
+
+class Response:
+
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+
+
+class TokenizingSession:
+    """ answers like XTX: every chunk numbers its tokens from xTok_000001 and points each\
+    token to itself with @corresp """
+
+    def __init__(self):
+        self.requests = 0
+
+    def post(self, url, headers, data, timeout):
+        self.requests += 1
+        root = ET.fromstring(data)
+        counter = 0
+        for p in root.iter(TEI + 'p'):
+            words = p.text.split()
+            p.text = None
+            for word in words:
+                counter += 1
+                w = ET.SubElement(p, TEI + 'w')
+                w.text = word
+                w.set(XML_ID, 'xTok_{:06d}'.format(counter))
+                w.set('corresp', '#xTok_{:06d}'.format(counter))
+        return Response(ET.tostring(root))
+
+
+def ids(root):
+    return [x.get(XML_ID) for x in root.iter() if x.get(XML_ID)]
+
+
+def test_chunks_get_unique_ids_and_references():
+    document = (
+        '<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>'
+        '<p xml:id="p1">Hans ging</p><p xml:id="xTok_000003">nach Wien</p><p>heute</p>'
+        '</body></text></TEI>'
+    )
+    session = TokenizingSession()
+    client = XtxClient('http://xtx', chunk_bytes=10, session=session)
+    root = client.tokenize_tree(ET.fromstring(document))
+    assert session.requests == 3
+    assert ids(root) == [
+        'p1', 'xTok_000001', 'xTok_000002', 'xTok_000003', 'xTok_000004', 'xTok_000005',
+        'xTok_000006'
+    ]
+    tokens = list(root.iter(TEI + 'w'))
+    assert [x.text for x in tokens] == ['Hans', 'ging', 'nach', 'Wien', 'heute']
+    assert [x.get('corresp') for x in tokens] == ['#' + x.get(XML_ID) for x in tokens]
+
+
+def test_small_documents_are_posted_at_once():
+    document = (
+        '<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body><p>Schön ist’s</p>'
+        '</body></text></TEI>'
+    )
+    session = TokenizingSession()
+    # the document has fewer characters than bytes
+    client = XtxClient('http://xtx', chunk_bytes=len(document.encode('utf-8')), session=session)
+    stats = []
+    result = client.tokenize(document, stats=stats)
+    assert session.requests == 1
+    assert stats[0]['bytes_sent'] == len(document.encode('utf-8'))
+    assert ids(ET.fromstring(result)) == ['xTok_000001', 'xTok_000002']